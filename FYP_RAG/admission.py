@@ -0,0 +1,133 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from FYP_RAG.metrics import Counter, Histogram, register
+
+
+class Overloaded(RuntimeError):
+    """Raised when no Granite slot frees up in time; `retry_after` is a hint in seconds."""
+
+    def __init__(self, message: str, reason: str, retry_after: int):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+ADMISSION_WAIT_SECONDS = register(Histogram(
+    "rag_admission_wait_seconds",
+    "Time queries waited for a Granite slot before being admitted.",
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+))
+ADMISSION_REJECTED_TOTAL = register(Counter(
+    "rag_admission_rejected_total",
+    "Queries turned away with 503 because Granite was saturated, by reason.",
+    ["reason"],
+))
+
+
+# -----------------------------
+# Admission control for Granite calls
+# -----------------------------
+class AdmissionController:
+    """
+    Caps concurrent in-flight Granite calls per process. Up to `max_queue`
+    further callers wait (at most `max_wait_s`) for a slot; beyond that they
+    are rejected immediately with `Overloaded`, so a burst of slow questions
+    turns into fast 503s instead of pinning every worker thread.
+
+    `max_inflight <= 0` disables the limit.
+    """
+
+    def __init__(self, max_inflight: int = 8, max_queue: int = 16, max_wait_s: float = 10.0):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._waiting = 0
+        # Moving average of how long a slot is held, for the Retry-After hint
+        self._hold_avg_s = 1.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def _retry_after(self) -> int:
+        # Roughly how long until the current queue (plus us) has been served
+        slots = max(1, self.max_inflight)
+        return max(1, min(60, math.ceil(self._hold_avg_s * (self._waiting + 1) / slots)))
+
+    def acquire(self):
+        if self.max_inflight <= 0:
+            return
+        start = time.monotonic()
+        with self._cond:
+            if self._inflight >= self.max_inflight:
+                if self._waiting >= self.max_queue:
+                    self.rejected += 1
+                    ADMISSION_REJECTED_TOTAL.inc("queue_full")
+                    raise Overloaded("Too many queries in progress", "queue_full", self._retry_after())
+                self._waiting += 1
+                try:
+                    deadline = start + self.max_wait_s
+                    while self._inflight >= self.max_inflight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            ADMISSION_REJECTED_TOTAL.inc("timeout")
+                            raise Overloaded("Timed out waiting for a free slot", "timeout", self._retry_after())
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._inflight += 1
+            self.admitted += 1
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start)
+
+    def release(self, held_s: Optional[float] = None):
+        if self.max_inflight <= 0:
+            return
+        with self._cond:
+            self._inflight -= 1
+            if held_s is not None:
+                self._hold_avg_s = 0.8 * self._hold_avg_s + 0.2 * held_s
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "inflight": self._inflight,
+                "queued": self._waiting,
+                "max_inflight": self.max_inflight,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "avg_hold_s": round(self._hold_avg_s, 3),
+            }
+
+
+_ADMISSION: Optional[AdmissionController] = None
+_ADMISSION_LOCK = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    global _ADMISSION
+    if _ADMISSION is None:
+        with _ADMISSION_LOCK:
+            if _ADMISSION is None:
+                _ADMISSION = AdmissionController(
+                    max_inflight=int(os.getenv("LLM_MAX_INFLIGHT", "8")),
+                    max_queue=int(os.getenv("LLM_MAX_QUEUE", "16")),
+                    max_wait_s=float(os.getenv("LLM_QUEUE_TIMEOUT_S", "10")),
+                )
+    return _ADMISSION
@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from FYP_RAG.vector_registry import vectorstore_path
+
+
+def normalize_query(query: str) -> str:
+    q = unicodedata.normalize("NFKC", query or "").lower()
+    q = re.sub(r"\s+", " ", q).strip()
+    return q.rstrip("?!. ")
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class MemoryAnswerBackend:
+    """
+    Per-process LRU bounded by entry count and payload bytes.
+    Index generations are per-process too, so other gunicorn workers only
+    notice an ingest once their entries expire; the default backend is
+    sqlite whenever gunicorn runs more than one worker.
+
+    Generations come from one process-wide counter and only the most recently
+    bumped `max_generations` users keep their own; everyone else shares the
+    floor, which is raised to the largest generation dropped. A user's
+    generation therefore never goes back to a value used before a bump.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024,
+                 max_generations: int = 4096):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_generations = max(1, max_generations)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        self._last_generation = 0
+        self._floor = 0
+        self._bytes = 0
+        self.evictions = 0
+
+    def generation(self, user_id: str) -> int:
+        with self._lock:
+            return self._generations.get(user_id, self._floor)
+
+    def bump_generation(self, user_id: str):
+        with self._lock:
+            self._last_generation += 1
+            self._generations.pop(user_id, None)
+            self._generations[user_id] = self._last_generation
+            while len(self._generations) > self.max_generations:
+                _, dropped = self._generations.popitem(last=False)
+                self._floor = max(self._floor, dropped)
+            for key in [k for k, v in self._entries.items() if v[0] == user_id]:
+                self._bytes -= len(self._entries.pop(key)[1])
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            _, payload, compute_ms, created = entry
+            return payload, compute_ms, created
+
+    def delete(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= len(entry[1])
+
+    def put(self, key: str, user_id: str, payload: str, compute_ms: float):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (user_id, payload, compute_ms, time.time())
+            self._bytes += len(payload)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[1])
+                self.evictions += 1
+
+    def size(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+
+class SqliteAnswerBackend:
+    """
+    On-disk backend shared by every worker on the dyno: entries and index
+    generations live in one WAL-mode sqlite file. Entry count, payload bytes
+    and evictions are running totals in the one-row answer_totals table, kept
+    by triggers, so an insert does not scan the table to check the bounds.
+    """
+
+    def __init__(self, path: str, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        # One schema set-up at a time, so the totals start from a count no other worker is changing
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    payload TEXT,
+                    compute_ms REAL,
+                    created REAL,
+                    accessed REAL,
+                    size INTEGER
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_accessed ON answers(accessed)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_user ON answers(user_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS generations (
+                    user_id TEXT PRIMARY KEY,
+                    gen INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answer_totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    entries INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    evictions INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                INSERT OR IGNORE INTO answer_totals (id, entries, bytes, evictions)
+                SELECT 1, COUNT(*), COALESCE(SUM(size), 0), 0 FROM answers
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS answers_totals_insert AFTER INSERT ON answers BEGIN
+                    UPDATE answer_totals SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 1;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS answers_totals_update AFTER UPDATE OF size ON answers BEGIN
+                    UPDATE answer_totals SET bytes = bytes - OLD.size + NEW.size WHERE id = 1;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS answers_totals_delete AFTER DELETE ON answers BEGIN
+                    UPDATE answer_totals SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 1;
+                END
+            """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def generation(self, user_id: str) -> int:
+        row = self._conn().execute("SELECT gen FROM generations WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self, user_id: str):
+        with self._conn() as conn:
+            conn.execute(
+                """
+                INSERT INTO generations (user_id, gen) VALUES (?, 1)
+                ON CONFLICT(user_id) DO UPDATE SET gen = gen + 1
+                """,
+                (user_id,),
+            )
+            conn.execute("DELETE FROM answers WHERE user_id = ?", (user_id,))
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute("SELECT payload, compute_ms, created FROM answers WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE answers SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row[0], row[1], row[2]
+
+    def delete(self, key: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+
+    def put(self, key: str, user_id: str, payload: str, compute_ms: float):
+        now = time.time()
+        with self._conn() as conn:
+            # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete fires no trigger
+            conn.execute(
+                """
+                INSERT INTO answers (key, user_id, payload, compute_ms, created, accessed, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    user_id = excluded.user_id, payload = excluded.payload, compute_ms = excluded.compute_ms,
+                    created = excluded.created, accessed = excluded.accessed, size = excluded.size
+                """,
+                (key, user_id, payload, compute_ms, now, now, len(payload)),
+            )
+            count, total = conn.execute("SELECT entries, bytes FROM answer_totals WHERE id = 1").fetchone()
+            if count > self.max_entries or total > self.max_bytes:
+                # Drop the least recently used ~10% so eviction is not paid on every insert
+                drop = max(count - self.max_entries, count // 10, 1)
+                cur = conn.execute(
+                    "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY accessed ASC LIMIT ?)",
+                    (drop,),
+                )
+                conn.execute("UPDATE answer_totals SET evictions = evictions + ? WHERE id = 1", (cur.rowcount,))
+
+    def size(self) -> dict:
+        count, total, evictions = self._conn().execute(
+            "SELECT entries, bytes, evictions FROM answer_totals WHERE id = 1"
+        ).fetchone()
+        return {"entries": count, "bytes": total, "evictions": evictions}
+
+
+# -----------------------------
+# Cache front-end
+# -----------------------------
+class AnswerCache:
+    def __init__(self, backend, ttl_s: float = 600.0):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self.invalidations = 0
+
+    def key(self, user_id: str, query: str) -> str:
+        """
+        Key under the user's current index generation. Take it once, before
+        computing, and pass it to both get() and put(): an answer computed
+        while an ingest lands is then filed under the old generation, where
+        nothing looks it up, instead of being served as post-ingest.
+        """
+        gen = self.backend.generation(user_id)
+        raw = f"{user_id}\x00{gen}\x00{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self.backend.get(key)
+        if entry is not None and time.time() - entry[2] > self.ttl_s:
+            self.backend.delete(key)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_ms += entry[1]
+
+        result = json.loads(entry[0])
+        result["cache"] = {"hit": True, "saved_ms": round(entry[1], 1)}
+        return result
+
+    def put(self, key: str, user_id: str, result: dict, compute_ms: float):
+        payload = json.dumps({k: v for k, v in result.items() if k != "cache"})
+        self.backend.put(key, user_id, payload, compute_ms)
+
+    def invalidate_user(self, user_id: str):
+        self.backend.bump_generation(user_id)
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            out = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "saved_ms": round(self.saved_ms, 1),
+                "invalidations": self.invalidations,
+                "ttl_s": self.ttl_s,
+            }
+        out.update(self.backend.size())
+        return out
+
+
+_CACHE: Optional[AnswerCache] = None
+_CACHE_LOCK = threading.Lock()
+_CACHE_INIT = False
+
+
+def _default_backend() -> str:
+    """sqlite under multi-worker gunicorn, so an ingest in one worker invalidates all of them; else memory."""
+    under_gunicorn = os.getenv("SERVER_SOFTWARE", "").startswith("gunicorn/")
+    return "sqlite" if under_gunicorn and int(os.getenv("WEB_CONCURRENCY", "2")) > 1 else "memory"
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Returns the process-wide cache, or None when ANSWER_CACHE_BACKEND=off."""
+    global _CACHE, _CACHE_INIT
+    if not _CACHE_INIT:
+        with _CACHE_LOCK:
+            if not _CACHE_INIT:
+                kind = (os.getenv("ANSWER_CACHE_BACKEND") or "auto").lower()
+                if kind == "auto":
+                    kind = _default_backend()
+                max_entries = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+                max_bytes = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+                backend = None
+                if kind == "sqlite":
+                    path = os.getenv("ANSWER_CACHE_PATH") or os.path.join(vectorstore_path(), "answer_cache.sqlite3")
+                    backend = SqliteAnswerBackend(path, max_entries=max_entries, max_bytes=max_bytes)
+                elif kind == "memory":
+                    backend = MemoryAnswerBackend(max_entries=max_entries, max_bytes=max_bytes)
+                if backend is not None:
+                    _CACHE = AnswerCache(backend, ttl_s=float(os.getenv("ANSWER_CACHE_TTL_S", "600")))
+                _CACHE_INIT = True
+    return _CACHE
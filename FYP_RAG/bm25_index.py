@@ -0,0 +1,67 @@
+import heapq
+import math
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+
+class BM25Index:
+    """
+    Append-only inverted index (term -> postings of doc id + term frequency)
+    with Okapi BM25 scoring. Doc ids are insertion positions, so they line up
+    with the chunk list the index was built from.
+
+    A query only touches the postings of its own terms, so latency tracks the
+    number of matching chunks rather than the size of the corpus.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_len = array("I")
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, terms: Iterable[str]) -> int:
+        doc_id = len(self.doc_len)
+        counts = Counter(terms)
+        for term, tf in counts.items():
+            plist = self.postings.get(term)
+            if plist is None:
+                plist = self.postings[term] = (array("I"), array("I"))
+            plist[0].append(doc_id)
+            plist[1].append(tf)
+        length = sum(counts.values())
+        self.doc_len.append(length)
+        self.total_len += length
+        return doc_id
+
+    def idf(self, term: str) -> float:
+        plist = self.postings.get(term)
+        df = len(plist[0]) if plist else 0
+        n = len(self.doc_len)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query_terms: Iterable[str], k: int = 5) -> List[Tuple[float, int]]:
+        """Returns up to k (score, doc_id) pairs, best first."""
+        n = len(self.doc_len)
+        if not n:
+            return []
+        avgdl = self.total_len / n or 1.0
+        k1, b = self.k1, self.b
+        doc_len = self.doc_len
+
+        scores: Dict[int, float] = {}
+        for term in set(query_terms):
+            plist = self.postings.get(term)
+            if plist is None:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in zip(*plist):
+                norm = k1 * (1.0 - b + b * doc_len[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+
+        return heapq.nlargest(k, ((score, doc_id) for doc_id, score in scores.items()))
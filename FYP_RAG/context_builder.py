@@ -0,0 +1,139 @@
+import math
+import os
+import re
+from typing import List, Optional
+
+from FYP_RAG.text_utils import STOPWORDS, analyze_sentences, tokenize
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+# Granite's BPE vocabulary splits English prose into about 1.3 tokens per
+# word or punctuation mark; close enough for budgeting without a tokenizer
+TOKENS_PER_PIECE = 1.3
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(_PIECE_RE.findall(text or "")) * TOKENS_PER_PIECE)
+
+
+def context_token_budget() -> int:
+    """RAG_CONTEXT_TOKEN_BUDGET; 0 keeps the old join-and-cut-at-6000-characters context."""
+    return int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "600"))
+
+
+def chunk_sentences(d: dict) -> tuple:
+    """(spans, term sets) for a chunk, from ingest when available, else computed now."""
+    spans, sentence_terms = d.get("sentences"), d.get("sentence_terms")
+    if spans is None or sentence_terms is None:
+        spans, sentence_terms = analyze_sentences(d.get("text") or "")
+    return spans, sentence_terms
+
+
+class ContextPack:
+    """The context sent to Granite plus what answer checks need to know about it."""
+
+    __slots__ = ("text", "terms", "tokens", "chunks", "sentences", "dropped_chunks", "dropped_sentences")
+
+    def __init__(self, text: str, terms: set, tokens: int, chunks: int = 0, sentences: int = 0,
+                 dropped_chunks: int = 0, dropped_sentences: int = 0):
+        self.text = text
+        self.terms = terms
+        self.tokens = tokens
+        self.chunks = chunks
+        self.sentences = sentences
+        self.dropped_chunks = dropped_chunks
+        self.dropped_sentences = dropped_sentences
+
+    def __bool__(self):
+        return bool(self.text)
+
+    def stats(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "chunks": self.chunks,
+            "sentences": self.sentences,
+            "dropped_chunks": self.dropped_chunks,
+            "dropped_sentences": self.dropped_sentences,
+        }
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# -----------------------------
+# Packing
+# -----------------------------
+def pack_context(top, q_tokens: set, budget_tokens: int, dedupe_threshold: float = 0.85) -> ContextPack:
+    """
+    Builds the Granite context from ranked chunks ([(score, chunk), ...]):
+
+    1. drops chunks whose term set overlaps an already kept, higher-ranked
+       chunk by `dedupe_threshold` (Jaccard) or more, and repeated sentences;
+    2. ranks whole sentences by query-term overlap, then chunk score;
+    3. takes sentences in that order while they fit `budget_tokens`;
+    4. emits them in document order, one paragraph per chunk.
+    """
+    q_terms = (set(q_tokens) - STOPWORDS) or set(q_tokens)
+
+    kept_terms: List[frozenset] = []
+    dropped_chunks = dropped_sentences = 0
+    seen = set()
+    candidates = []
+    for rank, (score, d) in enumerate(top):
+        text = d.get("text") or ""
+        if not text.strip():
+            continue
+        spans, sentence_terms = chunk_sentences(d)
+        chunk_terms = frozenset().union(*sentence_terms)
+        if any(_jaccard(chunk_terms, t) >= dedupe_threshold for t in kept_terms):
+            dropped_chunks += 1
+            continue
+        kept_terms.append(chunk_terms)
+
+        for pos, ((start, end), s_terms) in enumerate(zip(spans, sentence_terms)):
+            sentence = text[start:end].strip()
+            if not sentence:
+                continue
+            # Same words in any case/spacing/punctuation count as a repeat
+            key = s_terms if len(s_terms) >= 4 else sentence.lower()
+            if key in seen:
+                dropped_sentences += 1
+                continue
+            seen.add(key)
+            candidates.append((len(q_terms & s_terms), score, rank, pos, sentence, s_terms))
+
+    candidates.sort(key=lambda c: (-c[0], -c[1], c[2], c[3]))
+    chosen, used = [], 0
+    for c in candidates:
+        cost = estimate_tokens(c[4])
+        if used + cost > budget_tokens:
+            # A shorter, lower-ranked sentence may still fit
+            continue
+        chosen.append(c)
+        used += cost
+
+    terms = set()
+    if not chosen and candidates:
+        # The best sentence alone is over budget (e.g. an unpunctuated table): cut it by words
+        best = candidates[0]
+        words = best[4].split()
+        cut = " ".join(words[:max(1, int(budget_tokens / TOKENS_PER_PIECE))])
+        chosen = [best[:4] + (cut, None)]
+        terms = tokenize(cut)
+
+    chosen.sort(key=lambda c: (c[2], c[3]))
+    paragraphs: List[List[str]] = []
+    last_rank: Optional[int] = None
+    for c in chosen:
+        if c[2] != last_rank:
+            paragraphs.append([])
+            last_rank = c[2]
+        paragraphs[-1].append(c[4])
+        if c[5] is not None:
+            terms |= c[5]
+    text = "\n\n".join(" ".join(p) for p in paragraphs)
+    return ContextPack(text, terms, estimate_tokens(text), len(paragraphs), len(chosen),
+                       dropped_chunks, dropped_sentences)
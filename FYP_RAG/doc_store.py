@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from FYP_RAG.mmap_index import MappedSegment, get_local_store
+from FYP_RAG.vector_registry import vectorstore_path
+
+# Chroma collection holding the chunks of every stored document, tagged with doc_hash
+DOCUMENTS_COLLECTION = "documents"
+
+
+class DocumentStore:
+    """
+    Content-addressed store of ingested documents shared by all users.
+
+    A document is keyed by the SHA-256 of the uploaded file: its chunks are
+    written once to a local-index segment ("doc:<hash>") and once to the
+    shared Chroma collection, whatever the number of users who upload it.
+    Each user only holds (filename -> doc_hash) links; retrieval filters the
+    shared collection by the user's hashes. A document is deleted when its
+    last link goes away (the owner re-uploads a changed file).
+
+    Documents and links live in a WAL-mode sqlite file so every worker sees
+    the same ownership.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_hash TEXT PRIMARY KEY,
+                    filename TEXT,
+                    parser TEXT,
+                    chunks INTEGER,
+                    vector_synced INTEGER,
+                    created REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS links (
+                    user_id TEXT,
+                    filename TEXT,
+                    doc_hash TEXT,
+                    added REAL,
+                    PRIMARY KEY (user_id, filename)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_links_doc ON links(doc_hash)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # Documents
+    @staticmethod
+    def segment_name(doc_hash: str) -> str:
+        return f"doc:{doc_hash}"
+
+    def locked(self, doc_hash: str):
+        """Serialises ingesting, linking and deleting one document across threads and processes."""
+        return get_local_store().writing(self.segment_name(doc_hash))
+
+    def document(self, doc_hash: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT filename, parser, chunks, vector_synced FROM documents WHERE doc_hash = ?", (doc_hash,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"doc_hash": doc_hash, "filename": row[0], "parser": row[1], "chunks": row[2],
+                "vector_synced": bool(row[3])}
+
+    def put_document(self, doc_hash: str, filename: str, parser: str, chunks: List[dict], vector_synced: bool):
+        """Writes the document's chunks to its segment and records it. Call under locked(doc_hash)."""
+        get_local_store().write(self.segment_name(doc_hash), chunks)
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_hash, filename, parser, chunks, vector_synced, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_hash, filename, parser, len(chunks), int(vector_synced), time.time()),
+            )
+
+    def documents(self) -> List[dict]:
+        rows = self._conn().execute("SELECT doc_hash FROM documents ORDER BY created").fetchall()
+        return [doc for doc in (self.document(h) for h, in rows) if doc is not None]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def set_synced(self, doc_hash: str, vector_synced: bool):
+        with self._conn() as conn:
+            conn.execute("UPDATE documents SET vector_synced = ? WHERE doc_hash = ?", (int(vector_synced), doc_hash))
+
+    def segment(self, doc_hash: str) -> Optional[MappedSegment]:
+        return get_local_store().open(self.segment_name(doc_hash))
+
+    def delete_document(self, doc_hash: str):
+        """Drops the record and segment. Call under locked(doc_hash) once no link is left."""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+        get_local_store().remove(self.segment_name(doc_hash))
+
+    # Links
+    def owned(self, user_id: str) -> Dict[str, str]:
+        """doc_hash -> the filename this user uploaded it as."""
+        rows = self._conn().execute("SELECT doc_hash, filename FROM links WHERE user_id = ?", (user_id,))
+        return {doc_hash: filename for doc_hash, filename in rows}
+
+    def linked(self, user_id: str, filename: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT doc_hash FROM links WHERE user_id = ? AND filename = ?", (user_id, filename)
+        ).fetchone()
+        return row[0] if row else None
+
+    def link(self, user_id: str, filename: str, doc_hash: str) -> Optional[str]:
+        """Points the user's `filename` at `doc_hash`; returns the hash it pointed at before, if any."""
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT doc_hash FROM links WHERE user_id = ? AND filename = ?", (user_id, filename)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO links (user_id, filename, doc_hash, added) VALUES (?, ?, ?, ?)",
+                (user_id, filename, doc_hash, time.time()),
+            )
+        return row[0] if row else None
+
+    def users(self, doc_hash: str) -> List[str]:
+        rows = self._conn().execute("SELECT DISTINCT user_id FROM links WHERE doc_hash = ?", (doc_hash,))
+        return [user_id for user_id, in rows]
+
+    def owners(self, doc_hash: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM links WHERE doc_hash = ?", (doc_hash,)).fetchone()[0]
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        documents, chunks = conn.execute("SELECT COUNT(*), COALESCE(SUM(chunks), 0) FROM documents").fetchone()
+        links, users = conn.execute("SELECT COUNT(*), COUNT(DISTINCT user_id) FROM links").fetchone()
+        return {
+            "documents": documents,
+            "chunks": chunks,
+            "links": links,
+            "users": users,
+            # Uploads served by an already stored document instead of a new copy
+            "deduplicated": max(links - documents, 0),
+        }
+
+
+_STORE: Optional[DocumentStore] = None
+_STORE_LOCK = threading.Lock()
+_STORE_INIT = False
+
+
+def get_doc_store() -> Optional[DocumentStore]:
+    """Returns the process-wide store, or None when DOC_STORE_ENABLED=0 (per-user copies as before)."""
+    global _STORE, _STORE_INIT
+    if not _STORE_INIT:
+        with _STORE_LOCK:
+            if not _STORE_INIT:
+                if os.getenv("DOC_STORE_ENABLED", "1") == "1":
+                    path = os.getenv("DOC_STORE_PATH") or os.path.join(vectorstore_path(), "doc_store.sqlite3")
+                    _STORE = DocumentStore(path)
+                _STORE_INIT = True
+    return _STORE
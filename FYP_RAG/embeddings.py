@@ -0,0 +1,333 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from FYP_RAG.metrics import EMBED_TEXTS_TOTAL, stage
+from FYP_RAG.vector_registry import vectorstore_path
+
+
+def _threads() -> int:
+    """EMBED_THREADS: CPU threads per embedding call; 0 leaves the runtime default."""
+    return int(os.getenv("EMBED_THREADS", "0"))
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class SentenceTransformerBackend:
+    """
+    PyTorch sentence-transformers on CPU. Does not import chromadb, whose
+    import starts an onnxruntime thread, so the weights can be loaded in the
+    gunicorn master before workers are forked (see FYP_RAG/warmup.py).
+    """
+
+    def __init__(self, model_name: str, device: str = "cpu", threads: int = 0):
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        self.model_name = model_name
+        self.identity = f"st:{model_name}"
+        self._model = SentenceTransformer(model_name, device=device)
+
+    def embed(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self._model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype(np.float32)
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime on CPU over a sentence-transformers export: tokenizer.json
+    plus an .onnx file, e.g. onnx/model.onnx or a quantized variant such as
+    onnx/model_quint8_avx2.onnx (same repo layout as on the Hugging Face hub).
+    Mean pooling over the attention mask, then L2 normalisation, as the
+    sentence-transformers pipeline for MiniLM/mpnet does.
+
+    The session is created per process on first use: importing onnxruntime
+    starts a thread, which must not happen before a fork.
+    """
+
+    def __init__(self, model_name: str, file_name: str = "onnx/model.onnx", model_dir: Optional[str] = None,
+                 threads: int = 0, max_length: int = 256, normalize: bool = True):
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.identity = f"onnx:{model_name}:{file_name}"
+        self.threads = threads
+        self.normalize = normalize
+        self.model_path = self._resolve(model_name, file_name, model_dir)
+        tokenizer_path = os.path.join(os.path.dirname(self.model_path), "tokenizer.json")
+        if not os.path.exists(tokenizer_path):
+            tokenizer_path = self._resolve(model_name, "tokenizer.json", model_dir)
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.enable_padding()
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    @staticmethod
+    def _resolve(model_name: str, file_name: str, model_dir: Optional[str]) -> str:
+        for root in (model_dir, model_name):
+            if root and os.path.isdir(root):
+                for candidate in (os.path.join(root, file_name), os.path.join(root, os.path.basename(file_name))):
+                    if os.path.exists(candidate):
+                        return candidate
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(model_name, file_name)
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                import onnxruntime as ort
+
+                opts = ort.SessionOptions()
+                if self.threads > 0:
+                    opts.intra_op_num_threads = self.threads
+                opts.inter_op_num_threads = 1
+                opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                self._session = ort.InferenceSession(self.model_path, opts, providers=["CPUExecutionProvider"])
+                self._inputs = {i.name for i in self._session.get_inputs()}
+                self._pid = os.getpid()
+            return self._session
+
+    def embed(self, texts: List[str], batch_size: int) -> np.ndarray:
+        session = self._get_session()
+        # Similar lengths share a batch, so little compute goes to padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self._tokenizer.encode_batch([texts[i] for i in idx])
+            ids = np.array([e.ids for e in enc], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in enc], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self._inputs:
+                feeds["token_type_ids"] = np.zeros_like(ids)
+            hidden = session.run(None, feeds)[0]
+            m = mask[:, :, None].astype(np.float32)
+            vecs = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                vecs /= np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+            if out.shape[1] == 0:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[idx] = vecs
+        return out
+
+
+# -----------------------------
+# Embedding cache
+# -----------------------------
+class EmbeddingCache:
+    """
+    Content hash -> float32 vector. Keys hash the backend identity with the
+    text, so vectors from different models or runtimes never mix. A
+    per-process LRU sits in front of an optional sqlite file shared by every
+    worker; sqlite rows are evicted oldest-first.
+    """
+
+    def __init__(self, namespace: str, max_memory: int = 20000, path: Optional[str] = None,
+                 max_rows: int = 500000):
+        self.namespace = namespace.encode("utf-8") + b"\x00"
+        self.max_memory = max_memory
+        self.path = path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._local = threading.local()
+        self._rows = 0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._conn() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                        key BLOB PRIMARY KEY,
+                        vec BLOB NOT NULL,
+                        created REAL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_created ON embeddings(created)")
+                self._rows = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(self.namespace + text.encode("utf-8")).digest()
+
+    def _remember(self, key: bytes, vec: np.ndarray):
+        # Called with the lock held
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        with self._lock:
+            for k in keys:
+                vec = self._memory.get(k)
+                if vec is not None:
+                    self._memory.move_to_end(k)
+                    found[k] = vec
+        missing = [k for k in keys if k not in found]
+        if self.path and missing:
+            conn = self._conn()
+            # Stay under sqlite's bound-parameter limit
+            for start in range(0, len(missing), 500):
+                part = missing[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part).fetchall()
+                with self._lock:
+                    for k, blob in rows:
+                        vec = np.frombuffer(blob, dtype=np.float32)
+                        found[k] = vec
+                        self._remember(k, vec)
+        return found
+
+    def put_many(self, items: Dict[bytes, np.ndarray]):
+        with self._lock:
+            for k, vec in items.items():
+                self._remember(k, vec)
+        if not self.path or not items:
+            return
+        now = time.time()
+        with self._conn() as conn:
+            cur = conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vec, created) VALUES (?, ?, ?)",
+                [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items.items()],
+            )
+            self._rows += max(cur.rowcount, 0)
+            if self._rows > self.max_rows:
+                # Drop the oldest ~10% so eviction is not paid on every insert
+                drop = max(self._rows - self.max_rows, self.max_rows // 10, 1)
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY created ASC LIMIT ?)",
+                    (drop,),
+                )
+                self._rows = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def size(self) -> dict:
+        with self._lock:
+            return {"memory_entries": len(self._memory), "disk_rows": self._rows if self.path else 0}
+
+
+# -----------------------------
+# Chroma embedding function
+# -----------------------------
+class CachedEmbeddingFunction:
+    """
+    Chroma-compatible embedding function (`__call__(input)`): looks every
+    text up in the cache, embeds only the distinct misses in batches of
+    `batch_size`, and stores the new vectors.
+    """
+
+    def __init__(self, backend, cache: Optional[EmbeddingCache] = None, batch_size: int = 32):
+        self.backend = backend
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.embedded = 0
+        self.embed_seconds = 0.0
+
+    def __call__(self, input):
+        texts = list(input)
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._embed(texts).tolist()
+
+        keys = [self.cache.key(t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        todo: Dict[bytes, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in found:
+                todo.setdefault(k, t)
+        hits = sum(1 for k in keys if k in found)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(texts) - hits
+        EMBED_TEXTS_TOTAL.inc("hit", amount=hits)
+        EMBED_TEXTS_TOTAL.inc("miss", amount=len(texts) - hits)
+
+        if todo:
+            vecs = self._embed(list(todo.values()))
+            fresh = dict(zip(todo.keys(), vecs))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return [found[k].tolist() for k in keys]
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        start = time.perf_counter()
+        with stage("embedding_compute"):
+            vecs = self.backend.embed(texts, self.batch_size)
+        with self._lock:
+            self.embedded += len(texts)
+            self.embed_seconds += time.perf_counter() - start
+        return vecs
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            out = {
+                "backend": self.backend.identity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "embedded": self.embedded,
+                "embeddings_per_s": (self.embedded / self.embed_seconds) if self.embed_seconds else 0.0,
+            }
+        if self.cache is not None:
+            out.update(self.cache.size())
+        return out
+
+
+def build_embedding_function(model_name: str) -> CachedEmbeddingFunction:
+    """
+    Embedding function for `model_name` as configured by the environment:
+    EMBED_BACKEND (sentence-transformers | onnx), EMBED_ONNX_FILE,
+    EMBED_ONNX_PATH, EMBED_BATCH_SIZE, EMBED_THREADS and EMBED_CACHE_BACKEND
+    (sqlite | memory | off). Raises if the backend cannot be loaded.
+    """
+    kind = os.getenv("EMBED_BACKEND", "sentence-transformers").lower()
+    if kind == "onnx":
+        backend = OnnxBackend(
+            model_name,
+            file_name=os.getenv("EMBED_ONNX_FILE", "onnx/model.onnx"),
+            model_dir=os.getenv("EMBED_ONNX_PATH") or None,
+            threads=_threads(),
+            max_length=int(os.getenv("EMBED_MAX_LENGTH", "256")),
+        )
+    elif kind in ("sentence-transformers", "st", "torch"):
+        backend = SentenceTransformerBackend(model_name, threads=_threads())
+    else:
+        raise ValueError(f"Unknown EMBED_BACKEND: {kind}")
+
+    cache = None
+    cache_kind = os.getenv("EMBED_CACHE_BACKEND", "sqlite").lower()
+    if cache_kind in ("sqlite", "memory"):
+        path = None
+        if cache_kind == "sqlite":
+            path = os.getenv("EMBED_CACHE_PATH") or os.path.join(vectorstore_path(), "embedding_cache.sqlite3")
+        cache = EmbeddingCache(
+            backend.identity,
+            max_memory=int(os.getenv("EMBED_CACHE_MAX_MEMORY", "20000")),
+            path=path,
+            max_rows=int(os.getenv("EMBED_CACHE_MAX_ROWS", "500000")),
+        )
+    return CachedEmbeddingFunction(backend, cache, batch_size=int(os.getenv("EMBED_BATCH_SIZE", "32")))
@@ -1,13 +1,48 @@
+import hashlib
+import io
 import os
-from typing import Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 try:
     import ibm_boto3
+    from ibm_boto3.s3.transfer import TransferConfig
     from ibm_botocore.config import Config
 except Exception:
     ibm_boto3 = None
+    TransferConfig = None
     Config = None
 
+# -----------------------------
+# Transfer settings
+# -----------------------------
+MB = 1024 * 1024
+
+
+def part_size() -> int:
+    """Bytes per multipart part and per ranged GET (COS_PART_SIZE_MB, default 8)."""
+    return max(5 * MB, int(float(os.getenv("COS_PART_SIZE_MB", "8")) * MB))
+
+
+def max_concurrency() -> int:
+    """Parts in flight per transfer (COS_MAX_CONCURRENCY, default 8); also sizes the connection pool."""
+    return max(1, int(os.getenv("COS_MAX_CONCURRENCY", "8")))
+
+
+def transfer_config():
+    """Multipart threshold/part size and thread count for upload_file / download_file."""
+    if TransferConfig is None:
+        raise RuntimeError("ibm-cos-sdk not available; install ibm-cos-sdk or ibm-watsonx-ai")
+    size = part_size()
+    return TransferConfig(
+        multipart_threshold=size,
+        multipart_chunksize=size,
+        max_concurrency=max_concurrency(),
+        use_threads=True,
+    )
+
 
 def cos_enabled() -> bool:
     return all([
@@ -18,7 +53,22 @@ def cos_enabled() -> bool:
     ]) and ibm_boto3 is not None and Config is not None
 
 
-def _get_client():
+def _bucket(bucket: Optional[str]) -> str:
+    bucket = bucket or os.getenv("COS_BUCKET")
+    if not bucket:
+        raise RuntimeError("COS_BUCKET not set")
+    return bucket
+
+
+# -----------------------------
+# Client (one per process)
+# -----------------------------
+_CLIENT = None
+_CLIENT_PID: Optional[int] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def _build_client():
     if not ibm_boto3 or not Config:
         raise RuntimeError("ibm-cos-sdk not available; install ibm-cos-sdk or ibm-watsonx-ai")
     endpoint = os.getenv("COS_ENDPOINT", "https://s3.us-south.cloud-object-storage.appdomain.cloud")
@@ -31,14 +81,288 @@ def _get_client():
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
         endpoint_url=endpoint,
-        config=Config(signature_version="s3v4"),
+        config=Config(
+            signature_version="s3v4",
+            # Every part of every transfer in flight needs its own keep-alive connection
+            max_pool_connections=int(os.getenv("COS_POOL_SIZE") or max_concurrency() * 4),
+            # "path" for local S3-compatible stand-ins that cannot resolve <bucket>.host
+            s3={"addressing_style": os.getenv("COS_ADDRESSING_STYLE", "auto")},
+            retries={"max_attempts": int(os.getenv("COS_MAX_RETRIES", "3"))},
+        ),
     )
 
 
+def _get_client():
+    """
+    Process-wide client, built on first use. Clients are thread-safe and keep
+    a connection pool, so sharing one saves the credential/endpoint setup and
+    the TLS handshakes that a client per call paid. Rebuilt after a fork.
+    """
+    global _CLIENT, _CLIENT_PID
+    if _CLIENT is None or _CLIENT_PID != os.getpid():
+        with _CLIENT_LOCK:
+            if _CLIENT is None or _CLIENT_PID != os.getpid():
+                _CLIENT = _build_client()
+                _CLIENT_PID = os.getpid()
+    return _CLIENT
+
+
+def reset_client():
+    """Drops the cached client, e.g. after changing COS_* settings."""
+    global _CLIENT, _CLIENT_PID
+    with _CLIENT_LOCK:
+        _CLIENT = None
+        _CLIENT_PID = None
+
+
+# -----------------------------
+# Whole-object transfers
+# -----------------------------
 def upload_file_to_cos(local_path: str, key: str, bucket: Optional[str] = None) -> str:
-    bucket = bucket or os.getenv("COS_BUCKET")
-    if not bucket:
-        raise RuntimeError("COS_BUCKET not set")
-    client = _get_client()
-    client.upload_file(local_path, bucket, key)
+    """Uploads a file; above one part size it goes as a parallel multipart upload."""
+    bucket = _bucket(bucket)
+    _get_client().upload_file(local_path, bucket, key, Config=transfer_config())
     return f"s3://{bucket}/{key}"
+
+
+def download_file_from_cos(key: str, local_path: str, bucket: Optional[str] = None) -> str:
+    """
+    Downloads an object with parallel ranged GETs. The file appears at
+    local_path only once complete, so a watcher never ingests half a PDF.
+    """
+    bucket = _bucket(bucket)
+    os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+    tmp = f"{local_path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        _get_client().download_file(bucket, key, tmp, Config=transfer_config())
+        os.replace(tmp, local_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return local_path
+
+
+def object_size(key: str, bucket: Optional[str] = None) -> int:
+    return object_info(key, bucket)[0]
+
+
+def object_info(key: str, bucket: Optional[str] = None) -> Tuple[int, str]:
+    """(size, ETag) of an object."""
+    head = _get_client().head_object(Bucket=_bucket(bucket), Key=key)
+    return int(head["ContentLength"]), head.get("ETag", "").strip('"')
+
+
+class ObjectChanged(RuntimeError):
+    """The object was overwritten while it was being read (a ranged GET failed its If-Match)."""
+
+
+# -----------------------------
+# Streaming ranged reads
+# -----------------------------
+_RANGE_POOL: Optional[ThreadPoolExecutor] = None
+_RANGE_POOL_PID: Optional[int] = None
+
+
+def _range_pool() -> ThreadPoolExecutor:
+    global _RANGE_POOL, _RANGE_POOL_PID
+    if _RANGE_POOL is None or _RANGE_POOL_PID != os.getpid():
+        with _CLIENT_LOCK:
+            if _RANGE_POOL is None or _RANGE_POOL_PID != os.getpid():
+                _RANGE_POOL = ThreadPoolExecutor(max_workers=max_concurrency() * 2, thread_name_prefix="cos-range")
+                _RANGE_POOL_PID = os.getpid()
+    return _RANGE_POOL
+
+
+def _get_range(bucket: str, key: str, start: int, end: int, etag: Optional[str] = None) -> bytes:
+    """
+    Bytes [start, end] inclusive. With `etag`, only of that version of the
+    object: raises ObjectChanged if it has been overwritten since.
+    """
+    kwargs = {"IfMatch": f'"{etag}"'} if etag else {}
+    try:
+        resp = _get_client().get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", **kwargs)
+    except Exception as e:
+        response = getattr(e, "response", None) or {}
+        if (response.get("Error", {}).get("Code") == "PreconditionFailed"
+                or response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 412):
+            raise ObjectChanged(f"{key} changed while it was being read") from e
+        raise
+    return resp["Body"].read()
+
+
+class CosObjectReader(io.RawIOBase):
+    """
+    Seekable, read-only file object over a COS object, served by ranged GETs
+    of `chunk_size` bytes. Parts read are kept in a small LRU and sequential
+    reads prefetch the next `prefetch` parts in the background.
+
+    PyPDF2 reads the trailer and cross-reference table at the end of the
+    file and then only the objects of the pages it is asked for, so
+    PdfReader(open_object(key)) starts extracting pages after a few ranged
+    GETs, without downloading the whole PDF first. spool() saves the whole
+    object meanwhile, sharing parts with the reader instead of fetching
+    them twice (see rag_query_ibm.ingest_stream).
+
+    Every ranged GET is pinned to the ETag seen when the reader was opened,
+    so an object overwritten mid-read raises ObjectChanged instead of
+    yielding a file stitched from two versions.
+    """
+
+    def __init__(self, key: str, bucket: Optional[str] = None, chunk_size: Optional[int] = None,
+                 prefetch: Optional[int] = None, max_parts: int = 32):
+        super().__init__()
+        self.key = key
+        self.bucket = _bucket(bucket)
+        # Smaller default than multipart transfers: page objects are small and scattered
+        self.chunk_size = chunk_size or int(float(os.getenv("COS_RANGE_CHUNK_KB", "1024")) * 1024)
+        self.prefetch = int(os.getenv("COS_PREFETCH_PARTS", "2")) if prefetch is None else prefetch
+        self.max_parts = max(max_parts, self.prefetch + 2)
+        self.size, self.etag = object_info(key, self.bucket)
+        self.pos = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+        self._parts: "OrderedDict[int, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_part = -1
+        self._cancelled = threading.Event()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self.pos = pos
+        return pos
+
+    def _fetch(self, index: int) -> bytes:
+        start = index * self.chunk_size
+        data = _get_range(self.bucket, self.key, start, min(start + self.chunk_size, self.size) - 1, self.etag)
+        with self._lock:
+            self.requests += 1
+            self.bytes_fetched += len(data)
+        return data
+
+    def _schedule(self, index: int):
+        """Starts fetching a part unless it is cached or in flight. Call under _lock."""
+        if index * self.chunk_size >= self.size or index in self._parts:
+            return
+        self._parts[index] = _range_pool().submit(self._fetch, index)
+        while len(self._parts) > self.max_parts:
+            self._parts.popitem(last=False)
+
+    def _part(self, index: int) -> bytes:
+        with self._lock:
+            self._schedule(index)
+            self._parts.move_to_end(index)
+            fut = self._parts[index]
+            # Prefetch only while reading forward; random access (PDF xref lookups) fetches on demand
+            if index == self._last_part + 1:
+                for ahead in range(index + 1, index + 1 + self.prefetch):
+                    self._schedule(ahead)
+            self._last_part = index
+        return fut.result()
+
+    def readinto(self, buf) -> int:
+        if self.pos >= self.size:
+            return 0
+        view = memoryview(buf).cast("B")
+        filled = 0
+        while filled < len(view) and self.pos < self.size:
+            index, offset = divmod(self.pos, self.chunk_size)
+            data = self._part(index)
+            n = min(len(view) - filled, len(data) - offset)
+            view[filled:filled + n] = data[offset:offset + n]
+            filled += n
+            self.pos += n
+        return filled
+
+    def spool(self, local_path: str, concurrency: Optional[int] = None) -> str:
+        """
+        Writes the whole object to local_path, `concurrency` ranged GETs in
+        flight, and returns its SHA-256. Safe to run on another thread while
+        the object is being read: parts either side fetched are shared. The
+        file appears at local_path only once complete; cancel() stops it.
+        """
+        window = concurrency or max_concurrency()
+        n_parts = -(-self.size // self.chunk_size)
+        digest = hashlib.sha256()
+        os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+        tmp = f"{local_path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(tmp, "wb") as f:
+                for index in range(n_parts):
+                    if self._cancelled.is_set():
+                        raise RuntimeError(f"Saving {self.key} was cancelled")
+                    with self._lock:
+                        self._schedule(index)
+                        self._parts.move_to_end(index)
+                        fut = self._parts[index]
+                        for ahead in range(index + 1, min(n_parts, index + window)):
+                            self._schedule(ahead)
+                    data = fut.result()
+                    digest.update(data)
+                    f.write(data)
+            os.replace(tmp, local_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return digest.hexdigest()
+
+    def cancel(self):
+        """Stops a spool() in progress and drops parts not yet fetched."""
+        self._cancelled.set()
+        with self._lock:
+            for fut in self._parts.values():
+                fut.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "requests": self.requests, "bytes_fetched": self.bytes_fetched}
+
+
+def open_object(key: str, bucket: Optional[str] = None, **kwargs) -> io.BufferedReader:
+    """Buffered, seekable reader over a COS object (see CosObjectReader)."""
+    return io.BufferedReader(CosObjectReader(key, bucket, **kwargs))
+
+
+# -----------------------------
+# Prefix listing
+# -----------------------------
+def list_objects(prefix: str = "", bucket: Optional[str] = None, suffix: Optional[str] = ".pdf") -> List[dict]:
+    """Every object under `prefix` (all pages of ListObjectsV2), optionally filtered by suffix."""
+    paginator = _get_client().get_paginator("list_objects_v2")
+    objects = []
+    for page in paginator.paginate(Bucket=_bucket(bucket), Prefix=prefix,
+                                   PaginationConfig={"PageSize": 1000}):
+        for item in page.get("Contents", []):
+            key = item["Key"]
+            if suffix and not key.lower().endswith(suffix.lower()):
+                continue
+            objects.append({"key": key, "size": int(item.get("Size", 0)), "etag": item.get("ETag", "").strip('"')})
+    return objects
+
+
+def local_path_for(key: str, prefix: str, dest_dir: str) -> Optional[str]:
+    """Where `key` lands under dest_dir (its path below `prefix`); None if it would escape dest_dir."""
+    dest_dir = os.path.abspath(dest_dir)
+    rel = key[len(prefix):].lstrip("/") or os.path.basename(key)
+    local_path = os.path.abspath(os.path.join(dest_dir, rel))
+    if not local_path.startswith(dest_dir + os.sep):
+        print("⚠️ Skipping COS key outside the destination:", key)
+        return None
+    return local_path
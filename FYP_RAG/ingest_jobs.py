@@ -0,0 +1,380 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from FYP_RAG.log_writer import connect
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+# -----------------------------
+# Query priority gate
+# -----------------------------
+class QueryGate:
+    """
+    Lets background ingestion step aside for interactive queries: queries
+    mark themselves active, and ingestion waits (bounded) for them to drain
+    between embedding batches.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._active = 0
+        self.yields = 0
+
+    @contextmanager
+    def query(self):
+        with self._cond:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                if self._active == 0:
+                    self._cond.notify_all()
+
+    def yield_to_queries(self, max_wait_s: float = 0.5):
+        with self._cond:
+            if self._active:
+                self.yields += 1
+                self._cond.wait_for(lambda: self._active == 0, timeout=max_wait_s)
+
+
+QUERY_GATE = QueryGate()
+
+
+# -----------------------------
+# Jobs
+# -----------------------------
+def _process_started(pid: int) -> Optional[float]:
+    """Start time (epoch seconds) of process `pid` from /proc, or None where that is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+def _owner_alive(pid: Optional[int], since: Optional[float]) -> bool:
+    """
+    Whether process `pid` is running and was already running at `since` (when
+    it created the job), rather than a later process that reused the pid.
+    """
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    started = _process_started(pid)
+    return started is None or since is None or started <= since + 1.0
+
+
+class IngestJob:
+    def __init__(self, user_id: str, filepath: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.filepath = filepath
+        self.filename = os.path.basename(filepath)
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.pages_done = 0
+        self.pages_total = 0
+        self.chunks_done = 0
+        self.chunks_total = 0
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "user_id": self.user_id,
+            "filename": self.filename,
+            "status": self.status,
+            "error": self.error,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class IngestJobManager:
+    """
+    Bounded ingestion queue served by a small pool of low-priority worker
+    threads, with a per-user cap on running and queued jobs.
+
+    Job state is mirrored to sqlite (when `db_path` is given) so a status
+    poll that lands on a different gunicorn worker still finds the job.
+    Each row records the worker process running it; queued or running rows
+    whose process has gone (restart, crash) are reported as failed.
+    Worker threads are started lazily, so forking after import is safe.
+    """
+
+    def __init__(
+        self,
+        ingest_fn: Callable,
+        workers: int = 1,
+        max_queue: int = 16,
+        per_user_running: int = 1,
+        per_user_queued: int = 4,
+        nice: int = 10,
+        db_path: Optional[str] = None,
+        on_finish: Optional[Callable] = None,
+        keep_finished: int = 256,
+    ):
+        self.ingest_fn = ingest_fn
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.per_user_running = max(1, per_user_running)
+        self.per_user_queued = max(1, per_user_queued)
+        self.nice = nice
+        self.db_path = db_path
+        self.on_finish = on_finish
+        self.keep_finished = keep_finished
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._running: Dict[str, int] = {}
+        self._threads = []
+        self._pid = None
+        self._stopping = False
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        if self.db_path:
+            with connect(self.db_path) as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS ingest_jobs (
+                        id TEXT PRIMARY KEY,
+                        user_id TEXT,
+                        filename TEXT,
+                        status TEXT,
+                        error TEXT,
+                        pages_done INTEGER,
+                        pages_total INTEGER,
+                        chunks_done INTEGER,
+                        chunks_total INTEGER,
+                        created REAL,
+                        started REAL,
+                        finished REAL,
+                        pid INTEGER
+                    )
+                """)
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(ingest_jobs)")}
+                if "pid" not in columns:
+                    conn.execute("ALTER TABLE ingest_jobs ADD COLUMN pid INTEGER")
+            self._fail_interrupted()
+
+    # -- persistence -------------------------------------------------------
+    def _persist(self, job: IngestJob):
+        if not self.db_path:
+            return
+        d = job.to_dict()
+        try:
+            with connect(self.db_path) as conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO ingest_jobs
+                    (id, user_id, filename, status, error, pages_done, pages_total,
+                     chunks_done, chunks_total, created, started, finished, pid)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (d["job_id"], d["user_id"], d["filename"], d["status"], d["error"],
+                     d["pages_done"], d["pages_total"], d["chunks_done"], d["chunks_total"],
+                     d["created"], d["started"], d["finished"], os.getpid()),
+                )
+        except sqlite3.Error as e:
+            print("⚠️ Could not persist ingest job status:", e)
+
+    def _fail_interrupted(self, job_id: Optional[str] = None) -> int:
+        """
+        Marks queued/running rows (all, or just `job_id`) whose worker process
+        is no longer alive as failed, so status polls stop waiting on them.
+        """
+        query = "SELECT id, pid, created FROM ingest_jobs WHERE status IN ('queued', 'running')"
+        args = ()
+        if job_id is not None:
+            query, args = query + " AND id = ?", (job_id,)
+        try:
+            with connect(self.db_path) as conn:
+                gone = [jid for jid, pid, created in conn.execute(query, args).fetchall()
+                        if not self._still_running(jid, pid, created)]
+                conn.executemany(
+                    "UPDATE ingest_jobs SET status = 'failed', error = 'interrupted', finished = ? "
+                    "WHERE id = ? AND status IN ('queued', 'running')",
+                    [(time.time(), jid) for jid in gone],
+                )
+        except sqlite3.Error as e:
+            print("⚠️ Could not check interrupted ingest jobs:", e)
+            return 0
+        if gone and job_id is None:
+            print(f"ℹ️ Marked {len(gone)} interrupted ingest job(s) as failed.")
+        return len(gone)
+
+    def _still_running(self, job_id: str, pid: Optional[int], created: Optional[float]) -> bool:
+        if pid == os.getpid():
+            # This process's jobs are all in memory; anything else is from an earlier process with the same pid
+            with self._cond:
+                return job_id in self._jobs
+        return _owner_alive(pid, created)
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        if not self.db_path:
+            return None
+        # A job of a worker that has since exited would otherwise stay queued/running for good
+        self._fail_interrupted(job_id)
+        with connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        d = dict(row)
+        d["job_id"] = d.pop("id")
+        d.pop("pid", None)
+        return d
+
+    # -- workers -----------------------------------------------------------
+    def _ensure_workers(self):
+        if self._pid == os.getpid() and self._threads:
+            return
+        self._pid = os.getpid()
+        self._threads = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _next_runnable(self) -> Optional[IngestJob]:
+        for i, job in enumerate(self._pending):
+            if self._running.get(job.user_id, 0) < self.per_user_running:
+                return self._pending.pop(i)
+        return None
+
+    def _worker(self):
+        # Linux applies nice values per thread, so only ingestion is deprioritised
+        if self.nice and hasattr(os, "setpriority") and hasattr(threading, "get_native_id"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+            except OSError:
+                pass
+
+        while True:
+            with self._cond:
+                job = None
+                while not self._stopping:
+                    job = self._next_runnable()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                if job is None:
+                    return
+                self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+                job.status = "running"
+                job.started = time.time()
+            self._persist(job)
+            self._run(job)
+
+    def _run(self, job: IngestJob):
+        last_persist = [0.0]
+
+        def progress(stage: str, done: int, total: int):
+            if stage == "pages":
+                job.pages_done, job.pages_total = done, total
+            elif stage == "chunks":
+                job.chunks_done, job.chunks_total = done, total
+            now = time.monotonic()
+            if now - last_persist[0] >= 0.5:
+                last_persist[0] = now
+                self._persist(job)
+
+        try:
+            self.ingest_fn(job.user_id, job.filepath, progress=progress)
+            job.status = "done"
+        except Exception as e:
+            print("⚠️ Ingest job failed:", job.id, e)
+            job.status = "failed"
+            job.error = str(e)
+        job.finished = time.time()
+
+        with self._cond:
+            self._running[job.user_id] -= 1
+            if not self._running[job.user_id]:
+                del self._running[job.user_id]
+            if job.status == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._trim_finished()
+            self._cond.notify_all()
+        self._persist(job)
+
+        if self.on_finish is not None:
+            try:
+                self.on_finish(job.to_dict())
+            except Exception as e:
+                print("⚠️ Ingest on_finish hook failed:", e)
+
+    def _trim_finished(self):
+        finished = [jid for jid, j in self._jobs.items() if j.status in ("done", "failed")]
+        for jid in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[jid]
+
+    # -- public API --------------------------------------------------------
+    def submit(self, user_id: str, filepath: str) -> dict:
+        with self._cond:
+            if len(self._pending) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull("Ingestion queue is full")
+            if sum(1 for j in self._pending if j.user_id == user_id) >= self.per_user_queued:
+                self.rejected += 1
+                raise QueueFull("Too many documents queued for this user")
+            self._ensure_workers()
+            job = IngestJob(user_id, filepath)
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._cond.notify_all()
+        self._persist(job)
+        return job.to_dict()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+        return self._load(job_id)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._pending),
+                "running": sum(self._running.values()),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "query_yields": QUERY_GATE.yields,
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
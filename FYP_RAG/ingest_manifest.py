@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from FYP_RAG.mmap_index import file_lock
+from FYP_RAG.vector_registry import vectorstore_path
+
+
+def file_sha256(filepath: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class IngestManifest:
+    """
+    Per-user record of what has been ingested, persisted as JSON:
+
+        {filename: {"file_hash": ..., "parser": ..., "vector_synced": bool,
+                    "pages": {"<page>": {"hash": ..., "chunks": [chunk ids]}}}}
+
+    Used to skip unchanged files and pages on re-ingestion and to find the
+    chunk ids that must be deleted when a page changes or disappears.
+
+    Every gunicorn worker holds its own instance of the same file: reads
+    reload it when it changed on disk, and writes reload, modify and save
+    under an exclusive file lock, so one worker never overwrites entries
+    another worker added.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._docs: Dict[str, dict] = {}
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._reload()
+
+    def _disk_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # os.replace gives every save a new inode, so this changes even within one mtime tick
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _reload(self, force: bool = False):
+        """Re-reads the file if another process replaced it. Call under _lock."""
+        stamp = self._disk_stamp()
+        if stamp == self._stamp and not force:
+            return
+        docs = {}
+        if stamp is not None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    docs = json.load(f)
+            except (OSError, ValueError) as e:
+                print("⚠️ Ingest manifest unreadable, starting fresh:", e)
+        self._docs = docs
+        self._stamp = stamp
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._reload()
+            return len(self._docs)
+
+    def get(self, filename: str) -> Optional[dict]:
+        with self._lock:
+            self._reload()
+            doc = self._docs.get(filename)
+            return json.loads(json.dumps(doc)) if doc is not None else None
+
+    def set(self, filename: str, record: dict):
+        with self._lock, self._locked():
+            self._reload(force=True)
+            self._docs[filename] = record
+            self._save()
+
+    def remove(self, filename: str):
+        with self._lock, self._locked():
+            self._reload(force=True)
+            if self._docs.pop(filename, None) is not None:
+                self._save()
+
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return file_lock(self.path + ".lock")
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._docs, f)
+        os.replace(tmp, self.path)
+        self._stamp = self._disk_stamp()
+
+
+_MANIFESTS: Dict[str, IngestManifest] = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def get_manifest(user_id: str) -> IngestManifest:
+    with _MANIFESTS_LOCK:
+        manifest = _MANIFESTS.get(user_id)
+        if manifest is None:
+            name = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+            manifest = IngestManifest(os.path.join(vectorstore_path(), "manifests", f"{name}.json"))
+            _MANIFESTS[user_id] = manifest
+        return manifest
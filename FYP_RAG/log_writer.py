@@ -0,0 +1,182 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+QUERY_LOG_SQL = """
+    INSERT INTO query_logs (user_id, query, answer, confidence, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+"""
+PERF_LOG_SQL = """
+    INSERT INTO perf_logs (user_id, kind, ref, duration_ms, success, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def connect(db_path: str, timeout: float = 5.0) -> sqlite3.Connection:
+    """Connection that waits on a busy database instead of failing with "database is locked"."""
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+    return conn
+
+
+def enable_wal(db_path: str):
+    # WAL is a property of the database file, so setting it once covers every worker
+    with connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode = WAL")
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class SQLiteLogWriter:
+    """
+    Takes query and perf log rows off the request path: rows go into a
+    bounded in-memory queue and one background thread commits them in
+    batched transactions. When the queue is full rows are dropped (and
+    counted) rather than blocking a request. Pending rows are flushed at
+    interpreter exit.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        flush_interval_s: float = 0.5,
+        max_retries: int = 5,
+    ):
+        self.db_path = db_path
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._enqueued = 0
+        self._done = 0
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        atexit.register(self.close)
+
+    # -- producer side -----------------------------------------------------
+    def _put(self, sql: str, row: tuple):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._ensure_thread()
+            self._queue.append((sql, row))
+            self._enqueued += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def log_query(self, user_id, query, answer, confidence):
+        self._put(QUERY_LOG_SQL, (user_id, query, answer, str(confidence), _now()))
+
+    def log_perf(self, user_id, kind, ref, duration_ms, success):
+        self._put(PERF_LOG_SQL, (user_id, kind, ref, int(duration_ms), 1 if success else 0, _now()))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Blocks until every row queued so far is committed (or dropped after retries)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._enqueued
+            if self._done >= target:
+                return True
+            self._ensure_thread()
+            self._cond.notify_all()
+            while self._done < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout: float = 5.0):
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
+
+    # -- writer thread -----------------------------------------------------
+    def _ensure_thread(self):
+        # Called with the lock held; a forked worker starts its own writer
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="sqlite-log-writer", daemon=True)
+        self._thread.start()
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            # Rows accumulate until a batch fills, flush() is called or the interval passes
+            if not self._queue and not self._stopping:
+                self._cond.wait(self.flush_interval_s)
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            return batch
+
+    def _commit(self, conn: sqlite3.Connection, batch: list) -> bool:
+        by_sql = {}
+        for sql, row in batch:
+            by_sql.setdefault(sql, []).append(row)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with conn:
+                    for sql, rows in by_sql.items():
+                        conn.executemany(sql, rows)
+                return True
+            except sqlite3.OperationalError as e:
+                if attempt == self.max_retries:
+                    print("⚠️ Dropping log batch after retries:", e)
+                    return False
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+        return False
+
+    def _run(self):
+        conn = connect(self.db_path)
+        # Log rows are not worth an fsync per commit; WAL + NORMAL stays consistent on crash
+        conn.execute("PRAGMA synchronous = NORMAL")
+        try:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    with self._cond:
+                        if self._stopping and not self._queue:
+                            return
+                    continue
+                ok = self._commit(conn, batch)
+                with self._cond:
+                    self._done += len(batch)
+                    self.batches += 1
+                    if ok:
+                        self.written += len(batch)
+                    else:
+                        self.failed += len(batch)
+                    self._cond.notify_all()
+        finally:
+            conn.close()
@@ -0,0 +1,193 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+# Seconds; spans cache lookups (sub-ms) up to Granite calls near the request deadline
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_num(v)}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format."""
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            s = self._series.get(labels)
+            return s[2] if s else 0
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """labels -> (count, sum)."""
+        with self._lock:
+            return {labels: (s[2], s[1]) for labels, s in self._series.items()}
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, n) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{_num(bound)}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {repr(total)}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {n}")
+        return "\n".join(lines)
+
+
+# -----------------------------
+# Pipeline metrics
+# -----------------------------
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Latency of each RAG pipeline stage in seconds.",
+    ["stage"],
+)
+RETRIEVAL_TOTAL = Counter(
+    "rag_retrieval_total",
+    "Queries answered per retrieval method.",
+    ["method"],
+)
+RETRIEVAL_FALLBACK_TOTAL = Counter(
+    "rag_retrieval_fallback_total",
+    "Vector retrievals that fell back to the token index, by reason.",
+    ["reason"],
+)
+ANSWER_FALLBACK_TOTAL = Counter(
+    "rag_answer_fallback_total",
+    "Answers replaced by the extractive fallback, by reason.",
+    ["reason"],
+)
+
+COALESCED_TOTAL = Counter(
+    "rag_coalesced_queries_total",
+    "Queries that waited for an identical in-flight query instead of running their own, by scope.",
+    ["scope"],
+)
+
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens",
+    "Estimated Granite prompt size per query, in tokens.",
+    buckets=(128, 256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096),
+)
+
+EMBED_TEXTS_TOTAL = Counter(
+    "rag_embedding_texts_total",
+    "Texts passed to the embedding function, by embedding cache result.",
+    ["result"],
+)
+
+_METRICS = [STAGE_SECONDS, RETRIEVAL_TOTAL, RETRIEVAL_FALLBACK_TOTAL, ANSWER_FALLBACK_TOTAL, COALESCED_TOTAL,
+            PROMPT_TOKENS, EMBED_TEXTS_TOTAL]
+
+
+@contextmanager
+def stage(name: str):
+    """Times the enclosed block into rag_stage_seconds{stage=name}, including when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, name)
+
+
+def timed(name: str):
+    """Decorator form of stage()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def register(metric):
+    _METRICS.append(metric)
+    return metric
+
+
+def render(extra: Optional[Iterable[str]] = None) -> str:
+    """All metrics in Prometheus text format (version 0.0.4)."""
+    parts = [m.render() for m in _METRICS]
+    parts.extend(extra or ())
+    return "\n".join(parts) + "\n"
+
+
+def _render_values(name: str, help_text: str, kind: str,
+                   values: Dict[Tuple[Tuple[str, str], ...], float]) -> str:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, v in values.items():
+        label_str = "{" + ",".join(f'{k}="{_escape(val)}"' for k, val in labels) + "}" if labels else ""
+        lines.append(f"{name}{label_str} {_num(v)}")
+    return "\n".join(lines)
+
+
+def gauge(name: str, help_text: str, values: Dict[Tuple[Tuple[str, str], ...], float]) -> str:
+    """Renders a point-in-time gauge; `values` maps ((label, value), ...) tuples to numbers."""
+    return _render_values(name, help_text, "gauge", values)
+
+
+def counter(name: str, help_text: str, values: Dict[Tuple[Tuple[str, str], ...], float]) -> str:
+    """Renders totals kept elsewhere (e.g. a component's stats()) as a counter; name should end in _total."""
+    return _render_values(name, help_text, "counter", values)
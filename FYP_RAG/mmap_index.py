@@ -0,0 +1,431 @@
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: single process, no cross-worker locking needed
+    fcntl = None
+
+from FYP_RAG.text_utils import analyze_sentences, terms
+from FYP_RAG.vector_registry import vectorstore_path
+
+MAGIC = b"FYPIDX02"
+# magic, n_chunks, n_terms, n_postings, n_sentences, then section offsets/lengths and total token count
+HEADER = struct.Struct("<8sIIIIQQQQQQQQQQQQQQ")
+# text_off, text_len, page, chunk, source_idx, tok_off, tok_len, sent_off, sent_count
+CHUNK = struct.Struct("<QIiiIQIII")
+# start, end (char offsets in the chunk text), term-id offset, term-id count
+SENTENCE = struct.Struct("<IIII")
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock shared by every process on the dyno."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _pad(buf: bytearray, align: int = 8):
+    buf.extend(b"\0" * (-len(buf) % align))
+
+
+# -----------------------------
+# Global vocabulary
+# -----------------------------
+class Vocabulary:
+    """
+    Append-only term table (one term per line, id = line number) shared by
+    all workers. Each process keeps the term -> id dict and tails the file
+    for terms interned by other processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._offset = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _catch_up(self):
+        try:
+            if os.path.getsize(self.path) <= self._offset:
+                return
+        except OSError:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for term in data[:end].decode("utf-8").splitlines():
+            if term not in self._ids:
+                self._ids[term] = len(self._terms)
+                self._terms.append(term)
+        self._offset += end
+
+    def lookup(self, term: str) -> Optional[int]:
+        with self._lock:
+            tid = self._ids.get(term)
+            if tid is None:
+                self._catch_up()
+                tid = self._ids.get(term)
+            return tid
+
+    def term(self, tid: int) -> str:
+        if tid >= len(self._terms):
+            with self._lock:
+                self._catch_up()
+        return self._terms[tid]
+
+    def intern(self, words: Iterable[str]) -> Dict[str, int]:
+        words = set(words)
+        with self._lock:
+            missing = [w for w in words if w not in self._ids]
+            if missing:
+                with file_lock(self.path + ".lock"):
+                    self._catch_up()
+                    missing = sorted(w for w in missing if w not in self._ids)
+                    if missing:
+                        with open(self.path, "ab") as f:
+                            f.write(("\n".join(missing) + "\n").encode("utf-8"))
+                        self._catch_up()
+            return {w: self._ids[w] for w in words}
+
+
+# -----------------------------
+# Read-only mapped segment
+# -----------------------------
+class MappedSegment:
+    """
+    One user's chunks as a single read-only memory-mapped file:
+    chunk table, per-chunk sorted term-id arrays, document lengths,
+    BM25 postings (term id -> chunk ids + tf), sentence spans with their
+    term ids, a (source, page, chunk) ordering and a UTF-8 string table.
+    Pages are shared by every worker that maps the same file.
+    """
+
+    def __init__(self, path: str, vocab: Vocabulary):
+        self.path = path
+        self.vocab = vocab
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a local index segment (or an older format): {path}")
+        (_, self.n_chunks, n_terms, n_postings, n_sentences,
+         sources_off, sources_len, chunks_off, doclen_off, tokens_off, tokens_len,
+         dir_off, postings_off, self._sent_off, sent_tokens_off, sent_tokens_len, keys_off,
+         self.text_off, self.total_len) = HEADER.unpack_from(self._mm, 0)
+
+        mv = memoryview(self._mm)
+        self.sources: List[str] = json.loads(bytes(mv[sources_off:sources_off + sources_len]).decode("utf-8"))
+        self._chunks_off = chunks_off
+        self._doc_len = mv[doclen_off:doclen_off + 4 * self.n_chunks].cast("I")
+        self._tokens = mv[tokens_off:tokens_off + 4 * tokens_len].cast("I")
+        self._dir_terms = mv[dir_off:dir_off + 4 * n_terms].cast("I")
+        offs_at = dir_off + 4 * n_terms + (-(4 * n_terms) % 8)
+        self._dir_offs = mv[offs_at:offs_at + 8 * n_terms].cast("Q")
+        lens_at = offs_at + 8 * n_terms
+        self._dir_lens = mv[lens_at:lens_at + 4 * n_terms].cast("I")
+        self._post_docs = mv[postings_off:postings_off + 4 * n_postings].cast("I")
+        tfs_at = postings_off + 4 * n_postings
+        self._post_tfs = mv[tfs_at:tfs_at + 4 * n_postings].cast("I")
+        self._sent_tokens = mv[sent_tokens_off:sent_tokens_off + 4 * sent_tokens_len].cast("I")
+        # Chunk indices ordered by (source, page, chunk) for find()
+        self._keys = mv[keys_off:keys_off + 4 * self.n_chunks].cast("I")
+
+    def __len__(self) -> int:
+        return self.n_chunks
+
+    def _record(self, i: int):
+        return CHUNK.unpack_from(self._mm, self._chunks_off + i * CHUNK.size)
+
+    def chunk(self, i: int) -> dict:
+        text_off, text_len, page, chunk, source_idx, _, _, sent_off, sent_count = self._record(i)
+        start = self.text_off + text_off
+        spans, sentence_terms = [], []
+        term = self.vocab.term
+        for j in range(sent_off, sent_off + sent_count):
+            s_start, s_end, tok_off, tok_len = SENTENCE.unpack_from(self._mm, self._sent_off + j * SENTENCE.size)
+            spans.append((s_start, s_end))
+            sentence_terms.append(frozenset(term(t) for t in self._sent_tokens[tok_off:tok_off + tok_len]))
+        return {
+            "source": self.sources[source_idx],
+            "page": page,
+            "chunk": chunk,
+            "text": self._mm[start:start + text_len].decode("utf-8"),
+            "sentences": spans,
+            "sentence_terms": sentence_terms,
+        }
+
+    def _key(self, i: int) -> tuple:
+        _, _, page, chunk, source_idx, _, _, _, _ = self._record(i)
+        return self.sources[source_idx], page, chunk
+
+    def find(self, source: str, page: int, chunk: int) -> Optional[dict]:
+        """The chunk with this (source, page, chunk) id, or None (binary search, no per-worker map)."""
+        key = (source, page, chunk)
+        lo, hi = 0, self.n_chunks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(self._keys[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_chunks and self._key(self._keys[lo]) == key:
+            return self.chunk(self._keys[lo])
+        return None
+
+    def iter_chunks(self) -> Iterator[dict]:
+        for i in range(self.n_chunks):
+            yield self.chunk(i)
+
+    def term_ids(self, i: int):
+        _, _, _, _, _, tok_off, tok_len, _, _ = self._record(i)
+        return self._tokens[tok_off:tok_off + tok_len]
+
+    def overlap(self, i: int, q_ids: Iterable[int]) -> int:
+        """How many of the query term ids occur in chunk i (binary search on its sorted ids)."""
+        toks = self.term_ids(i)
+        count = 0
+        for t in q_ids:
+            j = bisect.bisect_left(toks, t)
+            if j < len(toks) and toks[j] == t:
+                count += 1
+        return count
+
+    def bm25_search(self, q_ids: Iterable[int], k: int = 5, k1: float = 1.5, b: float = 0.75):
+        n = self.n_chunks
+        if not n:
+            return []
+        avgdl = self.total_len / n or 1.0
+        doc_len = self._doc_len
+        scores: Dict[int, float] = {}
+        for tid in set(q_ids):
+            j = bisect.bisect_left(self._dir_terms, tid)
+            if j == len(self._dir_terms) or self._dir_terms[j] != tid:
+                continue
+            off, ln = self._dir_offs[j], self._dir_lens[j]
+            idf = math.log(1.0 + (n - ln + 0.5) / (ln + 0.5))
+            for doc_id, tf in zip(self._post_docs[off:off + ln], self._post_tfs[off:off + ln]):
+                norm = k1 * (1.0 - b + b * doc_len[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+        return heapq.nlargest(k, ((score, doc_id) for doc_id, score in scores.items()))
+
+
+def write_segment(path: str, chunks: List[dict], vocab: Vocabulary):
+    """Serialises chunks into a new segment and atomically replaces `path`."""
+    sources: List[str] = []
+    source_idx: Dict[str, int] = {}
+    counts = [Counter(terms(c.get("text") or "")) for c in chunks]
+    # Sentence term sets are subsets of the chunk's terms, so interning the chunk terms covers them
+    ids = vocab.intern(w for cnt in counts for w in cnt)
+
+    texts = bytearray()
+    records = bytearray()
+    doc_lens = array("I")
+    tokens = array("I")
+    sentences = bytearray()
+    sent_tokens = array("I")
+    n_sentences = 0
+    postings: Dict[int, List[tuple]] = {}
+    total_len = 0
+    for i, (c, cnt) in enumerate(zip(chunks, counts)):
+        src = c.get("source") or ""
+        if src not in source_idx:
+            source_idx[src] = len(sources)
+            sources.append(src)
+        raw = c.get("text") or ""
+        text = raw.encode("utf-8")
+        tids = sorted(ids[w] for w in cnt)
+
+        spans, sentence_terms = c.get("sentences"), c.get("sentence_terms")
+        if spans is None or sentence_terms is None:
+            spans, sentence_terms = analyze_sentences(raw)
+        sent_off = n_sentences
+        for (s_start, s_end), s_terms in zip(spans, sentence_terms):
+            s_ids = sorted(ids[w] for w in s_terms)
+            sentences += SENTENCE.pack(s_start, s_end, len(sent_tokens), len(s_ids))
+            sent_tokens.extend(s_ids)
+            n_sentences += 1
+
+        records += CHUNK.pack(len(texts), len(text), int(c.get("page") or 0), int(c.get("chunk") or 0),
+                              source_idx[src], len(tokens), len(tids), sent_off, n_sentences - sent_off)
+        texts += text
+        tokens.extend(tids)
+        length = sum(cnt.values())
+        doc_lens.append(length)
+        total_len += length
+        for w, tf in cnt.items():
+            postings.setdefault(ids[w], []).append((i, tf))
+
+    dir_terms = array("I", sorted(postings))
+    dir_offs = array("Q")
+    dir_lens = array("I")
+    post_docs = array("I")
+    post_tfs = array("I")
+    for tid in dir_terms:
+        plist = postings[tid]
+        dir_offs.append(len(post_docs))
+        dir_lens.append(len(plist))
+        post_docs.extend(d for d, _ in plist)
+        post_tfs.extend(tf for _, tf in plist)
+
+    keys = array("I", sorted(range(len(chunks)), key=lambda i: (
+        chunks[i].get("source") or "", int(chunks[i].get("page") or 0), int(chunks[i].get("chunk") or 0))))
+
+    body = bytearray(b"\0" * HEADER.size)
+    _pad(body)
+
+    def section(data: bytes) -> int:
+        off = len(body)
+        body.extend(data)
+        _pad(body)
+        return off
+
+    sources_blob = json.dumps(sources).encode("utf-8")
+    sources_off = section(sources_blob)
+    chunks_off = section(records)
+    doclen_off = section(doc_lens.tobytes())
+    tokens_off = section(tokens.tobytes())
+    dir_off = section(dir_terms.tobytes())
+    section(dir_offs.tobytes())
+    section(dir_lens.tobytes())
+    postings_off = len(body)
+    body.extend(post_docs.tobytes())
+    body.extend(post_tfs.tobytes())
+    _pad(body)
+    sent_off = section(sentences)
+    sent_tokens_off = section(sent_tokens.tobytes())
+    keys_off = section(keys.tobytes())
+    text_off = section(texts)
+
+    HEADER.pack_into(body, 0, MAGIC, len(chunks), len(dir_terms), len(post_docs), n_sentences,
+                     sources_off, len(sources_blob), chunks_off, doclen_off, tokens_off, len(tokens),
+                     dir_off, postings_off, sent_off, sent_tokens_off, len(sent_tokens), keys_off,
+                     text_off, total_len)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# -----------------------------
+# Store
+# -----------------------------
+class LocalIndexStore:
+    """
+    Directory of per-user segments plus the shared vocabulary. Readers
+    re-map a segment when its file is replaced, so every worker sees an
+    ingest as soon as the writer's os.replace lands.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.vocab = Vocabulary(os.path.join(root, "vocab.txt"))
+        self._lock = threading.Lock()
+        self._open: Dict[str, tuple] = {}
+
+    def path(self, name: str) -> str:
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, "segments", f"{digest}.seg")
+
+    @contextmanager
+    def writing(self, name: str):
+        """Serialises read-modify-write of one segment across threads and processes."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with file_lock(path + ".lock"):
+            yield
+
+    def write(self, name: str, chunks: List[dict]):
+        write_segment(self.path(name), chunks, self.vocab)
+
+    def remove(self, name: str):
+        """Deletes a segment; readers still holding its mapping keep it until they drop it."""
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._open.pop(name, None)
+
+    def open(self, name: str) -> Optional[MappedSegment]:
+        path = self.path(name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._open.get(name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            try:
+                seg = MappedSegment(path, self.vocab)
+            except (OSError, ValueError) as e:
+                print("⚠️ Could not map local index segment:", e)
+                return None
+            # The old mapping stays valid for readers still holding it and is released with them
+            self._open[name] = (key, seg)
+            return seg
+
+    def query_ids(self, q_tokens: Iterable[str]) -> List[int]:
+        out = []
+        for t in q_tokens:
+            tid = self.vocab.lookup(t)
+            if tid is not None:
+                out.append(tid)
+        return out
+
+    def overlap_search(self, seg: MappedSegment, q_tokens: set, q_terms: set, k: int = 5,
+                       min_score: float = 0.1) -> list:
+        """
+        BM25 candidates for `q_terms`, reported as [(overlap ratio, chunk), ...]:
+        the share of `q_tokens` found in the chunk, so confidence labels stay
+        comparable with the token-overlap scores used before BM25.
+        """
+        q_ids = self.query_ids(q_tokens)
+        scored = []
+        for _, doc_id in seg.bm25_search(self.query_ids(q_terms), k=k):
+            score = seg.overlap(doc_id, q_ids) / max(len(q_tokens), 1)
+            if score > min_score:
+                scored.append((score, seg.chunk(doc_id)))
+        return scored
+
+
+_STORE: Optional[LocalIndexStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_local_store() -> LocalIndexStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = LocalIndexStore(os.path.join(vectorstore_path(), "local_index"))
+    return _STORE
@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from FYP_RAG.vector_registry import vectorstore_path
+
+
+class ParseCache:
+    """
+    Parser output on disk, keyed by (file SHA-256, parser version): the raw
+    text of each PDF page (PyPDF2) or the text segments with their page
+    (Docling), before cleaning and chunking. One gzip-compressed JSON file
+    per document and version, replaced atomically so workers never read a
+    partial record.
+
+    Chunking runs from these records, so changing the chunk size or strategy
+    re-chunks a corpus without opening a single PDF. A new parser version
+    (PyPDF2 upgrade, extraction fix) is a different key, never a stale hit.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def path(self, file_hash: str, version: str) -> str:
+        safe = "".join(ch if ch.isalnum() or ch in ".-_" else "_" for ch in version)
+        return os.path.join(self.root, file_hash[:2], f"{file_hash}.{safe}.json.gz")
+
+    def get(self, file_hash: str, version: str) -> Optional[dict]:
+        try:
+            with gzip.open(self.path(file_hash, version), "rt", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            record = None
+        except (OSError, ValueError) as e:
+            print("⚠️ Parse cache entry unreadable, parsing again:", e)
+            record = None
+        with self._lock:
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return record
+
+    def put(self, file_hash: str, version: str, record: dict):
+        path = self.path(file_hash, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # mtime=0 keeps identical records byte-identical
+        with open(tmp, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            f.write(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+        os.replace(tmp, path)
+        with self._lock:
+            self.writes += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "writes": self.writes,
+            }
+
+
+_CACHE: Optional[ParseCache] = None
+_CACHE_LOCK = threading.Lock()
+_CACHE_INIT = False
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """Returns the process-wide cache, or None when PARSE_CACHE_ENABLED=0."""
+    global _CACHE, _CACHE_INIT
+    if not _CACHE_INIT:
+        with _CACHE_LOCK:
+            if not _CACHE_INIT:
+                if os.getenv("PARSE_CACHE_ENABLED", "1") == "1":
+                    _CACHE = ParseCache(os.getenv("PARSE_CACHE_PATH") or os.path.join(vectorstore_path(), "parse_cache"))
+                _CACHE_INIT = True
+    return _CACHE
+
+
+def page_texts(record: Optional[dict]) -> Dict[int, str]:
+    """{page: raw text} of a PyPDF2 record (JSON keys are strings)."""
+    return {int(p): t for p, t in ((record or {}).get("pages") or {}).items()}
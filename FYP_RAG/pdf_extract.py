@@ -0,0 +1,228 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import PyPDF2
+
+from FYP_RAG.ingest_manifest import file_sha256
+from FYP_RAG.parse_cache import get_parse_cache, page_texts
+from FYP_RAG.text_utils import analyze_sentences, clean_text, split_sentences, tokenize
+
+# CHUNK_SENTENCES changes the chunking without re-parsing: pages come from the parse cache
+SENTENCES_PER_CHUNK = max(1, int(os.getenv("CHUNK_SENTENCES", "4")))
+# Key of cached page text; bump the suffix when extraction itself changes
+PARSER_VERSION = f"pypdf2-{PyPDF2.__version__}-1"
+
+
+def parser_id() -> str:
+    """Parser and chunking settings the stored chunks were built with (manifests, document store)."""
+    return f"pypdf2/s{SENTENCES_PER_CHUNK}"
+
+
+def chunk_page(text: str, filename: str, page_num: int) -> List[dict]:
+    """Splits one page of cleaned text into blocks of SENTENCES_PER_CHUNK sentences (CHUNK_SENTENCES)."""
+    chunks = []
+    sentences = split_sentences(text)
+    for i in range(0, len(sentences), SENTENCES_PER_CHUNK):
+        block = " ".join(sentences[i:i + SENTENCES_PER_CHUNK])
+        if not block.strip():
+            continue
+
+        # Sentence offsets and term sets are stored so answering never re-splits or re-tokenizes
+        spans, sentence_terms = analyze_sentences(block)
+        chunks.append({
+            "source": filename,
+            "page": page_num,
+            "chunk": (i // SENTENCES_PER_CHUNK) + 1,
+            "text": block,
+            "tokens": tokenize(block),
+            "sentences": spans,
+            "sentence_terms": sentence_terms,
+        })
+    return chunks
+
+
+def chunk_pages(texts: Dict[int, str], filename: str) -> List[dict]:
+    """Chunks raw page texts ({page: text}) in page order."""
+    chunks = []
+    for page_num in sorted(texts):
+        text = clean_text(texts[page_num])
+        if text:
+            chunks.extend(chunk_page(text, filename, page_num))
+    return chunks
+
+
+def extract_pages(filepath: str, filename: str, page_nums: List[int]) -> Tuple[Dict[int, str], List[dict]]:
+    """Raw text and chunks of the given 1-based pages. Runs inside pool workers."""
+    texts = {}
+    with open(filepath, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for page_num in page_nums:
+            texts[page_num] = reader.pages[page_num - 1].extract_text() or ""
+    return texts, chunk_pages(texts, filename)
+
+
+def _page_hash(page) -> str:
+    h = hashlib.sha256()
+    try:
+        contents = page.get_contents()
+        if contents is not None:
+            h.update(contents.get_data())
+    except Exception:
+        # Unreadable stream: fall back to the extracted text so the page still gets a stable hash
+        h.update((page.extract_text() or "").encode("utf-8"))
+    return h.hexdigest()
+
+
+def page_hashes(filepath: str) -> List[str]:
+    """
+    SHA-256 of each page's raw content stream. Much cheaper than text
+    extraction, so unchanged pages can be skipped before any parsing.
+    """
+    with open(filepath, "rb") as f:
+        return [_page_hash(page) for page in PyPDF2.PdfReader(f).pages]
+
+
+def parse_stream(stream: BinaryIO, filename: str, progress: Optional[Callable] = None) -> dict:
+    """
+    Parse-cache record (raw page text and page hashes) of a PDF read from a
+    seekable binary stream. PyPDF2 only reads the trailer, cross-reference
+    table and the objects of each page, so over a ranged reader pages are
+    parsed while the rest of the file is still arriving.
+    """
+    reader = PyPDF2.PdfReader(stream)
+    n_pages = len(reader.pages)
+    texts, hashes = {}, []
+    for page_num, page in enumerate(reader.pages, start=1):
+        if progress:
+            progress("pages", page_num, n_pages)
+        texts[str(page_num)] = page.extract_text() or ""
+        hashes.append(_page_hash(page))
+    return {"filename": filename, "n_pages": n_pages, "pages": texts, "page_hashes": hashes}
+
+
+def _page_batches(page_nums: List[int], workers: int) -> List[List[int]]:
+    # A few batches per worker so one dense section of the report does not stall the merge
+    n_batches = min(len(page_nums), workers * 4)
+    size, extra = divmod(len(page_nums), n_batches)
+    batches, start = [], 0
+    for i in range(n_batches):
+        end = start + size + (1 if i < extra else 0)
+        batches.append(page_nums[start:end])
+        start = end
+    return batches
+
+
+def _mp_context():
+    # Never fork a process that may be running gunicorn/ingestion threads
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def extract_chunks(
+    filepath: str,
+    workers: int = 1,
+    progress: Optional[Callable] = None,
+    pages: Optional[List[int]] = None,
+    file_hash: Optional[str] = None,
+    base_hash: Optional[str] = None,
+) -> List[dict]:
+    """
+    Extracts and chunks a PDF (or only `pages`, 1-based). Page text already
+    in the parse cache for this file hash is chunked without opening the
+    PDF; only missing pages are extracted, then cached. `base_hash` names an
+    earlier version of the file (the one a re-upload replaces): its cached
+    pages whose content hash is unchanged are reused, so one revised page
+    means one page of parsing. With workers > 1 the pages are split across a
+    process pool; results are merged in page order so chunk ids match the
+    single-process path exactly.
+    """
+    filename = os.path.basename(filepath)
+    cache = get_parse_cache()
+    record = None
+    if cache is not None:
+        file_hash = file_hash or file_sha256(filepath)
+        record = cache.get(file_hash, PARSER_VERSION)
+    cached = page_texts(record)
+
+    n_pages = record["n_pages"] if record is not None else None
+    if pages is None:
+        if n_pages is None:
+            with open(filepath, "rb") as f:
+                n_pages = len(PyPDF2.PdfReader(f).pages)
+        pages = list(range(1, n_pages + 1))
+    else:
+        pages = sorted(pages)
+    todo = [p for p in pages if p not in cached]
+
+    hashes = (record or {}).get("page_hashes")
+    reused = {}
+    if cache is not None and todo and base_hash and base_hash != file_hash:
+        base = cache.get(base_hash, PARSER_VERSION)
+        if base is not None and base.get("page_hashes"):
+            base_texts = page_texts(base)
+            # By hash, not position, so pages inserted or removed before a revision still match
+            by_hash = {h: base_texts[n] for n, h in enumerate(base["page_hashes"], start=1) if n in base_texts}
+            hashes = hashes or page_hashes(filepath)
+            reused = {p: by_hash[hashes[p - 1]] for p in todo if hashes[p - 1] in by_hash}
+            todo = [p for p in todo if p not in reused]
+            cached.update(reused)
+            print(f"ℹ️ {filename}: {len(reused)} unchanged page(s) reused from the previous version, "
+                  f"{len(todo)} to parse.")
+
+    texts, chunks = _extract(filepath, filename, todo, workers, progress) if todo else ({}, [])
+    if cache is not None and (texts or reused):
+        if record is None:
+            if n_pages is None:
+                with open(filepath, "rb") as f:
+                    n_pages = len(PyPDF2.PdfReader(f).pages)
+            record = {"filename": filename, "n_pages": n_pages, "pages": {}}
+        record["pages"].update({str(p): t for p, t in {**reused, **texts}.items()})
+        # Page hashes let the next revision of this file reuse its unchanged pages
+        record["page_hashes"] = hashes or page_hashes(filepath)
+        cache.put(file_hash, PARSER_VERSION, record)
+
+    from_cache = {p: cached[p] for p in pages if p in cached}
+    if not from_cache:
+        return chunks
+    if progress:
+        progress("pages", len(pages), len(pages))
+    chunks = chunks + chunk_pages(from_cache, filename)
+    return sorted(chunks, key=lambda c: (c["page"], c["chunk"]))
+
+
+def _extract(filepath: str, filename: str, pages: List[int], workers: int,
+             progress: Optional[Callable]) -> Tuple[Dict[int, str], List[dict]]:
+    total_pages = len(pages)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or total_pages < 2 * workers:
+        texts = {}
+        with open(filepath, "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            for done, page_num in enumerate(pages, start=1):
+                if progress:
+                    progress("pages", done, total_pages)
+                texts[page_num] = reader.pages[page_num - 1].extract_text() or ""
+        return texts, chunk_pages(texts, filename)
+
+    batches = _page_batches(pages, workers)
+    results = {}
+    pages_done = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) as pool:
+        futures = {pool.submit(extract_pages, filepath, filename, batch): i for i, batch in enumerate(batches)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            results[i] = fut.result()
+            pages_done += len(batches[i])
+            if progress:
+                progress("pages", pages_done, total_pages)
+
+    texts, chunks = {}, []
+    for i in range(len(batches)):
+        texts.update(results[i][0])
+        chunks.extend(results[i][1])
+    return texts, chunks
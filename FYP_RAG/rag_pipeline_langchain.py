@@ -1,13 +1,223 @@
+import asyncio
 import os
-from typing import Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 
-# Minimal LangChain pipeline wrapper that delegates to existing RAG functions
-from langchain_core.runnables import RunnableLambda
+# LangChain pipeline wrapper that delegates to the existing RAG functions
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.runnables.utils import AddableDict
 
-from FYP_RAG.rag_query_ibm import run_rag_query, ingest_local_document, ingest_document_docling
+from FYP_RAG.answer_cache import get_answer_cache
+from FYP_RAG.rag_query_ibm import (
+    GRANITE_PARAMETERS,
+    _no_results,
+    _retrieve,
+    _summarize,
+    compose_answer,
+    granite_messages,
+    granite_text,
+    ingest_document_docling,
+    ingest_local_document,
+    retrieve_many,
+    run_rag_query,
+    stream_rag_query,
+    tokenize,
+)
+from FYP_RAG.watsonx_client import get_async_watsonx_client, get_watsonx_client
 
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("RAG_PIPELINE_MAX_CONCURRENCY", "8"))
+RETRIEVAL_BATCH_SIZE = int(os.getenv("RAG_PIPELINE_RETRIEVAL_BATCH", "32"))
 
-def build_pipeline(user_id: str, prefer_docling: bool = True):
+
+def _question(payload: Dict[str, Any]) -> str:
+    question = (payload or {}).get("question")
+    if not question:
+        raise ValueError("question required")
+    return question
+
+
+# -----------------------------
+# Answer runnable
+# -----------------------------
+class RAGAnswerRunnable(Runnable[Dict[str, Any], Dict[str, Any]]):
+    """
+    {"question": ...} -> run_rag_query result, with native batch/async paths:
+
+    - batch/abatch retrieve in groups (one embedding call and one Chroma
+      col.query per group) and then call Granite concurrently, at most
+      `max_concurrency` at a time (config["max_concurrency"] overrides it).
+    - ainvoke/abatch/astream use aiohttp for Granite.
+    - stream/astream yield AddableDict chunks: retrieval metadata first,
+      then {"token": piece} per Granite piece, then {"answer", "replaced"}
+      with the grounded answer (see stream_rag_query).
+
+    Cached answers are served from, and fresh ones stored in, the answer cache
+    as with run_rag_query. Batch calls do not go through the web admission
+    limit; max_concurrency bounds them instead.
+    """
+
+    def __init__(self, user_id: str, max_concurrency: Optional[int] = None,
+                 retrieval_batch_size: Optional[int] = None):
+        self.user_id = user_id
+        self.max_concurrency = max_concurrency or DEFAULT_MAX_CONCURRENCY
+        self.retrieval_batch_size = retrieval_batch_size or RETRIEVAL_BATCH_SIZE
+
+    def _concurrency(self, config) -> int:
+        if isinstance(config, list):
+            config = config[0] if config else None
+        return max(1, (config or {}).get("max_concurrency") or self.max_concurrency)
+
+    # -- shared steps -------------------------------------------------------
+    def _plan(self, inputs: List[Dict[str, Any]], return_exceptions: bool):
+        """
+        Resolves questions, cache hits and retrieval for a batch. Returns
+        (results, pending) where pending holds (i, question, q_tokens, top,
+        context, method, cache_key) for the entries that still need Granite.
+        """
+        results: List[Any] = [None] * len(inputs)
+        todo = []
+        cache = get_answer_cache()
+        for i, payload in enumerate(inputs):
+            try:
+                question = _question(payload)
+            except ValueError as e:
+                if not return_exceptions:
+                    raise
+                results[i] = e
+                continue
+            cache_key = cache.key(self.user_id, question) if cache is not None else None
+            cached = cache.get(cache_key) if cache is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                todo.append((i, question, cache_key))
+
+        pending = []
+        for start in range(0, len(todo), self.retrieval_batch_size):
+            group = todo[start:start + self.retrieval_batch_size]
+            retrieved = retrieve_many([q for _, q, _ in group], self.user_id)
+            for (i, question, cache_key), (top, context, method) in zip(group, retrieved):
+                if not top:
+                    results[i] = dict(_no_results(method), cache={"hit": False, "saved_ms": 0.0})
+                else:
+                    pending.append((i, question, tokenize(question), top, context, method, cache_key))
+        return results, pending
+
+    def _finish(self, item, answer: Optional[str], error: Optional[Exception], elapsed_ms: float) -> dict:
+        _, question, q_tokens, top, context, method, cache_key = item
+        result, cacheable = compose_answer(question, q_tokens, top, context, method, answer, error)
+        cache = get_answer_cache()
+        if cache is not None and cacheable and cache_key is not None:
+            cache.put(cache_key, self.user_id, result, elapsed_ms)
+        result["cache"] = {"hit": False, "saved_ms": 0.0}
+        return result
+
+    # -- sync ---------------------------------------------------------------
+    def invoke(self, input: Dict[str, Any], config: Optional[RunnableConfig] = None, **kwargs) -> Dict[str, Any]:
+        return run_rag_query(_question(input), self.user_id)
+
+    def batch(self, inputs: List[Dict[str, Any]], config=None, *, return_exceptions: bool = False,
+              **kwargs) -> List[Any]:
+        if not inputs:
+            return []
+        results, pending = self._plan(inputs, return_exceptions)
+        client = get_watsonx_client()
+
+        def generate(item):
+            start = time.perf_counter()
+            try:
+                data = client.chat(granite_messages(item[1], item[4].text), GRANITE_PARAMETERS)
+                answer, error = granite_text(data), None
+            except Exception as e:
+                answer, error = None, e
+            return self._finish(item, answer, error, (time.perf_counter() - start) * 1000)
+
+        with ThreadPoolExecutor(max_workers=self._concurrency(config)) as pool:
+            for item, result in zip(pending, pool.map(generate, pending)):
+                results[item[0]] = result
+        return results
+
+    def stream(self, input: Dict[str, Any], config: Optional[RunnableConfig] = None,
+               **kwargs) -> Iterator[Dict[str, Any]]:
+        for event, data in stream_rag_query(_question(input), self.user_id):
+            if event == "meta":
+                yield AddableDict(data)
+            elif event == "token":
+                yield AddableDict(token=data["text"])
+            elif event == "final":
+                yield AddableDict(answer=data["answer"], replaced=data["replaced"])
+
+    # -- async --------------------------------------------------------------
+    async def ainvoke(self, input: Dict[str, Any], config: Optional[RunnableConfig] = None,
+                      **kwargs) -> Dict[str, Any]:
+        return (await self.abatch([input], config))[0]
+
+    async def abatch(self, inputs: List[Dict[str, Any]], config=None, *, return_exceptions: bool = False,
+                     **kwargs) -> List[Any]:
+        if not inputs:
+            return []
+        # Retrieval is CPU/Chroma work; keep it off the event loop
+        results, pending = await asyncio.to_thread(self._plan, inputs, return_exceptions)
+        client = get_async_watsonx_client()
+        limit = asyncio.Semaphore(self._concurrency(config))
+
+        async def generate(item):
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    data = await client.chat(granite_messages(item[1], item[4].text), GRANITE_PARAMETERS)
+                    answer, error = granite_text(data), None
+                except Exception as e:
+                    answer, error = None, e
+                # Grounding is a few hundred microseconds; not worth a thread hop
+                results[item[0]] = self._finish(item, answer, error, (time.perf_counter() - start) * 1000)
+
+        async with client.session_scope():
+            await asyncio.gather(*(generate(item) for item in pending))
+        return results
+
+    async def astream(self, input: Dict[str, Any], config: Optional[RunnableConfig] = None,
+                      **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        question = _question(input)
+        cache = get_answer_cache()
+        cache_key = cache.key(self.user_id, question) if cache is not None else None
+        cached = cache.get(cache_key) if cache is not None else None
+        if cached is not None:
+            yield AddableDict({k: cached.get(k) for k in ("sources", "confidence", "retrieval", "cache")})
+            yield AddableDict(token=cached["answer"])
+            yield AddableDict(answer=cached["answer"], replaced=False)
+            return
+
+        q_tokens = tokenize(question)
+        top, context, method = await asyncio.to_thread(_retrieve, question, self.user_id, q_tokens)
+        if not top:
+            result = _no_results(method)
+            yield AddableDict({k: result[k] for k in ("sources", "confidence", "retrieval")})
+            yield AddableDict(answer=result["answer"], replaced=True)
+            return
+
+        item = (0, question, q_tokens, top, context, method, cache_key)
+        confidence, sources = _summarize(top)
+        yield AddableDict(sources=sources, confidence=confidence, retrieval=method)
+
+        pieces, error = [], None
+        start = time.perf_counter()
+        client = get_async_watsonx_client()
+        async with client.session_scope():
+            try:
+                async for piece in client.chat_stream(granite_messages(question, context.text), GRANITE_PARAMETERS):
+                    pieces.append(piece)
+                    yield AddableDict(token=piece)
+            except Exception as e:
+                error = e
+        raw = "".join(pieces).strip()
+        result = self._finish(item, raw if error is None else None, error, (time.perf_counter() - start) * 1000)
+        yield AddableDict(answer=result["answer"], replaced=result["answer"] != raw,
+                          prompt_tokens=result["prompt_tokens"])
+
+
+def build_pipeline(user_id: str, prefer_docling: bool = True, max_concurrency: Optional[int] = None):
     def ingest(payload: Dict[str, Any]):
         path = payload.get("filepath")
         if not path:
@@ -18,14 +228,8 @@ def build_pipeline(user_id: str, prefer_docling: bool = True):
             ingest_local_document(user_id, path)
         return {"status": "ingested", "filepath": path}
 
-    def answer(payload: Dict[str, Any]):
-        question = payload.get("question")
-        if not question:
-            raise ValueError("question required")
-        return run_rag_query(question, user_id)
-
     # Compose ingest and answer as independent runnables
     return {
         "ingest": RunnableLambda(ingest),
-        "answer": RunnableLambda(answer),
+        "answer": RAGAnswerRunnable(user_id, max_concurrency=max_concurrency),
     }
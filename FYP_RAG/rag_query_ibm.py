@@ -1,264 +1,728 @@
+import importlib.util
 import os
-import re
-import requests
-from typing import Dict, List
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, List, Optional
 from pathlib import Path
 from dotenv import load_dotenv
-import PyPDF2
-import chromadb
-from chromadb.errors import ChromaError
-from chromadb.utils import embedding_functions
-try:
-    import docling
-except Exception:
-    docling = None
+
+from FYP_RAG.admission import Overloaded, get_admission
+from FYP_RAG.answer_cache import get_answer_cache, normalize_query
+from FYP_RAG.bm25_index import BM25Index
+from FYP_RAG.context_builder import ContextPack, chunk_sentences, context_token_budget, estimate_tokens, pack_context
+from FYP_RAG.doc_store import DOCUMENTS_COLLECTION, DocumentStore, get_doc_store
+from FYP_RAG.ingest_jobs import QUERY_GATE
+from FYP_RAG.ingest_manifest import file_sha256, get_manifest
+from FYP_RAG.metrics import (ANSWER_FALLBACK_TOTAL, COALESCED_TOTAL, PROMPT_TOKENS, RETRIEVAL_FALLBACK_TOTAL,
+                             RETRIEVAL_TOTAL, stage, timed)
+from FYP_RAG.mmap_index import get_local_store
+from FYP_RAG.parse_cache import get_parse_cache, page_texts
+from FYP_RAG.singleflight import SingleFlight
+from FYP_RAG.text_utils import STOPWORDS, analyze_sentences, clean_text, terms, tokenize
+from FYP_RAG.vector_registry import DEFAULT_EMBED_MODEL, get_registry
+from FYP_RAG.watsonx_client import get_token_manager, get_watsonx_client
 
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
 
-print("✅ WATSONX_API_KEY loaded:", bool(os.getenv("WATSONX_API_KEY")))
-print("✅ IBM_PROJECT_ID loaded:", bool(os.getenv("IBM_PROJECT_ID")))
-print("✅ WATSONX_URL:", os.getenv("WATSONX_URL"))
+# Heavy dependencies stay out of this module's imports so `import app` is fast:
+# chromadb (vector_registry), PyPDF2 (pdf_extract), numpy/faiss (shared_corpus),
+# docling and aiohttp load on first use, or up front in FYP_RAG.warmup.
+
+
+def log_environment():
+    print("✅ WATSONX_API_KEY loaded:", bool(os.getenv("WATSONX_API_KEY")))
+    print("✅ IBM_PROJECT_ID loaded:", bool(os.getenv("IBM_PROJECT_ID")))
+    print("✅ WATSONX_URL:", os.getenv("WATSONX_URL"))
 
 
-# In-memory index: user_id -> chunks
+# In-memory index: user_id -> chunks. With LOCAL_INDEX_BACKEND=mmap (default) ingested
+# chunks go to on-disk segments shared by all workers instead; entries placed here
+# directly (e.g. by the test scripts) still take precedence for that user.
 LOCAL_INDEX: Dict[str, List[dict]] = {}
-STOPWORDS = {
-    "the","a","an","and","or","but","if","then","than","that","this","those","these",
-    "is","are","was","were","be","been","being","of","in","on","for","to","with","without",
-    "by","as","at","from","it","its","their","there","here","such","can","may","might","should",
-    "must","could","will","would","do","does","did","not","no","yes","about","into","within","between",
-}
+# BM25 postings over LOCAL_INDEX: user_id -> (chunk list it was built from, index, {(source, page, chunk): chunk})
+LOCAL_BM25: Dict[str, tuple] = {}
+_BM25_LOCK = threading.Lock()
 
 
 # -----------------------------
 # Chroma setup + IBM Embeddings
 # -----------------------------
-def _get_vectorstore_path() -> str:
-    return str(Path(__file__).resolve().parents[1] / "vectorstore")
+def _embed_model() -> str:
+    return os.getenv("SENTENCE_TRANSFORMER_MODEL", DEFAULT_EMBED_MODEL)
 
 
 def get_chroma_collection(user_id: str):
-    client = chromadb.PersistentClient(path=_get_vectorstore_path())
-    # Use local sentence-transformers embeddings (offline-friendly)
-    emb_model = os.getenv("SENTENCE_TRANSFORMER_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-    emb_fn = None
-    try:
-        emb_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=emb_model)
-        print(f"✅ Using local embeddings: {emb_model}")
-    except Exception as e:
-        print("⚠️ SentenceTransformer embeddings unavailable; proceeding without embedding function:", e)
-    return client.get_or_create_collection(
-        name=f"user_{user_id}",
-        metadata={"hnsw:space": "cosine"},
-        embedding_function=emb_fn,
-    )
+    # Client, embedding model and collection handles are cached process-wide
+    return get_registry().collection(user_id, _embed_model())
+
+
+def get_documents_collection():
+    # Chunks of every document in the shared store; queries filter by the user's doc hashes
+    return get_registry().named_collection(DOCUMENTS_COLLECTION, _embed_model())
 
 
 # -----------------------------
 # Utils
 # -----------------------------
-def tokenize(text: str) -> set:
-    return set(re.findall(r"[a-z0-9']+", text.lower()))
+def _mmap_backend() -> bool:
+    return os.getenv("LOCAL_INDEX_BACKEND", "mmap").lower() == "mmap"
+
 
+def _doc_store() -> Optional[DocumentStore]:
+    # Stored documents are mmap segments; with LOCAL_INDEX_BACKEND=memory uploads stay per user
+    return get_doc_store() if _mmap_backend() else None
 
-def clean_text(text: str) -> str:
-    return re.sub(r"\s+", " ", text.replace("\x00", " ")).strip()
+
+def _owned_documents(user_id: str) -> Dict[str, str]:
+    """doc_hash -> filename for the user's documents in the shared store."""
+    store = _doc_store()
+    return store.owned(user_id) if store is not None else {}
+
+
+def _user_tier(user_id: str, owned: Dict[str, str]) -> bool:
+    """
+    Whether the user's own collection and segment need searching: always
+    without stored documents, and while chunks ingested per user (before the
+    document store, or placed in LOCAL_INDEX directly) remain.
+    """
+    return not owned or bool(LOCAL_INDEX.get(user_id)) or len(get_manifest(user_id)) > 0
+
+
+def _bm25_for_user(user_id: str):
+    """
+    Returns (chunks, BM25 index, chunks by id) for the user, catching up on chunks
+    appended to LOCAL_INDEX since the last sync (or rebuilding if the list was replaced).
+    """
+    docs = LOCAL_INDEX.setdefault(user_id, [])
+    with _BM25_LOCK:
+        built_from, index, by_key = LOCAL_BM25.get(user_id, (None, None, None))
+        if index is None or built_from is not docs or len(index) > len(docs):
+            index, by_key = BM25Index(), {}
+            LOCAL_BM25[user_id] = (docs, index, by_key)
+        for d in docs[len(index):]:
+            index.add(terms(d.get("text") or ""))
+            by_key[(d.get("source"), d.get("page"), d.get("chunk"))] = d
+        return docs, index, by_key
+
+
+def _index_chunks(user_id: str, chunks: List[dict]):
+    LOCAL_INDEX.setdefault(user_id, []).extend(chunks)
+    # Postings are extended at ingest time so the first fallback query pays nothing
+    _bm25_for_user(user_id)
+
+
+def _invalidate_answers(user_id: str):
+    # New chunks change what a question should retrieve; bump the user's index generation
+    cache = get_answer_cache()
+    if cache is not None:
+        cache.invalidate_user(user_id)
 
 
 # -----------------------------
 # Document ingestion
 # -----------------------------
-def ingest_local_document(user_id: str, filepath: str):
-    filename = os.path.basename(filepath)
-    chunks = []
+def _chunk_id(filename: str, c: dict) -> str:
+    return f"{filename}_p{c['page']}_c{c['chunk']}"
 
-    with open(filepath, "rb") as f:
-        reader = PyPDF2.PdfReader(f)
-        for page_num, page in enumerate(reader.pages, start=1):
-            text = clean_text(page.extract_text() or "")
-            if not text:
-                continue
-
-            sentences = re.split(r"(?<=[.!?])\s+", text)
-            for i in range(0, len(sentences), 4):
-                block = " ".join(sentences[i:i + 4])
-                if not block.strip():
-                    continue
-
-                chunks.append({
-                    "source": filename,
-                    "page": page_num,
-                    "chunk": (i // 4) + 1,
-                    "text": block,
-                    "tokens": tokenize(block),
-                })
 
-    LOCAL_INDEX.setdefault(user_id, []).extend(chunks)
+def _add_to_chroma(col, ids: List[str], chunks: List[dict], metadatas: List[dict],
+                   progress: Optional[Callable] = None):
+    """
+    Embeds and upserts chunks in batches. Between batches ingestion steps
+    aside for in-flight queries so embedding work does not starve them.
+    """
+    batch_size = max(1, int(os.getenv("INGEST_EMBED_BATCH", "64")))
+    total = len(chunks)
+    for start in range(0, total, batch_size):
+        end = start + batch_size
+        QUERY_GATE.yield_to_queries()
+        col.upsert(ids=ids[start:end], documents=[c["text"] for c in chunks[start:end]],
+                   metadatas=metadatas[start:end])
+        if progress:
+            progress("chunks", min(end, total), total)
 
-    # Also add to Chroma for vector retrieval (best-effort; fall back if embeddings unavailable)
+
+def _sync_to_chroma(user_id: str, filename: str, chunks: List[dict], stale_ids: List[str],
+                    progress: Optional[Callable] = None) -> bool:
+    """Deletes chunk ids that no longer exist and upserts `chunks`. Returns False if Chroma failed."""
     try:
         col = get_chroma_collection(user_id)
-        ids = []
-        docs = []
-        metas = []
-        for c in chunks:
-            ids.append(f"{filename}_p{c['page']}_c{c['chunk']}")
-            docs.append(c["text"])
-            metas.append({"source": filename, "page": c["page"], "chunk": c["chunk"]})
-        if docs:
-            col.add(ids=ids, documents=docs, metadatas=metas)
+        if stale_ids:
+            col.delete(ids=stale_ids)
+        _add_to_chroma(col, [_chunk_id(filename, c) for c in chunks], chunks,
+                       [{"source": filename, "page": c["page"], "chunk": c["chunk"]} for c in chunks], progress)
+        return True
     except Exception as e:
         print("⚠️ Chroma ingest failed (falling back to LOCAL_INDEX only):", e)
+        return False
+
+
+def _has_local_chunks(user_id: str, filename: str) -> bool:
+    if _mmap_backend():
+        seg = get_local_store().open(user_id)
+        return seg is not None and filename in seg.sources
+    return any(c.get("source") == filename for c in LOCAL_INDEX.get(user_id, []))
+
+
+def _replace_local_chunks(user_id: str, filename: str, pages: Optional[set], chunks: List[dict]):
+    """Swaps the user's chunks of `filename` on `pages` (None = all pages) for `chunks`."""
+    def stale(c):
+        return c.get("source") == filename and (pages is None or c.get("page") in pages)
+
+    if _mmap_backend():
+        # Rewrite the user's segment; other workers re-map it on their next query
+        store = get_local_store()
+        with store.writing(user_id):
+            seg = store.open(user_id)
+            docs = list(seg.iter_chunks()) if seg is not None else []
+            store.write(user_id, [c for c in docs if not stale(c)] + chunks)
+        return
+
+    docs = LOCAL_INDEX.setdefault(user_id, [])
+    if any(stale(c) for c in docs):
+        # A fresh list makes the BM25 index rebuild rather than keep postings of removed chunks
+        LOCAL_INDEX[user_id] = [c for c in docs if not stale(c)] + chunks
+        _bm25_for_user(user_id)
+    else:
+        _index_chunks(user_id, chunks)
+
+
+def _stale_ids(prev: dict, pages: Optional[set], keep: set) -> List[str]:
+    """Chunk ids recorded for `pages` (None = all) of a previous ingest that are not in `keep`."""
+    out = []
+    for page, rec in (prev.get("pages") or {}).items():
+        if pages is None or int(page) in pages:
+            out.extend(cid for cid in rec.get("chunks", []) if cid not in keep)
+    return out
+
+
+def _doc_metadata(doc_hash: str, filename: str, c: dict) -> dict:
+    return {"source": filename, "page": c["page"], "chunk": c["chunk"], "doc_hash": doc_hash}
+
+
+def _doc_chunk_ids(col, doc_hash: str, chunks: List[dict]) -> List[str]:
+    """
+    Chroma ids for a stored document's chunks. An id still held by a later
+    version that took over this document's chunks (_sync_revision) is left
+    to it, and the chunk gets a suffixed id instead.
+    """
+    ids = [f"{doc_hash}_p{c['page']}_c{c['chunk']}" for c in chunks]
+    got = col.get(ids=ids, include=["metadatas"]) if ids else {"ids": []}
+    taken = {cid for cid, meta in zip(got["ids"], got.get("metadatas") or [])
+             if (meta or {}).get("doc_hash") != doc_hash}
+    return [f"{cid}~{uuid.uuid4().hex[:8]}" if cid in taken else cid for cid in ids]
+
+
+def _sync_document(doc_hash: str, filename: str, chunks: List[dict], progress: Optional[Callable] = None,
+                   replace: bool = False) -> bool:
+    """
+    Upserts a stored document's chunks into the shared collection, first
+    deleting its old chunks when `replace` (re-chunked, or an earlier sync
+    failed part-way). Returns False if Chroma failed.
+    """
+    try:
+        col = get_documents_collection()
+        if replace:
+            col.delete(where={"doc_hash": doc_hash})
+        _add_to_chroma(col, _doc_chunk_ids(col, doc_hash, chunks), chunks,
+                       [_doc_metadata(doc_hash, filename, c) for c in chunks], progress)
+        return True
+    except Exception as e:
+        print("⚠️ Chroma ingest failed (document kept in the local index only):", e)
+        return False
+
+
+def _sync_revision(store: DocumentStore, doc_hash: str, filename: str, chunks: List[dict], base_hash: str,
+                   progress: Optional[Callable] = None) -> bool:
+    """
+    _sync_document for a changed re-upload whose previous version
+    (`base_hash`) no one else links: chunks identical to the previous
+    version's (same page, position and text) are re-tagged to the new
+    document in place, the rest of the old chunks are deleted, and only new
+    or changed chunks are embedded and upserted. Call under locked() of both.
+    """
+    # Until it is released the old version has no Chroma chunks of its own: linking it re-syncs it
+    store.set_synced(base_hash, False)
+    try:
+        col = get_documents_collection()
+        got = col.get(where={"doc_hash": base_hash}, include=["metadatas", "documents"])
+        old = {(meta.get("page"), meta.get("chunk"), text): cid
+               for cid, meta, text in zip(got["ids"], got["metadatas"], got["documents"])}
+        kept_ids, kept, fresh = [], [], []
+        for c in chunks:
+            cid = old.pop((c["page"], c["chunk"], c["text"]), None)
+            if cid is None:
+                fresh.append(c)
+            else:
+                kept_ids.append(cid)
+                kept.append(c)
+        if old:
+            col.delete(ids=list(old.values()))
+        if kept_ids:
+            col.update(ids=kept_ids, metadatas=[_doc_metadata(doc_hash, filename, c) for c in kept])
+        _add_to_chroma(col, _doc_chunk_ids(col, doc_hash, fresh), fresh,
+                       [_doc_metadata(doc_hash, filename, c) for c in fresh], progress)
+        print(f"ℹ️ {filename}: {len(kept)} unchanged chunk(s) kept in Chroma, {len(fresh)} upserted, "
+              f"{len(old)} removed.")
+        return True
+    except Exception as e:
+        print("⚠️ Chroma ingest failed (document kept in the local index only):", e)
+        return False
+
+
+def _revision_base(store: DocumentStore, user_id: str, filename: str, file_hash: str, parser: str) -> Optional[str]:
+    """
+    The version of `filename` this upload replaces, when its Chroma chunks can
+    be handed over to the new document: linked by this user only, synced, and
+    chunked with the same settings.
+    """
+    base = store.linked(user_id, filename)
+    if base is None or base == file_hash:
+        return None
+    doc = store.document(base)
+    if doc is None or not doc["vector_synced"] or doc["parser"] != parser or store.owners(base) != 1:
+        return None
+    return base
+
+
+@contextmanager
+def _locked_documents(store: DocumentStore, *doc_hashes: Optional[str]):
+    # Always taken in hash order, so two uploads swapping versions cannot deadlock
+    with ExitStack() as stack:
+        for doc_hash in sorted({h for h in doc_hashes if h}):
+            stack.enter_context(store.locked(doc_hash))
+        yield
+
+
+def _release_document(store: DocumentStore, doc_hash: str):
+    """Deletes a stored document once no user links to it any more."""
+    with store.locked(doc_hash):
+        if store.owners(doc_hash):
+            return
+        try:
+            get_documents_collection().delete(where={"doc_hash": doc_hash})
+        except Exception as e:
+            # Unowned chunks are never returned (queries filter by owned hashes), only disk is lost
+            print("⚠️ Could not delete document chunks from Chroma:", e)
+        store.delete_document(doc_hash)
+
+
+def _drop_user_copy(user_id: str, filename: str):
+    """Removes a per-user copy of `filename` ingested before the document store."""
+    manifest = get_manifest(user_id)
+    prev = manifest.get(filename)
+    if prev is not None:
+        try:
+            get_chroma_collection(user_id).delete(where={"source": filename})
+        except Exception as e:
+            print("⚠️ Could not delete per-user chunks from Chroma:", e)
+        manifest.remove(filename)
+    if _has_local_chunks(user_id, filename):
+        _replace_local_chunks(user_id, filename, None, [])
+
+
+def _ingest_shared(store: DocumentStore, user_id: str, filepath: str, file_hash: str, parser: str,
+                   extract: Callable[[], List[dict]], progress: Optional[Callable] = None):
+    """
+    Content-addressed ingestion: a file already in the document store (uploaded
+    by anyone) is linked to the user without parsing or embedding it again;
+    otherwise `extract()` runs once and the chunks are stored for everyone.
+    A document chunked with other settings (`parser` differs) is re-chunked,
+    from the parse cache. A changed file is a new document, but `extract()`
+    reuses the parsed text of its unchanged pages (see extract_chunks'
+    base_hash), and when no one else links the version it replaces, that
+    version's Chroma chunks for them are kept (_sync_revision).
+    """
+    filename = os.path.basename(filepath)
+    doc = store.document(file_hash)
+    if (store.linked(user_id, filename) == file_hash and doc is not None and doc["vector_synced"]
+            and doc["parser"] == parser):
+        print(f"ℹ️ {filename} unchanged, skipping ingestion.")
+        return
+
+    base = _revision_base(store, user_id, filename, file_hash, parser)
+    with _locked_documents(store, file_hash, base):
+        doc = store.document(file_hash)
+        seg = store.segment(file_hash) if doc is not None else None
+        if seg is None or doc["parser"] != parser:
+            chunks = extract()
+            # Re-checked under the locks: someone may have linked the old version meanwhile
+            if doc is None and base is not None and _revision_base(store, user_id, filename, file_hash, parser) == base:
+                synced = _sync_revision(store, file_hash, filename, chunks, base, progress)
+            else:
+                synced = _sync_document(file_hash, filename, chunks, progress, replace=doc is not None)
+            store.put_document(file_hash, filename, parser, chunks, synced)
+            action = f"{len(chunks)} chunk(s) {'re-chunked' if doc is not None else 'parsed'} and stored"
+        elif not doc["vector_synced"]:
+            # An earlier Chroma sync failed (possibly part-way): redo it from the stored chunks without re-parsing
+            synced = _sync_document(file_hash, doc["filename"], list(seg.iter_chunks()), progress, replace=True)
+            store.set_synced(file_hash, synced)
+            action = "already stored, re-synced to Chroma" if synced else "already stored"
+        else:
+            action = "already stored, linked without re-ingesting"
+        previous = store.link(user_id, filename, file_hash)
+
+    if previous and previous != file_hash:
+        _release_document(store, previous)
+    _drop_user_copy(user_id, filename)
+    print(f"ℹ️ Ingested {filename}: {action} ({store.owners(file_hash)} user(s) share it).")
+    _invalidate_answers(user_id)
+
+
+def ingest_local_document(user_id: str, filepath: str, progress: Optional[Callable] = None):
+    """
+    PyPDF2 ingestion. With the document store (DOC_STORE_ENABLED=1) the file
+    is stored once by content hash and linked to the user (_ingest_shared).
+    Otherwise ingestion is per user, idempotent and incremental: an unchanged
+    file is skipped, and only pages whose content hash changed are parsed,
+    embedded and upserted. Chunks of pages that changed or disappeared are deleted.
+    """
+    from FYP_RAG.pdf_extract import extract_chunks, page_hashes, parser_id
+
+    # INGEST_EXTRACT_WORKERS > 1 spreads page extraction over a process pool (0 = all cores)
+    workers = int(os.getenv("INGEST_EXTRACT_WORKERS", "1"))
+    filename = os.path.basename(filepath)
+    file_hash = file_sha256(filepath)
+    store = _doc_store()
+    if store is not None:
+        # The version this upload replaces (shared or per-user), so unchanged pages are not parsed again
+        base_hash = store.linked(user_id, filename) or (get_manifest(user_id).get(filename) or {}).get("file_hash")
+        return _ingest_shared(store, user_id, filepath, file_hash, parser_id(),
+                              lambda: extract_chunks(filepath, workers, progress, file_hash=file_hash,
+                                                     base_hash=base_hash), progress)
+
+    manifest = get_manifest(user_id)
+    prev = manifest.get(filename) or {}
+    have_local = _has_local_chunks(user_id, filename)
+
+    # Same parser covers the chunking settings too: after a CHUNK_SENTENCES change every page is re-chunked
+    same_parser = prev.get("parser") == parser_id()
+    if prev.get("file_hash") == file_hash and prev.get("vector_synced") and have_local and same_parser:
+        print(f"ℹ️ {filename} unchanged, skipping ingestion.")
+        return
+
+    hashes = page_hashes(filepath)
+    all_pages = set(range(1, len(hashes) + 1))
+    prev_pages = prev.get("pages", {}) if same_parser else {}
+    changed = {n for n in all_pages if prev_pages.get(str(n), {}).get("hash") != hashes[n - 1]}
+    removed = {int(n) for n in prev_pages if int(n) not in all_pages}
+
+    # Embed only changed pages unless the vector store missed the previous ingest
+    embed_pages = changed if (same_parser and prev.get("vector_synced")) else all_pages
+    # Without local chunks (memory backend after a restart) every page is parsed, but not re-embedded
+    parse_pages = embed_pages if have_local else all_pages
+
+    chunks = extract_chunks(filepath, workers=workers, progress=progress, pages=sorted(parse_pages), file_hash=file_hash)
+
+    local_pages = (parse_pages | removed) if (have_local and same_parser) else None
+    _replace_local_chunks(user_id, filename, local_pages, chunks)
+
+    # Also add to Chroma for vector retrieval (best-effort; fall back if embeddings unavailable)
+    embed_chunks = [c for c in chunks if c["page"] in embed_pages]
+    keep = {_chunk_id(filename, c) for c in embed_chunks}
+    stale = _stale_ids(prev, (embed_pages | removed) if same_parser else None, keep)
+    synced = _sync_to_chroma(user_id, filename, embed_chunks, stale, progress)
+
+    ids_by_page: Dict[int, List[str]] = {}
+    for c in chunks:
+        ids_by_page.setdefault(c["page"], []).append(_chunk_id(filename, c))
+    manifest.set(filename, {
+        "file_hash": file_hash,
+        "parser": parser_id(),
+        "vector_synced": synced,
+        "pages": {
+            str(n): {
+                "hash": hashes[n - 1],
+                "chunks": ids_by_page.get(n, []) if n in parse_pages else prev_pages[str(n)]["chunks"],
+            }
+            for n in sorted(all_pages)
+        },
+    })
+
+    print(f"ℹ️ Ingested {filename}: {len(parse_pages)} page(s) parsed, "
+          f"{len(embed_pages)} embedded, {len(stale)} stale chunk(s) removed.")
+    _invalidate_answers(user_id)
 
 
 # -----------------------------
 # Docling ingestion (best-effort)
 # -----------------------------
-def ingest_document_docling(user_id: str, filepath: str):
+DOCLING_SEGMENTS_PER_CHUNK = 4
+DOCLING_PARSER_ID = f"docling/g{DOCLING_SEGMENTS_PER_CHUNK}"
+
+
+def _docling_version() -> str:
+    # Key of cached Docling segments; bump the suffix when segment collection changes
+    try:
+        from importlib.metadata import version
+        return f"docling-{version('docling-parse')}-1"
+    except Exception:
+        return "docling-unknown-1"
+
+
+def _docling_segments(filepath: str, file_hash: str) -> List[dict]:
+    """
+    [{"page", "text"}] segments of the file, from the parse cache or else
+    parsed with docling_parse (and cached). Raises if Docling fails.
+    """
+    cache = get_parse_cache()
+    version = _docling_version()
+    record = cache.get(file_hash, version) if cache is not None else None
+    if record is not None:
+        return record["segments"]
+
+    # Docling API varies; attempt generic pipeline and fallback on error
+    from docling_parse import Parser  # type: ignore
+    doc = Parser().parse(filepath)
+    segments = []
+    try:
+        # Collect paragraphs or segments (best-effort), with their page where Docling reports one
+        segments = [{"page": int(getattr(seg, "page", 0) or 0), "text": seg.text}
+                    for seg in getattr(doc, "segments", []) if getattr(seg, "text", "")]  # type: ignore
+    except Exception:
+        pass
+    if cache is not None and segments:
+        cache.put(file_hash, version, {"filename": os.path.basename(filepath), "segments": segments})
+    return segments
+
+
+def _docling_chunks(filename: str, segments: List[dict]) -> List[dict]:
+    """Groups segment texts into blocks of DOCLING_SEGMENTS_PER_CHUNK."""
+    texts = [seg["text"] for seg in segments]
+    chunks = []
+    step = DOCLING_SEGMENTS_PER_CHUNK
+    for i in range(0, len(texts), step):
+        block = clean_text(" ".join(texts[i:i + step]))
+        if not block:
+            continue
+        spans, sentence_terms = analyze_sentences(block)
+        chunks.append({
+            "source": filename,
+            "page": 0,
+            "chunk": (i // step) + 1,
+            "text": block,
+            "tokens": tokenize(block),
+            "sentences": spans,
+            "sentence_terms": sentence_terms,
+        })
+    return chunks
+
+
+def ingest_stream(user_id: str, stream, filepath: str, progress: Optional[Callable] = None):
+    """
+    PyPDF2 ingestion of a PDF read from a seekable binary stream, e.g.
+    ibm_cos_storage.open_object(key). Pages are parsed as their bytes arrive
+    while the file is saved to `filepath`; a stream that can spool itself
+    (CosObjectReader) saves in the background from the same ranged reads.
+    The pages go to the parse cache under the file's hash, so
+    ingest_local_document(filepath) then chunks, embeds and stores them
+    without parsing again. With PARSE_CACHE_ENABLED=0 the file is saved
+    first and ingested as usual. If the object is overwritten meanwhile the
+    reader raises ObjectChanged and nothing is saved or cached. Returns the
+    file's SHA-256.
+    """
+    from FYP_RAG.pdf_extract import PARSER_VERSION, parse_stream
+
+    raw = getattr(stream, "raw", stream)
+    spool = getattr(raw, "spool", None)
+    cache = get_parse_cache()
+    if cache is None:
+        file_hash = _save_stream(stream, filepath, spool)
+        ingest_local_document(user_id, filepath, progress)
+        return file_hash
+
+    if spool is not None:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-spool") as pool:
+            saving = pool.submit(spool, filepath)
+            try:
+                record = parse_stream(stream, os.path.basename(filepath), progress)
+            except BaseException:
+                # Stop the download instead of waiting for the rest of an object that will not be ingested
+                raw.cancel()
+                raise
+            file_hash = saving.result()
+    else:
+        record = parse_stream(stream, os.path.basename(filepath), progress)
+        file_hash = _save_stream(stream, filepath, None)
+    cache.put(file_hash, PARSER_VERSION, record)
+    ingest_local_document(user_id, filepath, progress)
+    return file_hash
+
+
+def document_ingested(user_id: str, filename: str, file_hash: str) -> bool:
+    """Whether the user's `filename` is already the document with this hash (stored or per-user)."""
+    store = _doc_store()
+    if store is not None and store.linked(user_id, filename) == file_hash:
+        return True
+    return (get_manifest(user_id).get(filename) or {}).get("file_hash") == file_hash
+
+
+def _save_stream(stream, filepath: str, spool: Optional[Callable]) -> str:
+    """Saves a stream's content to filepath; returns its SHA-256."""
+    if spool is not None:
+        return spool(filepath)
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    stream.seek(0)
+    tmp = f"{filepath}.{os.getpid()}.{threading.get_ident()}.part"
+    with open(tmp, "wb") as f:
+        for block in iter(lambda: stream.read(1 << 20), b""):
+            f.write(block)
+    os.replace(tmp, filepath)
+    return file_sha256(filepath)
+
+
+def ingest_document_docling(user_id: str, filepath: str, progress: Optional[Callable] = None):
     """
     Prefer Docling for robust parsing + chunking if available;
-    fallback to PyPDF2-based ingestion otherwise.
+    fallback to PyPDF2-based ingestion otherwise. Segments are parsed once
+    per file and parser version (parse cache).
     """
-    if docling is None:
+    # find_spec checks for docling without importing it (and torch with it)
+    if importlib.util.find_spec("docling") is None:
         print("ℹ️ Docling not available, using PyPDF2 ingestion.")
-        return ingest_local_document(user_id, filepath)
+        return ingest_local_document(user_id, filepath, progress)
 
     filename = os.path.basename(filepath)
-    chunks = []
+    file_hash = file_sha256(filepath)
+    store = _doc_store()
+    doc = store.document(file_hash) if store is not None else None
+    if doc is not None and not doc["parser"].startswith("docling"):
+        # Stored by the PyPDF2 path (Docling failed on it before): link that copy
+        return ingest_local_document(user_id, filepath, progress)
+    manifest = get_manifest(user_id)
+    prev = manifest.get(filename) or {}
+    if (store is None and prev.get("file_hash") == file_hash and prev.get("parser") == DOCLING_PARSER_ID
+            and prev.get("vector_synced") and _has_local_chunks(user_id, filename)):
+        print(f"ℹ️ {filename} unchanged, skipping ingestion.")
+        return
+
     try:
-        # Docling API varies; attempt generic pipeline and fallback on error
-        # Use docling.parse to extract text segments, if supported
-        from docling_parse import Parser  # type: ignore
-        parser = Parser()
-        doc = parser.parse(filepath)
-        texts = []
-        try:
-            # Collect paragraphs or segments (best-effort)
-            texts = [seg.text for seg in getattr(doc, "segments", []) if getattr(seg, "text", "")]  # type: ignore
-        except Exception:
-            pass
-        if not texts:
-            # Fallback: use PyPDF2 path
-            print("ℹ️ Docling parse returned no segments, falling back to PyPDF2.")
-            return ingest_local_document(user_id, filepath)
-
-        # Group texts into blocks of ~4 segments
-        for i in range(0, len(texts), 4):
-            block = clean_text(" ".join(texts[i:i+4]))
-            if not block:
-                continue
-            chunks.append({
-                "source": filename,
-                "page": 0,
-                "chunk": (i // 4) + 1,
-                "text": block,
-                "tokens": tokenize(block),
-            })
+        segments = _docling_segments(filepath, file_hash)
     except Exception as e:
         print("⚠️ Docling ingestion failed, using PyPDF2:", e)
-        return ingest_local_document(user_id, filepath)
+        return ingest_local_document(user_id, filepath, progress)
+    if not segments:
+        # Fallback: use PyPDF2 path
+        print("ℹ️ Docling parse returned no segments, falling back to PyPDF2.")
+        return ingest_local_document(user_id, filepath, progress)
+    chunks = _docling_chunks(filename, segments)
 
-    LOCAL_INDEX.setdefault(user_id, []).extend(chunks)
+    if store is not None:
+        return _ingest_shared(store, user_id, filepath, file_hash, DOCLING_PARSER_ID, lambda: chunks, progress)
+
+    # Docling chunks carry no page numbers, so a changed file replaces all of its chunks
+    _replace_local_chunks(user_id, filename, None, chunks)
 
     # Sync into Chroma
-    try:
-        col = get_chroma_collection(user_id)
-        ids = []
-        docs = []
-        metas = []
-        for c in chunks:
-            ids.append(f"{filename}_p{c['page']}_c{c['chunk']}")
-            docs.append(c["text"])
-            metas.append({"source": filename, "page": c["page"], "chunk": c["chunk"]})
-        if docs:
-            col.add(ids=ids, documents=docs, metadatas=metas)
-    except Exception as e:
-        print("⚠️ Chroma ingest failed (Docling path):", e)
+    ids = [_chunk_id(filename, c) for c in chunks]
+    synced = _sync_to_chroma(user_id, filename, chunks, _stale_ids(prev, None, set(ids)), progress)
+    manifest.set(filename, {
+        "file_hash": file_hash,
+        "parser": DOCLING_PARSER_ID,
+        "vector_synced": synced,
+        "pages": {"0": {"hash": file_hash, "chunks": ids}},
+    })
+
+    _invalidate_answers(user_id)
+
+
+# -----------------------------
+# Re-indexing from the parse cache
+# -----------------------------
+def reindex_documents(progress: Optional[Callable] = None) -> dict:
+    """
+    Re-chunks every stored document built with other chunking settings
+    (CHUNK_SENTENCES, parser id) from the parse cache alone: no PDF is
+    opened. Documents without a complete cache entry are left as they are
+    and re-chunked on their next upload.
+    """
+    from FYP_RAG.pdf_extract import PARSER_VERSION, chunk_pages, parser_id
+
+    out = {"reindexed": 0, "current": 0, "not_cached": 0, "chunks": 0}
+    store, cache = _doc_store(), get_parse_cache()
+    if store is None or cache is None:
+        return out
+    docs = store.documents()
+    for done, doc in enumerate(docs, start=1):
+        doc_hash, filename = doc["doc_hash"], doc["filename"]
+        docling = doc["parser"].startswith("docling")
+        target = DOCLING_PARSER_ID if docling else parser_id()
+        if doc["parser"] == target:
+            out["current"] += 1
+            continue
+
+        chunks = None
+        if docling:
+            record = cache.get(doc_hash, _docling_version())
+            if record is not None:
+                chunks = _docling_chunks(filename, record["segments"])
+        else:
+            record = cache.get(doc_hash, PARSER_VERSION)
+            texts = page_texts(record)
+            if record is not None and len(texts) == record["n_pages"]:
+                chunks = chunk_pages(texts, filename)
+        if chunks is None:
+            out["not_cached"] += 1
+            continue
+
+        with store.locked(doc_hash):
+            synced = _sync_document(doc_hash, filename, chunks, replace=True)
+            store.put_document(doc_hash, filename, target, chunks, synced)
+        for user_id in store.users(doc_hash):
+            _invalidate_answers(user_id)
+        out["reindexed"] += 1
+        out["chunks"] += len(chunks)
+        if progress:
+            progress("documents", done, len(docs))
+    return out
 
 
 # -----------------------------
 # Watsonx / Granite
 # -----------------------------
 def get_iam_token():
-    api_key = os.getenv("WATSONX_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing WATSONX_API_KEY")
-
-    res = requests.post(
-        "https://iam.cloud.ibm.com/identity/token",
-        data={
-            "apikey": api_key,
-            "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
-        },
-        timeout=15
-    )
-
-    if res.status_code != 200:
-        raise RuntimeError(f"IAM token failed: {res.text}")
-
-    return res.json().get("access_token")
-
-
-def call_granite(question: str, context: str) -> str:
-    token = get_iam_token()
-
-    url = os.getenv("WATSONX_URL")
-    project_id = os.getenv("IBM_PROJECT_ID")
-    if not url or not project_id:
-        raise RuntimeError("Watsonx env vars missing")
-
-    endpoint = f"{url}/ml/v1/text/chat?version=2024-02-15"
-
-    payload = {
-        "model_id": "ibm/granite-3-8b-instruct",
-        "project_id": project_id,
-        "messages": [
-            {
-                "role": "system",
-                 "content": (
-                     "You are an academic assistant. "
-                     "Use only the provided context to answer. "
-                     "If the context does not fully support the answer, reply exactly: 'Insufficient information in provided context.' "
-                     "Answer only what is asked, in 1–3 complete sentences. "
-                     "Do not add background, opinions, predictions, or unrelated details. "
-                     "Do not invent facts or numbers; prefer wording from the context. "
-                     "Respect any timeframe or scope stated in the question."
-                 )
-            },
-            {
-                "role": "user",
-                "content": f"Context:\n{context}\n\nQuestion:\n{question}"
-            }
-        ],
-        "parameters": {
-            "temperature": 0.0,
-            "top_p": 0.1,
-            "max_new_tokens": 180
-        }
-    }
+    # Cached until shortly before expiry; concurrent callers share one refresh
+    return get_token_manager().get_token()
 
-    res = requests.post(
-        endpoint,
-        headers={
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        },
-        json=payload,
-        timeout=30
-    )
 
-    # Handle quota / auth issues
-    if res.status_code in (401, 403, 429):
-        raise RuntimeError(f"Watsonx quota/auth error: {res.status_code}")
+SYSTEM_PROMPT = (
+    "You are an academic assistant. "
+    "Use only the provided context to answer. "
+    "If the context does not fully support the answer, reply exactly: 'Insufficient information in provided context.' "
+    "Answer only what is asked, in 1–3 complete sentences. "
+    "Do not add background, opinions, predictions, or unrelated details. "
+    "Do not invent facts or numbers; prefer wording from the context. "
+    "Respect any timeframe or scope stated in the question."
+)
+
+GRANITE_PARAMETERS = {
+    "temperature": 0.0,
+    "top_p": 0.1,
+    "max_new_tokens": 180
+}
 
-    if res.status_code != 200:
-        raise RuntimeError(f"Watsonx error {res.status_code}: {res.text}")
 
-    try:
-        data = res.json()
-    except Exception:
-        raise RuntimeError(f"Non-JSON Watsonx response: {res.text}")
+def granite_messages(question: str, context: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}"},
+    ]
+
+
+def prompt_tokens(question: str, context: ContextPack) -> int:
+    """Estimated prompt size of granite_messages(question, context.text); also recorded in /metrics."""
+    n = _SYSTEM_PROMPT_TOKENS + estimate_tokens(f"Context:\n\n\nQuestion:\n{question}") + context.tokens
+    PROMPT_TOKENS.observe(n)
+    return n
 
+
+_SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+
+def granite_text(data: dict) -> str:
     # Support both schemas
     if "choices" in data:
         return data["choices"][0]["message"]["content"].strip()
@@ -269,16 +733,26 @@ def call_granite(question: str, context: str) -> str:
     raise RuntimeError(f"Unexpected Watsonx response: {data}")
 
 
+def call_granite(question: str, context: str, deadline: Optional[float] = None) -> str:
+    # Pooled keep-alive client; retries 429/5xx with backoff inside the deadline.
+    # The admission slot bounds how many of these block worker threads at once.
+    with get_admission().slot():
+        data = get_watsonx_client().chat(granite_messages(question, context), GRANITE_PARAMETERS, deadline=deadline)
+    return granite_text(data)
+
+
 # -----------------------------
 # Grounding gate
 # -----------------------------
-def grounding_gate(answer: str, context: str, query: str) -> bool:
+@timed("grounding_gate")
+def grounding_gate(answer: str, context: str, query: str, context_tokens: Optional[set] = None) -> bool:
     """
     Returns True if the answer appears grounded in the provided context
     and query (i.e., uses mostly tokens present in them), otherwise False.
+    Pass `context_tokens` when the context's terms are already known.
     """
     a_tokens = tokenize(answer) - STOPWORDS
-    c_tokens = tokenize(context)
+    c_tokens = context_tokens if context_tokens is not None else tokenize(context)
     q_tokens = tokenize(query)
     allowed = c_tokens | q_tokens
 
@@ -293,24 +767,26 @@ def grounding_gate(answer: str, context: str, query: str) -> bool:
 # -----------------------------
 # Extractive fallback
 # -----------------------------
+@timed("extractive_fallback")
 def extractive_fallback(top, q_tokens):
-    sentences = []
+    first = None
+    scored = []
     for _, d in top:
         txt = d.get("text") or ""
-        if txt:
-            sentences.extend(re.split(r"(?<=[.!?])\s+", txt))
+        if not txt:
+            continue
+        spans, sentence_terms = chunk_sentences(d)
+        if first is None:
+            first = txt[spans[0][0]:spans[0][1]]
+        for (start, end), s_terms in zip(spans, sentence_terms):
+            if not q_tokens.isdisjoint(s_terms):
+                scored.append((len(q_tokens & s_terms), txt[start:end]))
 
-    if not sentences:
+    if first is None:
         return top[0][1].get("text", "").strip()
 
-    scored = []
-    for s in sentences:
-        overlap = len(tokenize(s) & q_tokens)
-        if overlap > 0:
-            scored.append((overlap, s))
-
     if not scored:
-        return sentences[0].strip()
+        return first.strip()
 
     scored.sort(key=lambda x: x[0], reverse=True)
     return " ".join(s for _, s in scored[:5]).strip()
@@ -320,58 +796,346 @@ def extractive_fallback(top, q_tokens):
 # RAG query (MAIN)
 # -----------------------------
 def run_rag_query(query: str, user_id: str):
-    q_tokens = tokenize(query)
+    with stage("total"):
+        return _run_rag_query(query, user_id)
 
-    top = []
-    context = ""
-    retrieval_method = "fallback-token"
-    # First try: Chroma similarity search
+
+# Identical queries already being answered are joined rather than recomputed,
+# per (user, query): retrieval is filtered to the caller's documents, so another
+# user's answer may quote files this user cannot see. Only users with no
+# documents of their own, whose retrieval is the shared corpus alone, share one
+# flight per query.
+QUERY_FLIGHTS = SingleFlight()
+
+
+def _has_private_documents(user_id: str) -> bool:
+    if _owned_documents(user_id) or LOCAL_INDEX.get(user_id) or len(get_manifest(user_id)) > 0:
+        return True
+    if _mmap_backend() and get_local_store().open(user_id) is not None:
+        return True
     try:
-        col = get_chroma_collection(user_id)
-        results = col.query(query_texts=[query], n_results=5, include=["documents", "metadatas", "distances"])
-        docs = results.get("documents", [[]])[0]
-        metas = results.get("metadatas", [[]])[0]
-        dists = results.get("distances", [[]])[0]
-        # Convert distances to similarity (cosine space)
-        for doc, meta, dist in zip(docs, metas, dists):
-            sim = 1.0 - float(dist)
-            top.append((sim, {"text": doc, "source": meta.get("source"), "page": meta.get("page"), "chunk": meta.get("chunk")}))
-        top.sort(key=lambda x: x[0], reverse=True)
-        context = " ".join(d["text"] for _, d in top)[:6000]
-        retrieval_method = "vector"
-    except (ChromaError, Exception) as e:
-        print("⚠️ Chroma query failed, falling back to token overlap:", e)
-        # Fallback: token overlap over LOCAL_INDEX
-        docs = LOCAL_INDEX.get(user_id, [])
-        scored = []
-        for d in docs:
-            score = len(q_tokens & d["tokens"]) / max(len(q_tokens), 1)
-            if score > 0.1:
-                scored.append((score, d))
-        if scored:
-            scored.sort(key=lambda x: x[0], reverse=True)
-            top = scored[:5]
-            context = " ".join(d["text"] for _, d in top)[:6000]
+        return get_chroma_collection(user_id).count() > 0
+    except Exception:
+        # Unknown: keep the flight per user
+        return True
 
-    if not top:
-        return {
-            "answer": "No relevant information found in the uploaded document.",
-            "confidence": "Low (0.00)",
-            "sources": [],
-            "retrieval": retrieval_method,
-        }
 
+def _flight_key(query: str, user_id: str) -> tuple:
+    """Returns (scope, SingleFlight key) for the query."""
+    if not _has_private_documents(user_id):
+        return "shared", f"\x00shared\x00{normalize_query(query)}"
+    return "user", f"{user_id}\x00{normalize_query(query)}"
+
+
+def _run_rag_query(query: str, user_id: str):
+    cache = get_answer_cache()
+    # Keyed by the index generation seen now, not after computing (see AnswerCache.key)
+    cache_key = cache.key(user_id, query) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    def compute():
+        start = time.perf_counter()
+        result, cacheable = _run_rag_query_uncached(query, user_id)
+        compute_ms = (time.perf_counter() - start) * 1000
+        if cache is not None and cacheable:
+            cache.put(cache_key, user_id, result, compute_ms)
+        result["cache"] = {"hit": False, "saved_ms": 0.0}
+        return result
+
+    scope, key = _flight_key(query, user_id)
+    result, shared = QUERY_FLIGHTS.do(key, compute)
+    if not shared:
+        return result
+    COALESCED_TOTAL.inc(scope)
+    # Followers get their own copy; the leader's dict is already returned to its caller
+    return dict(result, coalesced=True)
+
+
+def _retrieve(query: str, user_id: str, q_tokens: set):
+    """Returns (top, context, retrieval_method): top as [(score, chunk), ...], context a ContextPack."""
+    # Background ingestion pauses its embedding batches while retrieval is running
+    with QUERY_GATE.query():
+        top, context, retrieval_method = _retrieve_chunks(query, user_id, q_tokens)
+    RETRIEVAL_TOTAL.inc(retrieval_method)
+    return top, context, retrieval_method
+
+
+class VectorSearchUnavailable(RuntimeError):
+    def __init__(self, reason: str, error: Optional[Exception] = None):
+        super().__init__(f"{reason}: {error}" if error else reason)
+        self.reason = reason
+
+
+def _vector_search(query: str, user_id: str) -> list:
+    return _vector_search_many([query], user_id)[0]
+
+
+def _vector_search_many(queries: List[str], user_id: str) -> List[list]:
+    """
+    Chroma similarity search with each step timed separately, returning
+    [(similarity, chunk), ...] per query. The queries are embedded here rather
+    than by Chroma so embedding time is visible; several queries share one
+    embedding call and one col.query per collection: the shared document
+    store filtered to the user's doc hashes, and the user's own collection
+    while it is still needed (_user_tier).
+    """
+    owned = _owned_documents(user_id)
     try:
-        answer = call_granite(query, context)
+        with stage("chroma_collection"):
+            targets = []
+            if owned:
+                # Always filtered: unowned chunks (being ingested, or left by a failed delete) must not take top-k slots
+                targets.append((get_documents_collection(), {"doc_hash": {"$in": sorted(owned)}}))
+            if _user_tier(user_id, owned):
+                targets.append((get_chroma_collection(user_id), None))
     except Exception as e:
-        print("⚠️ Granite failed, using fallback:", e)
-        answer = extractive_fallback(top, q_tokens)
+        raise VectorSearchUnavailable("collection_error", e)
+
+    emb_fn = get_registry().embedding_function(_embed_model())
+    if emb_fn is None:
+        raise VectorSearchUnavailable("no_embedding_function")
+    try:
+        with stage("embedding"):
+            q_emb = emb_fn(list(queries))
+    except Exception as e:
+        raise VectorSearchUnavailable("embedding_error", e)
+
+    tops = [[] for _ in queries]
+    for col, where in targets:
+        try:
+            with stage("vector_query"):
+                results = col.query(query_embeddings=q_emb, n_results=5, where=where,
+                                    include=["documents", "metadatas", "distances"])
+        except Exception as e:
+            raise VectorSearchUnavailable("query_error", e)
+        for i, top in enumerate(tops):
+            # Chunks of documents being ingested or deleted are in Chroma but owned by no one yet
+            top.extend(h for h in _vector_top(results, i) if h[1].get("doc_hash", "") in owned
+                       or "doc_hash" not in h[1])
+
+    ranked = []
+    for top in tops:
+        top = sorted(top, key=lambda x: x[0], reverse=True)[:5]
+        _attach_sentences(user_id, top, owned)
+        ranked.append(top)
+    return ranked
+
+
+def _vector_top(results: dict, i: int) -> list:
+    """[(similarity, chunk), ...] for the i-th query of a col.query result."""
+    top = []
+    docs = (results.get("documents") or [[]])[i]
+    metas = (results.get("metadatas") or [[]])[i]
+    dists = (results.get("distances") or [[]])[i]
+    # Convert distances to similarity (cosine space)
+    for doc, meta, dist in zip(docs, metas, dists):
+        sim = 1.0 - float(dist)
+        d = {"text": doc, "source": meta.get("source"), "page": meta.get("page"), "chunk": meta.get("chunk")}
+        if meta.get("doc_hash"):
+            d["doc_hash"] = meta["doc_hash"]
+        top.append((sim, d))
+    return top
+
+
+def _fallback_retrieval(user_id: str, q_tokens: set, error: VectorSearchUnavailable) -> list:
+    print("⚠️ Chroma query failed, falling back to token overlap:", error)
+    RETRIEVAL_FALLBACK_TOTAL.inc(error.reason)
+    return _fallback_search(user_id, q_tokens)
+
+
+def _merge_shared(top: list, retrieval_method: str, shared: list, k: int = 5) -> tuple:
+    """
+    Merges shared-corpus hits into the user's ranked chunks by score. The
+    method gets a "+shared" suffix when a shared chunk makes the top k.
+    """
+    if not shared:
+        return top, retrieval_method
+    merged = sorted(top + shared, key=lambda x: x[0], reverse=True)[:k]
+    shared_ids = {id(d) for _, d in shared}
+    if any(id(d) in shared_ids for _, d in merged):
+        retrieval_method += "+shared"
+    return merged, retrieval_method
+
+
+def _shared_search(queries: List[str], token_sets: List[set]) -> List[list]:
+    """Shared-corpus hits per query, scores scaled by SHARED_INDEX_WEIGHT."""
+    # numpy (and faiss, if the index needs it) load with the corpus
+    from FYP_RAG.shared_corpus import get_shared_corpus, shared_weight
+
+    corpus = get_shared_corpus()
+    if corpus is None:
+        return [[] for _ in queries]
+    weight = shared_weight()
+    return [[(score * weight, d) for score, d in hits] for hits in corpus.search_many(queries, token_sets)]
+
+
+def _retrieve_chunks(query: str, user_id: str, q_tokens: set):
+    # First try: Chroma similarity search
+    try:
+        top, retrieval_method = _vector_search(query, user_id), "vector"
+    except VectorSearchUnavailable as e:
+        top, retrieval_method = _fallback_retrieval(user_id, q_tokens, e), "fallback-token"
+    top, retrieval_method = _merge_shared(top, retrieval_method, _shared_search([query], [q_tokens])[0])
+    return top, build_context(top, q_tokens), retrieval_method
+
+
+def retrieve_many(queries: List[str], user_id: str) -> list:
+    """
+    _retrieve for a batch of queries: one embedding call and one Chroma
+    query for all of them. Returns [(top, context, retrieval_method), ...]
+    in input order.
+    """
+    token_sets = [tokenize(q) for q in queries]
+    with QUERY_GATE.query():
+        try:
+            ranked = [(top, "vector") for top in _vector_search_many(queries, user_id)]
+        except VectorSearchUnavailable as e:
+            ranked = [(_fallback_retrieval(user_id, q_tokens, e), "fallback-token") for q_tokens in token_sets]
+        shared = _shared_search(queries, token_sets)
+        out = []
+        for (top, method), shared_top, q_tokens in zip(ranked, shared, token_sets):
+            top, method = _merge_shared(top, method, shared_top)
+            out.append((top, build_context(top, q_tokens), method))
+    for _, _, method in out:
+        RETRIEVAL_TOTAL.inc(method)
+    return out
+
+
+@timed("fallback_scoring")
+def _fallback_search(user_id: str, q_tokens: set) -> list:
+    """
+    BM25 over the segments of the user's stored documents and the user's own
+    inverted index (only postings of query terms are touched).
+    """
+    q_terms = (q_tokens - STOPWORDS) or q_tokens
+    owned = _owned_documents(user_id)
+    if not owned:
+        return _user_fallback_search(user_id, q_tokens, q_terms)
+
+    store, local = _doc_store(), get_local_store()
+    scored = []
+    for doc_hash, filename in owned.items():
+        seg = store.segment(doc_hash)
+        if seg is None:
+            continue
+        for score, d in local.overlap_search(seg, q_tokens, q_terms, k=5):
+            d["source"] = filename
+            scored.append((score, d))
+    if _user_tier(user_id, owned):
+        scored.extend(_user_fallback_search(user_id, q_tokens, q_terms))
+    return sorted(scored, key=lambda x: x[0], reverse=True)[:5]
+
+
+def _user_fallback_search(user_id: str, q_tokens: set, q_terms: set) -> list:
+    seg = None
+    if _mmap_backend() and not LOCAL_INDEX.get(user_id):
+        seg = get_local_store().open(user_id)
+    if seg is not None:
+        return get_local_store().overlap_search(seg, q_tokens, q_terms, k=5)
+
+    # Keep the overlap ratio as the reported score so confidence labels stay comparable
+    scored = []
+    docs, index, _ = _bm25_for_user(user_id)
+    for _, doc_id in index.search(q_terms, k=5):
+        d = docs[doc_id]
+        score = len(q_tokens & d["tokens"]) / max(len(q_tokens), 1)
+        if score > 0.1:
+            scored.append((score, d))
+    return scored
+
+
+def _attach_sentences(user_id: str, top: list, owned: Dict[str, str]):
+    """
+    Copies the sentence spans/terms stored at ingest onto vector hits (Chroma
+    only returns text). Hits from the document store are looked up in their
+    document's segment and renamed to the filename this user uploaded.
+    """
+    seg = None
+    by_key = None
+    if any("doc_hash" not in d for _, d in top):
+        if LOCAL_INDEX.get(user_id) or not _mmap_backend():
+            by_key = _bm25_for_user(user_id)[2]
+        else:
+            seg = get_local_store().open(user_id)
+    store = _doc_store()
+    for _, d in top:
+        doc_hash = d.pop("doc_hash", None)
+        key = (d.get("source") or "", int(d.get("page") or 0), int(d.get("chunk") or 0))
+        if doc_hash is not None:
+            doc_seg = store.segment(doc_hash) if store is not None else None
+            stored = doc_seg.find(*key) if doc_seg is not None else None
+            d["source"] = owned.get(doc_hash, d["source"])
+        elif seg is not None:
+            stored = seg.find(*key)
+        else:
+            stored = by_key.get((d.get("source"), d.get("page"), d.get("chunk"))) if by_key else None
+        if stored is not None and stored.get("text") == d.get("text") and "sentences" in stored:
+            d["sentences"] = stored["sentences"]
+            d["sentence_terms"] = stored["sentence_terms"]
+
+
+@timed("context_packing")
+def build_context(top, q_tokens: set) -> ContextPack:
+    """
+    Granite context for ranked chunks: whole, de-duplicated sentences packed
+    to RAG_CONTEXT_TOKEN_BUDGET (see context_builder), or with a budget of 0
+    the chunks joined and cut at 6000 characters as before.
+    """
+    budget = context_token_budget()
+    if budget > 0:
+        return pack_context(top, q_tokens, budget)
+    text = " ".join(d["text"] for _, d in top)[:6000]
+    return ContextPack(text, _context_terms(top), estimate_tokens(text), chunks=len(top))
+
+
+def _context_terms(top, limit: int = 6000) -> set:
+    """tokenize() of the joined, truncated context, assembled from the chunks' sentence term sets."""
+    out = set()
+    pos = 0
+    for _, d in top:
+        if pos >= limit:
+            break
+        text = d.get("text") or ""
+        cut = limit - pos
+        spans, sentence_terms = chunk_sentences(d)
+        for (start, end), s_terms in zip(spans, sentence_terms):
+            if end <= cut:
+                out |= s_terms
+            else:
+                # The sentence that straddles the context cut-off is tokenized as truncated
+                if start < cut:
+                    out |= tokenize(text[start:cut])
+                break
+        pos += len(text) + 1
+    return out
+
+
+def _no_results(retrieval_method: str) -> dict:
+    return {
+        "answer": "No relevant information found in the uploaded document.",
+        "confidence": "Low (0.00)",
+        "sources": [],
+        "retrieval": retrieval_method,
+    }
+
 
+def _ground_answer(answer: str, top, context: ContextPack, query: str, q_tokens: set) -> str:
     # Enforce grounding to avoid hallucinations
-    if answer.strip().lower() == "insufficient information in provided context." or not grounding_gate(answer, context, query):
-        # Prefer extractive fallback from retrieved chunks for strict grounding
-        answer = extractive_fallback(top, q_tokens)
+    if answer.strip().lower() == "insufficient information in provided context.":
+        ANSWER_FALLBACK_TOTAL.inc("insufficient")
+    elif not grounding_gate(answer, context.text, query, context.terms):
+        ANSWER_FALLBACK_TOTAL.inc("ungrounded")
+    else:
+        return answer
+    # Prefer extractive fallback from retrieved chunks for strict grounding
+    return extractive_fallback(top, q_tokens)
+
 
+def _summarize(top) -> tuple:
+    """Returns (confidence label, source strings) for the retrieved chunks."""
     avg = sum(s for s, _ in top) / len(top)
     label = "High" if avg >= 0.6 else "Medium"
 
@@ -381,9 +1145,123 @@ def run_rag_query(query: str, user_id: str):
         if src not in sources:
             sources.append(src)
 
+    return f"{label} ({avg:.2f})", sources
+
+
+def _run_rag_query_uncached(query: str, user_id: str):
+    """Returns (result, cacheable); answers degraded by a Granite failure are not cached."""
+    q_tokens = tokenize(query)
+    top, context, retrieval_method = _retrieve(query, user_id, q_tokens)
+
+    if not top:
+        return _no_results(retrieval_method), True
+
+    try:
+        answer, error = call_granite(query, context.text), None
+    except Overloaded:
+        raise
+    except Exception as e:
+        answer, error = None, e
+    return compose_answer(query, q_tokens, top, context, retrieval_method, answer, error)
+
+
+def compose_answer(query: str, q_tokens: set, top, context: ContextPack, retrieval_method: str,
+                   answer: Optional[str], error: Optional[Exception] = None):
+    """
+    Grounds a Granite answer (or falls back when the call failed with `error`)
+    and builds the query result. Returns (result, cacheable).
+    """
+    cacheable = True
+    if error is not None:
+        print("⚠️ Granite failed, using fallback:", error)
+        ANSWER_FALLBACK_TOTAL.inc("granite_error")
+        answer = extractive_fallback(top, q_tokens)
+        cacheable = False
+
+    answer = _ground_answer(answer, top, context, query, q_tokens)
+    confidence, sources = _summarize(top)
+
     return {
         "answer": answer,
-        "confidence": f"{label} ({avg:.2f})",
+        "confidence": confidence,
         "sources": sources,
         "retrieval": retrieval_method,
-    }
+        "prompt_tokens": prompt_tokens(query, context),
+    }, cacheable
+
+
+# -----------------------------
+# RAG query (streaming)
+# -----------------------------
+def stream_rag_query(query: str, user_id: str):
+    """
+    Generator of (event, data) pairs for server-sent events:
+    - "meta": sources, confidence and retrieval method, sent before generation
+    - "token": one streamed piece of the Granite answer
+    - "final": the answer after the grounding gate; `replaced` tells the client
+      to swap the streamed text for `answer` (extractive fallback)
+    """
+    start = time.perf_counter()
+    cache = get_answer_cache()
+    cache_key = cache.key(user_id, query) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            yield "meta", {k: cached.get(k) for k in ("sources", "confidence", "retrieval", "cache")}
+            yield "token", {"text": cached["answer"]}
+            yield "final", {"answer": cached["answer"], "replaced": False, "ttfb_ms": None,
+                            "duration_ms": int((time.perf_counter() - start) * 1000)}
+            return
+
+    q_tokens = tokenize(query)
+    top, context, retrieval_method = _retrieve(query, user_id, q_tokens)
+
+    if not top:
+        result = _no_results(retrieval_method)
+        yield "meta", {k: result[k] for k in ("sources", "confidence", "retrieval")}
+        yield "final", {"answer": result["answer"], "replaced": True, "ttfb_ms": None,
+                        "duration_ms": int((time.perf_counter() - start) * 1000)}
+        return
+
+    confidence, sources = _summarize(top)
+    n_prompt = prompt_tokens(query, context)
+    # Wait for a Granite slot before the first event, so an Overloaded raised
+    # here can still become a 503 instead of a half-sent stream
+    admission = get_admission()
+    admission.acquire()
+    held_from = time.monotonic()
+    pieces = []
+    ttfb_ms = None
+    cacheable = True
+    try:
+        yield "meta", {"sources": sources, "confidence": confidence, "retrieval": retrieval_method,
+                       "retrieval_ms": int((time.perf_counter() - start) * 1000), "prompt_tokens": n_prompt}
+        try:
+            stream = get_watsonx_client().chat_stream(granite_messages(query, context.text), GRANITE_PARAMETERS)
+            for piece in stream:
+                if ttfb_ms is None:
+                    ttfb_ms = int((time.perf_counter() - start) * 1000)
+                pieces.append(piece)
+                yield "token", {"text": piece}
+        except Exception as e:
+            print("⚠️ Granite stream failed, using fallback:", e)
+            ANSWER_FALLBACK_TOTAL.inc("granite_error")
+            cacheable = False
+    finally:
+        # Also runs when the client disconnects mid-stream (GeneratorExit)
+        admission.release(time.monotonic() - held_from)
+
+    raw = "".join(pieces).strip()
+    answer = _ground_answer(raw, top, context, query, q_tokens) if cacheable else extractive_fallback(top, q_tokens)
+    duration_ms = int((time.perf_counter() - start) * 1000)
+
+    if cache is not None and cacheable:
+        cache.put(cache_key, user_id, {
+            "answer": answer,
+            "confidence": confidence,
+            "sources": sources,
+            "retrieval": retrieval_method,
+            "prompt_tokens": n_prompt,
+        }, duration_ms)
+
+    yield "final", {"answer": answer, "replaced": answer != raw, "ttfb_ms": ttfb_ms, "duration_ms": duration_ms}
@@ -0,0 +1,260 @@
+import ntpath
+import os
+import pickle
+import struct
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # flat indexes are read directly; faiss is only needed for other index types
+    faiss = None
+
+from FYP_RAG.ingest_manifest import file_sha256
+from FYP_RAG.metrics import stage
+from FYP_RAG.mmap_index import MappedSegment, get_local_store
+from FYP_RAG.text_utils import STOPWORDS, clean_text
+from FYP_RAG.vector_registry import get_registry
+
+DEFAULT_SHARED_INDEX_PATH = str(Path(__file__).resolve().parent / "faiss_index_who_report")
+# The WHO index was built with LangChain's HuggingFaceEmbeddings default model
+DEFAULT_SHARED_EMBED_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+# FAISS flat index fourccs -> metric; vectors follow the header as a plain float32 matrix
+_FLAT_INDEXES = {b"IxF2": "l2", b"IxFI": "ip"}
+_METRIC_L2 = 1
+
+
+# -----------------------------
+# FAISS index files
+# -----------------------------
+def _read_flat_index(path: str):
+    """
+    (metric, vectors) for an IndexFlatL2/IP file with the vectors memory-mapped
+    read-only, so every worker shares the same page-cache pages. None for other
+    index types.
+    """
+    with open(path, "rb") as f:
+        head = f.read(64)
+    fourcc = head[:4]
+    if fourcc not in _FLAT_INDEXES:
+        return None
+    d, ntotal = struct.unpack_from("<iq", head, 4)
+    # Two dummy int64s, is_trained (1 byte), metric type (+ a float argument for exotic metrics)
+    pos = 4 + 4 + 8 + 16 + 1
+    (metric_type,) = struct.unpack_from("<i", head, pos)
+    pos += 4 + (4 if metric_type > 1 else 0)
+    (n_floats,) = struct.unpack_from("<Q", head, pos)
+    pos += 8
+    if n_floats != d * ntotal or os.path.getsize(path) != pos + 4 * n_floats:
+        raise ValueError(f"Unexpected FAISS flat index layout: {path}")
+    vectors = np.memmap(path, dtype=np.float32, mode="r", offset=pos, shape=(ntotal, d))
+    return _FLAT_INDEXES[fourcc], vectors
+
+
+class _Docstore:
+    def __setstate__(self, state):
+        self.docs = state.get("_dict") or {}
+
+
+class _Document:
+    def __setstate__(self, state):
+        # pydantic v1 and v2 both pickle the field values under "__dict__"
+        fields = state.get("__dict__", state)
+        self.page_content = fields.get("page_content") or ""
+        self.metadata = fields.get("metadata") or {}
+
+
+class _DocstoreUnpickler(pickle.Unpickler):
+    """Reads LangChain's index.pkl without LangChain, and without executing anything else it names."""
+
+    ALLOWED = {
+        ("langchain_community.docstore.in_memory", "InMemoryDocstore"): _Docstore,
+        ("langchain.docstore.in_memory", "InMemoryDocstore"): _Docstore,
+        ("langchain_core.documents.base", "Document"): _Document,
+        ("langchain.schema.document", "Document"): _Document,
+    }
+
+    def find_class(self, module, name):
+        cls = self.ALLOWED.get((module, name))
+        if cls is None:
+            raise pickle.UnpicklingError(f"index.pkl refers to {module}.{name}, which is not allowed")
+        return cls
+
+
+def _load_chunks(pkl_path: str, n_rows: int) -> List[dict]:
+    """Docstore entries in FAISS row order, shaped like ingested chunks (1-based page and chunk)."""
+    with open(pkl_path, "rb") as f:
+        docstore, row_ids = _DocstoreUnpickler(f).load()
+    chunks, per_page = [], {}
+    for row in range(n_rows):
+        doc = docstore.docs.get(row_ids.get(row))
+        meta = doc.metadata if doc is not None else {}
+        source = ntpath.basename(str(meta.get("source") or "")) or "shared"
+        page = int(meta.get("page") or 0) + 1
+        per_page[(source, page)] = per_page.get((source, page), 0) + 1
+        # Rows without a document keep an empty chunk so row i stays chunk i
+        chunks.append({
+            "source": source,
+            "page": page,
+            "chunk": per_page[(source, page)],
+            "text": clean_text(doc.page_content) if doc is not None else "",
+        })
+    return chunks
+
+
+# -----------------------------
+# Shared corpus
+# -----------------------------
+class SharedCorpus:
+    """
+    Read-only corpus every user can query: a prebuilt FAISS index (vectors)
+    plus its LangChain docstore, converted once into a local index segment
+    (text, sentences, BM25 postings). Both are memory-mapped, so forked
+    workers share the pages. Queries are scored by embedding similarity
+    when the index's embedding model is available, else by BM25 with the
+    same overlap-ratio scores as the token fallback.
+    """
+
+    def __init__(self, path: str, embed_model: str, min_score: float = 0.3):
+        self.path = path
+        self.embed_model = embed_model
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._norms = None
+        self._faiss_index = None
+        self.metric, self.vectors = "l2", None
+
+        faiss_path = os.path.join(path, "index.faiss")
+        flat = _read_flat_index(faiss_path)
+        if flat is not None:
+            self.metric, self.vectors = flat
+            n_rows = self.vectors.shape[0]
+        elif faiss is not None:
+            self._faiss_index = faiss.read_index(faiss_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            self.metric = "l2" if self._faiss_index.metric_type == _METRIC_L2 else "ip"
+            n_rows = self._faiss_index.ntotal
+        else:
+            raise RuntimeError("Shared index is not a flat FAISS index and faiss is not installed")
+
+        pkl_path = os.path.join(path, "index.pkl")
+        store = get_local_store()
+        # Named after the docstore contents, so a replaced index gets a fresh segment
+        self.name = f"shared:{file_sha256(pkl_path)[:16]}"
+        seg = store.open(self.name)
+        if seg is None:
+            with store.writing(self.name):
+                seg = store.open(self.name)
+                if seg is None:
+                    store.write(self.name, _load_chunks(pkl_path, n_rows))
+                    seg = store.open(self.name)
+        if seg is None or len(seg) != n_rows:
+            raise RuntimeError(f"Shared index segment does not match {faiss_path}")
+        self.segment: MappedSegment = seg
+
+    def __len__(self) -> int:
+        return len(self.segment)
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1] if self.vectors is not None else self._faiss_index.d
+
+    def search_many(self, queries: List[str], token_sets: List[set], k: int = 5) -> List[list]:
+        """[(score, chunk), ...] per query, best first."""
+        emb_fn = get_registry().embedding_function(self.embed_model)
+        if emb_fn is not None:
+            try:
+                with stage("shared_embedding"):
+                    q_emb = np.asarray(emb_fn(list(queries)), dtype=np.float32)
+                if q_emb.shape[1] != self.dimension:
+                    raise ValueError(f"{self.embed_model} gives {q_emb.shape[1]}-d vectors, index has {self.dimension}")
+                with stage("shared_vector_query"):
+                    return self._vector_search(q_emb, k)
+            except Exception as e:
+                print("⚠️ Shared index vector search failed, using BM25:", e)
+        with stage("shared_token_query"):
+            return [self._token_search(q_tokens, k) for q_tokens in token_sets]
+
+    def _vector_search(self, q_emb: np.ndarray, k: int) -> List[list]:
+        if self._faiss_index is not None:
+            dist, rows = self._faiss_index.search(q_emb, k)
+            sims = 1.0 - dist / 2.0 if self.metric == "l2" else dist
+            return [self._hits(r, s) for r, s in zip(rows, sims)]
+
+        dots = q_emb @ self.vectors.T
+        if self.metric == "l2":
+            if self._norms is None:
+                with self._lock:
+                    if self._norms is None:
+                        self._norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+            # Squared L2 -> similarity as for Chroma's distances (cosine for unit vectors)
+            dist = self._norms[None, :] - 2.0 * dots + np.einsum("ij,ij->i", q_emb, q_emb)[:, None]
+            sims = 1.0 - dist / 2.0
+        else:
+            sims = dots
+        k = min(k, sims.shape[1])
+        out = []
+        for row_sims in sims:
+            rows = np.argpartition(-row_sims, k - 1)[:k]
+            rows = rows[np.argsort(-row_sims[rows])]
+            out.append(self._hits(rows, row_sims[rows]))
+        return out
+
+    def _hits(self, rows, sims) -> list:
+        hits = []
+        for row, sim in zip(rows, sims):
+            if row < 0 or sim < self.min_score:
+                continue
+            d = self.segment.chunk(int(row))
+            if d["text"]:
+                hits.append((float(sim), d))
+        return hits
+
+    def _token_search(self, q_tokens: set, k: int) -> list:
+        q_terms = (q_tokens - STOPWORDS) or q_tokens
+        return get_local_store().overlap_search(self.segment, q_tokens, q_terms, k=k)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "chunks": len(self),
+            "dimension": self.dimension,
+            "memory_mapped": self.vectors is not None,
+        }
+
+
+_SHARED: Optional[SharedCorpus] = None
+_SHARED_LOADED = False
+_SHARED_LOCK = threading.Lock()
+
+
+def get_shared_corpus() -> Optional[SharedCorpus]:
+    """
+    The process-wide shared corpus, or None when SHARED_INDEX_ENABLED=0 or
+    the index cannot be loaded (a failed load is not retried).
+    """
+    global _SHARED, _SHARED_LOADED
+    if not _SHARED_LOADED:
+        with _SHARED_LOCK:
+            if not _SHARED_LOADED:
+                if os.getenv("SHARED_INDEX_ENABLED", "1") == "1":
+                    path = os.getenv("SHARED_INDEX_PATH") or DEFAULT_SHARED_INDEX_PATH
+                    try:
+                        _SHARED = SharedCorpus(
+                            path,
+                            os.getenv("SHARED_INDEX_EMBED_MODEL", DEFAULT_SHARED_EMBED_MODEL),
+                            min_score=float(os.getenv("SHARED_INDEX_MIN_SCORE", "0.3")),
+                        )
+                        print(f"✅ Shared corpus loaded: {len(_SHARED)} chunks from {path}")
+                    except Exception as e:
+                        print("⚠️ Shared corpus unavailable:", e)
+                _SHARED_LOADED = True
+    return _SHARED
+
+
+def shared_weight() -> float:
+    """SHARED_INDEX_WEIGHT: multiplier on shared-corpus scores when merged with the user's own."""
+    return float(os.getenv("SHARED_INDEX_WEIGHT", "1.0"))
@@ -1,5 +1,5 @@
 import sys, os
-sys.path.append("C:\\FYP")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from FYP_RAG.rag_query_ibm import get_chroma_collection, tokenize, run_rag_query, LOCAL_INDEX
 
 user_id = "chroma-user"
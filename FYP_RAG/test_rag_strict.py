@@ -1,5 +1,6 @@
+import os
 import sys
-sys.path.append("C:\\FYP")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from FYP_RAG.rag_query_ibm import tokenize, run_rag_query, LOCAL_INDEX, grounding_gate
 
 # Prepare a minimal in-memory index for a dummy user
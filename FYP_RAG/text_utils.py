@@ -0,0 +1,44 @@
+import re
+
+STOPWORDS = {
+    "the","a","an","and","or","but","if","then","than","that","this","those","these",
+    "is","are","was","were","be","been","being","of","in","on","for","to","with","without",
+    "by","as","at","from","it","its","their","there","here","such","can","may","might","should",
+    "must","could","will","would","do","does","did","not","no","yes","about","into","within","between",
+}
+
+_TERM_RE = re.compile(r"[a-z0-9']+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def terms(text: str) -> list:
+    return _TERM_RE.findall(text.lower())
+
+
+def tokenize(text: str) -> set:
+    return set(terms(text))
+
+
+def clean_text(text: str) -> str:
+    return _SPACE_RE.sub(" ", text.replace("\x00", " ")).strip()
+
+
+def split_sentences(text: str) -> list:
+    return _SENTENCE_RE.split(text)
+
+
+def sentence_spans(text: str) -> list:
+    """(start, end) offsets of the pieces split_sentences(text) would return."""
+    spans, start = [], 0
+    for m in _SENTENCE_RE.finditer(text):
+        spans.append((start, m.start()))
+        start = m.end()
+    spans.append((start, len(text)))
+    return spans
+
+
+def analyze_sentences(text: str) -> tuple:
+    """Sentence spans plus the term set of each sentence, computed once at ingest."""
+    spans = sentence_spans(text)
+    return spans, [frozenset(terms(text[s:e])) for s, e in spans]
@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+DEFAULT_EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def vectorstore_path() -> str:
+    # VECTORSTORE_PATH lets benchmarks and tests run against a scratch directory
+    return os.getenv("VECTORSTORE_PATH") or str(Path(__file__).resolve().parents[1] / "vectorstore")
+
+
+class ChromaRegistry:
+    """
+    Process-wide cache of the Chroma client, embedding functions (one per model)
+    and an LRU of collection handles (per user, plus the shared document store's).
+
+    The client and collection handles are tied to the process that opened them;
+    after a fork (gunicorn workers) they are rebuilt on first use. Embedding
+    functions survive the fork so loaded weights are shared copy-on-write.
+
+    A model is loaded outside the registry lock: the first caller builds it
+    while later callers for that model wait on its future, and lookups of
+    already-open collections are not held up behind the load.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_collections: int = 64):
+        self.path = path or vectorstore_path()
+        self.max_collections = max(1, int(max_collections))
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._client = None
+        self._emb_fns: Dict[str, Future] = {}
+        self._collections: "OrderedDict[Tuple[str, str], object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._client = None
+            self._collections.clear()
+            # A load that was running in the parent has no thread left to finish it here
+            for name in [n for n, f in self._emb_fns.items() if not f.done()]:
+                del self._emb_fns[name]
+
+    def client(self):
+        with self._lock:
+            self._check_fork()
+            if self._client is None:
+                # ~0.8 s, and starts an onnxruntime thread: imported per process, never before a fork
+                import chromadb
+                self._client = chromadb.PersistentClient(path=self.path)
+            return self._client
+
+    def embedding_function(self, model_name: str):
+        with self._lock:
+            self._check_fork()
+            future = self._emb_fns.get(model_name)
+            building = future is None
+            if building:
+                future = self._emb_fns[model_name] = Future()
+        if not building:
+            return future.result()
+
+        emb_fn = None
+        try:
+            # numpy and the model runtime load with the first embedding function
+            from FYP_RAG.embeddings import build_embedding_function
+            emb_fn = build_embedding_function(model_name)
+            print(f"✅ Using local embeddings: {model_name} ({emb_fn.backend.identity})")
+        except Exception as e:
+            print("⚠️ Local embeddings unavailable; proceeding without embedding function:", e)
+        finally:
+            # Failures are cached too so a missing model is not retried on every query
+            future.set_result(emb_fn)
+        return emb_fn
+
+    def collection(self, user_id: str, model_name: str):
+        return self.named_collection(f"user_{user_id}", model_name)
+
+    def named_collection(self, name: str, model_name: str):
+        """Collection `name` (per-user, or the shared document store's), opened once per process."""
+        key = (name, model_name)
+        emb_fn = self.embedding_function(model_name)
+        with self._lock:
+            self._check_fork()
+            col = self._collections.get(key)
+            if col is not None:
+                self._collections.move_to_end(key)
+                self.hits += 1
+                return col
+
+            self.misses += 1
+            col = self.client().get_or_create_collection(
+                name=name,
+                metadata={"hnsw:space": "cosine"},
+                embedding_function=emb_fn,
+            )
+            self._collections[key] = col
+            while len(self._collections) > self.max_collections:
+                self._collections.popitem(last=False)
+                self.evictions += 1
+            return col
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "collections_cached": len(self._collections),
+                "max_collections": self.max_collections,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "embedding_models": sorted(n for n, f in self._emb_fns.items() if f.done()),
+            }
+
+
+_REGISTRY: Optional[ChromaRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> ChromaRegistry:
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = ChromaRegistry(
+                    max_collections=int(os.getenv("CHROMA_COLLECTION_CACHE_SIZE", "64")),
+                )
+    return _REGISTRY
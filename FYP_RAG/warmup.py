@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Start-up phases, in order: (name, per_process). Shared phases load read-only
+# state (modules, model weights, the memory-mapped shared corpus) and can run
+# once in the gunicorn master before forking, so workers inherit it
+# copy-on-write. They must not start threads: a thread's locks are copied into
+# the child without the thread, which is how an early chromadb import (it
+# starts an onnxruntime thread) hangs or aborts forked workers. Per-process
+# phases open handles that must not cross a fork (Chroma's SQLite client, the
+# pooled Watsonx session) and run the first embedding and shared-corpus
+# queries, which start inference thread pools.
+PHASES: List[Tuple[str, bool]] = [
+    ("imports", False),
+    ("shared_corpus", False),
+    ("embedding_model", False),
+    ("vector_store", True),
+    ("watsonx_client", True),
+    ("first_inference", True),
+]
+
+_LOCK = threading.Lock()
+# name -> {"seconds": float, "pid": int, "error": Optional[str]}
+_DONE: Dict[str, dict] = {}
+_READY_PID: Optional[int] = None
+
+
+def _imports():
+    import FYP_RAG.pdf_extract  # noqa: F401  (PyPDF2)
+    import FYP_RAG.shared_corpus  # noqa: F401  (numpy, faiss if installed)
+    from FYP_RAG.watsonx_client import _import_aiohttp
+    _import_aiohttp()
+
+
+def _shared_corpus():
+    from FYP_RAG.shared_corpus import get_shared_corpus
+
+    get_shared_corpus()
+
+
+def _embedding_model():
+    from FYP_RAG.rag_query_ibm import _embed_model
+    from FYP_RAG.shared_corpus import get_shared_corpus
+    from FYP_RAG.vector_registry import get_registry
+
+    registry = get_registry()
+    registry.embedding_function(_embed_model())
+    corpus = get_shared_corpus()
+    if corpus is not None:
+        registry.embedding_function(corpus.embed_model)
+
+
+def _vector_store():
+    from FYP_RAG.vector_registry import get_registry
+
+    get_registry().client().heartbeat()
+
+
+def _watsonx_client():
+    from FYP_RAG.watsonx_client import get_watsonx_client
+
+    get_watsonx_client()
+
+
+def _first_inference():
+    from FYP_RAG.rag_query_ibm import _embed_model
+    from FYP_RAG.shared_corpus import get_shared_corpus
+    from FYP_RAG.vector_registry import get_registry
+
+    emb_fn = get_registry().embedding_function(_embed_model())
+    if emb_fn is not None:
+        emb_fn(["warm-up"])
+    corpus = get_shared_corpus()
+    if corpus is not None:
+        corpus.search_many(["warm-up"], [{"warm"}])
+
+
+_STEPS: Dict[str, Callable[[], None]] = {
+    "imports": _imports,
+    "shared_corpus": _shared_corpus,
+    "embedding_model": _embedding_model,
+    "vector_store": _vector_store,
+    "watsonx_client": _watsonx_client,
+    "first_inference": _first_inference,
+}
+
+
+def _enabled() -> bool:
+    return os.getenv("WARMUP_ENABLED", "1") == "1"
+
+
+def record(name: str, seconds: float, error: Optional[str] = None):
+    """Records a start-up phase timed elsewhere (e.g. importing the app)."""
+    with _LOCK:
+        _DONE[name] = {"seconds": seconds, "pid": os.getpid(), "error": error}
+
+
+def warmup(per_process: bool = True) -> dict:
+    """
+    Runs the start-up phases not yet done in this process and returns
+    status(). With per_process=False only the shared phases run (the
+    gunicorn master under preload_app). A failing phase is logged and
+    recorded but does not block readiness: every component it warms
+    has a degraded path (BM25 retrieval, extractive answers).
+    """
+    global _READY_PID
+    pid = os.getpid()
+    if not _enabled():
+        if per_process:
+            _READY_PID = pid
+        return status()
+
+    ran = []
+    for name, phase_per_process in PHASES:
+        if phase_per_process and not per_process:
+            continue
+        with _LOCK:
+            done = _DONE.get(name)
+        if done is not None and (not phase_per_process or done["pid"] == pid):
+            continue
+        start = time.perf_counter()
+        error = None
+        try:
+            _STEPS[name]()
+        except Exception as e:
+            error = str(e)
+            print(f"⚠️ Warm-up phase {name} failed:", e)
+        record(name, time.perf_counter() - start, error)
+        ran.append(name)
+
+    if per_process:
+        _READY_PID = pid
+    if ran:
+        with _LOCK:
+            summary = ", ".join(f"{n} {_DONE[n]['seconds']:.2f}s" for n in ran)
+        print(f"✅ Warm-up ({'worker' if per_process else 'shared'}, pid {pid}): {summary}")
+    return status()
+
+
+def _under_gunicorn() -> bool:
+    # Set by gunicorn's arbiter before the app is loaded, inherited by workers
+    return os.getenv("SERVER_SOFTWARE", "").startswith("gunicorn/")
+
+
+def is_ready() -> bool:
+    """
+    True once warm-up has run in this worker. Without a server that runs it
+    (flask run, python app.py) or with WARMUP_ENABLED=0, components load
+    lazily on first use, so the process is ready as soon as it serves.
+    """
+    if not _enabled() or not _under_gunicorn():
+        return True
+    return _READY_PID == os.getpid()
+
+
+def status() -> dict:
+    with _LOCK:
+        phases = {name: {"seconds": round(p["seconds"], 3), "error": p["error"],
+                         "inherited": p["pid"] != os.getpid()}
+                  for name, p in _DONE.items()}
+    return {
+        "ready": is_ready(),
+        "pid": os.getpid(),
+        "phases": phases,
+        "total_s": round(sum(p["seconds"] for p in phases.values()), 3),
+    }
@@ -0,0 +1,572 @@
+import asyncio
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from FYP_RAG.metrics import stage
+
+# aiohttp is optional and only used by the async client; importing it costs
+# about 0.3 s, so it is loaded when the first AsyncWatsonxClient is built
+aiohttp = None
+_AIOHTTP_CHECKED = False
+
+DEFAULT_IAM_URL = "https://iam.cloud.ibm.com/identity/token"
+DEFAULT_MODEL_ID = "ibm/granite-3-8b-instruct"
+API_VERSION = "2024-02-15"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# -----------------------------
+# IAM token cache
+# -----------------------------
+class IAMTokenManager:
+    """
+    Caches the IBM Cloud IAM access token until shortly before it expires.
+
+    - Inside `refresh_margin` seconds of expiry the cached token is still
+      returned, but one background refresh is started.
+    - Inside `hard_margin` seconds (or with no token at all) callers block;
+      exactly one thread talks to IAM and the others wait for its result.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        iam_url: Optional[str] = None,
+        refresh_margin: float = 300.0,
+        hard_margin: float = 30.0,
+        timeout: float = 15.0,
+        session=None,
+    ):
+        self.api_key = api_key
+        self.iam_url = iam_url or os.getenv("WATSONX_IAM_URL", DEFAULT_IAM_URL)
+        self.refresh_margin = refresh_margin
+        self.hard_margin = min(hard_margin, refresh_margin)
+        self.timeout = timeout
+        self.session = session
+        self._cond = threading.Condition()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refreshing = False
+        self._last_error: Optional[Exception] = None
+        self.refresh_count = 0
+        self.refresh_failures = 0
+        self.background_refreshes = 0
+
+    # -- internals ---------------------------------------------------------
+    def _fetch(self):
+        api_key = self.api_key or os.getenv("WATSONX_API_KEY")
+        if not api_key:
+            raise RuntimeError("Missing WATSONX_API_KEY")
+
+        post = self.session.post if self.session is not None else requests.post
+        res = post(
+            self.iam_url,
+            data={
+                "apikey": api_key,
+                "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
+            },
+            timeout=self.timeout,
+        )
+        if res.status_code != 200:
+            raise RuntimeError(f"IAM token failed: {res.text}")
+
+        data = res.json()
+        token = data.get("access_token")
+        if not token:
+            raise RuntimeError(f"IAM token missing in response: {data}")
+        # IAM tokens live for an hour; trust the server but never go below a minute
+        expires_in = float(data.get("expires_in") or 3600)
+        return token, time.monotonic() + max(expires_in, 60.0)
+
+    def _refresh(self):
+        """Runs in the single thread that owns `_refreshing`."""
+        try:
+            token, expires_at = self._fetch()
+        except Exception as e:
+            with self._cond:
+                self._refreshing = False
+                self._last_error = e
+                self.refresh_failures += 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._token = token
+            self._expires_at = expires_at
+            self._refreshing = False
+            self._last_error = None
+            self.refresh_count += 1
+            self._cond.notify_all()
+        return token
+
+    def _background_refresh(self):
+        try:
+            self._refresh()
+        except Exception as e:
+            print("⚠️ Background IAM token refresh failed:", e)
+
+    # -- public API --------------------------------------------------------
+    def get_token(self) -> str:
+        with self._cond:
+            while True:
+                remaining = self._expires_at - time.monotonic()
+                if self._token and remaining > self.hard_margin:
+                    if remaining <= self.refresh_margin and not self._refreshing:
+                        self._refreshing = True
+                        self.background_refreshes += 1
+                        threading.Thread(target=self._background_refresh, daemon=True).start()
+                    return self._token
+                if not self._refreshing:
+                    self._refreshing = True
+                    break
+                # Someone else is refreshing; wait for them instead of hitting IAM again
+                self._cond.wait(timeout=self.timeout)
+                if not self._refreshing and self._last_error is not None and not self._token:
+                    raise RuntimeError(f"IAM token failed: {self._last_error}")
+        return self._refresh()
+
+    def invalidate(self):
+        with self._cond:
+            self._token = None
+            self._expires_at = 0.0
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "refresh_count": self.refresh_count,
+                "refresh_failures": self.refresh_failures,
+                "background_refreshes": self.background_refreshes,
+                "token_cached": bool(self._token),
+                "expires_in_s": max(0.0, self._expires_at - time.monotonic()) if self._token else 0.0,
+            }
+
+
+# -----------------------------
+# Pooled HTTP client
+# -----------------------------
+class DeadlineExceeded(RuntimeError):
+    pass
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class WatsonxClient:
+    """
+    Keep-alive Watsonx client: one pooled `requests.Session` per process,
+    jittered exponential backoff on 429/5xx (honouring Retry-After) and a
+    per-request deadline that bounds the total time including retries.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        project_id: Optional[str] = None,
+        model_id: str = DEFAULT_MODEL_ID,
+        pool_size: int = 10,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        read_timeout: float = 30.0,
+        deadline_s: float = 45.0,
+        token_manager: Optional[IAMTokenManager] = None,
+    ):
+        self.url = url
+        self.project_id = project_id
+        self.model_id = model_id
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.read_timeout = read_timeout
+        self.deadline_s = deadline_s
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.token_manager = token_manager or IAMTokenManager()
+        if self.token_manager.session is None:
+            # IAM calls share the pooled keep-alive session as well
+            self.token_manager.session = self.session
+
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.retries = 0
+
+    def new_deadline(self) -> float:
+        return time.monotonic() + self.deadline_s
+
+    def _backoff(self, attempt: int, res=None) -> float:
+        retry_after = _retry_after_seconds(res.headers.get("Retry-After")) if res is not None else None
+        if retry_after is not None:
+            return retry_after
+        # Full jitter keeps a burst of 429s from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, url: str, deadline: Optional[float] = None, **kwargs):
+        """POST with retries on 429/5xx and connection errors, bounded by `deadline`."""
+        deadline = deadline or self.new_deadline()
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Watsonx request deadline exceeded")
+
+            res = None
+            error: Optional[Exception] = None
+            with self._lock:
+                self.requests_sent += 1
+            try:
+                res = self.session.post(url, timeout=min(self.read_timeout, remaining), **kwargs)
+                if res.status_code not in RETRY_STATUSES:
+                    return res
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt >= self.max_retries:
+                if res is not None:
+                    return res
+                raise RuntimeError(f"Watsonx request failed: {error}")
+
+            delay = self._backoff(attempt, res)
+            if time.monotonic() + delay >= deadline:
+                # Not enough budget left to wait it out; surface the last answer now
+                if res is not None:
+                    return res
+                raise DeadlineExceeded(f"Watsonx request deadline exceeded: {error}")
+            with self._lock:
+                self.retries += 1
+            if res is not None:
+                res.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def chat_request(self, messages: list, parameters: dict):
+        """(base url, JSON payload) for a chat call."""
+        url = self.url or os.getenv("WATSONX_URL")
+        project_id = self.project_id or os.getenv("IBM_PROJECT_ID")
+        if not url or not project_id:
+            raise RuntimeError("Watsonx env vars missing")
+
+        return url, {
+            "model_id": self.model_id,
+            "project_id": project_id,
+            "messages": messages,
+            "parameters": parameters,
+        }
+
+    def _post_chat(self, path: str, messages: list, parameters: dict, deadline: float, stream: bool = False):
+        url, payload = self.chat_request(messages, parameters)
+
+        for attempt in range(2):
+            with stage("iam_token"):
+                token = self.token_manager.get_token()
+            # Until response headers (and the body, unless streaming), retries included
+            with stage("granite_http"):
+                res = self.post(
+                    f"{url}{path}?version={API_VERSION}",
+                    deadline=deadline,
+                    headers={
+                        "Authorization": f"Bearer {token}",
+                        "Content-Type": "application/json",
+                    },
+                    json=payload,
+                    stream=stream,
+                )
+            # A revoked/expired token gets one retry with a fresh one
+            if res.status_code == 401 and attempt == 0:
+                res.close()
+                self.token_manager.invalidate()
+                continue
+            break
+
+        # Handle quota / auth issues
+        if res.status_code in (401, 403, 429):
+            res.close()
+            raise RuntimeError(f"Watsonx quota/auth error: {res.status_code}")
+
+        if res.status_code != 200:
+            raise RuntimeError(f"Watsonx error {res.status_code}: {res.text}")
+
+        return res
+
+    def chat(self, messages: list, parameters: dict, deadline: Optional[float] = None) -> dict:
+        res = self._post_chat("/ml/v1/text/chat", messages, parameters, deadline or self.new_deadline())
+        try:
+            return res.json()
+        except Exception:
+            raise RuntimeError(f"Non-JSON Watsonx response: {res.text}")
+
+    def chat_stream(self, messages: list, parameters: dict, deadline: Optional[float] = None):
+        """Yields answer text pieces from the chat_stream SSE endpoint as they arrive."""
+        deadline = deadline or self.new_deadline()
+        res = self._post_chat("/ml/v1/text/chat_stream", messages, parameters, deadline, stream=True)
+        try:
+            for line in res.iter_lines(decode_unicode=True):
+                if time.monotonic() > deadline:
+                    raise DeadlineExceeded("Watsonx stream deadline exceeded")
+                yield from sse_pieces(line)
+        finally:
+            res.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {"requests_sent": self.requests_sent, "retries": self.retries}
+        out["iam"] = self.token_manager.stats()
+        return out
+
+
+def sse_pieces(line: str) -> Iterator[str]:
+    """Answer text carried by one `data:` line of the chat_stream SSE response."""
+    if not line or not line.startswith("data:"):
+        return
+    data = line[5:].strip()
+    if not data or data == "[DONE]":
+        return
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return
+    for choice in event.get("choices") or []:
+        piece = (choice.get("delta") or {}).get("content")
+        if piece:
+            yield piece
+    for result in event.get("results") or []:
+        piece = result.get("generated_text")
+        if piece:
+            yield piece
+
+
+# -----------------------------
+# Async client
+# -----------------------------
+class AsyncWatsonxClient:
+    """
+    asyncio counterpart of WatsonxClient for batch/async pipelines, sharing
+    its settings, retry policy and IAM token cache. Each event loop gets its
+    own aiohttp session: calls made inside `session_scope()` share it until
+    the loop's last scope exits, and a session left open is closed on its
+    loop when that loop shuts down (asyncio.run finalises async generators
+    before closing the loop). Without aiohttp installed, calls run the sync
+    client in a worker thread instead.
+    """
+
+    def __init__(self, client: WatsonxClient, pool_size: int = 32):
+        _import_aiohttp()
+        self.client = client
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        # Keyed by event loop; entries go with their loop
+        self._sessions = weakref.WeakKeyDictionary()
+        self._closers = weakref.WeakKeyDictionary()
+        self._scopes = weakref.WeakKeyDictionary()
+
+    async def _get_session(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.get(loop)
+            if session is not None and not session.closed:
+                return session
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+            self._sessions[loop] = session
+        closer = self._close_on_shutdown(session)
+        # Starting it registers the generator with the loop, which closes it at shutdown
+        await closer.__anext__()
+        with self._lock:
+            self._closers[loop] = closer
+        return session
+
+    @staticmethod
+    async def _close_on_shutdown(session):
+        try:
+            yield
+        finally:
+            if not session.closed:
+                await session.close()
+
+    async def close(self):
+        """Closes the running loop's session."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.pop(loop, None)
+            closer = self._closers.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+        if closer is not None:
+            await closer.aclose()
+
+    @contextlib.asynccontextmanager
+    async def session_scope(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._scopes[loop] = self._scopes.get(loop, 0) + 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._scopes[loop] -= 1
+                last = self._scopes[loop] == 0
+            if last:
+                await self.close()
+
+    async def _post_chat(self, path: str, messages: list, parameters: dict, deadline: float):
+        client = self.client
+        url, payload = client.chat_request(messages, parameters)
+        session = await self._get_session()
+        attempt = 0
+        refreshed = False
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Watsonx request deadline exceeded")
+            with client._lock:
+                client.requests_sent += 1
+            # Usually a cache hit; a thread keeps an IAM round trip off the loop
+            token = await asyncio.to_thread(client.token_manager.get_token)
+            res = None
+            error: Optional[Exception] = None
+            try:
+                res = await session.post(
+                    f"{url}{path}?version={API_VERSION}",
+                    headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=None, sock_connect=min(client.read_timeout, remaining),
+                                                  sock_read=min(client.read_timeout, remaining)),
+                )
+                if res.status == 401 and not refreshed:
+                    # A revoked/expired token gets one retry with a fresh one
+                    res.release()
+                    client.token_manager.invalidate()
+                    refreshed = True
+                    continue
+                if res.status not in RETRY_STATUSES:
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt >= client.max_retries:
+                if res is not None:
+                    break
+                raise RuntimeError(f"Watsonx request failed: {error}")
+            delay = client._backoff(attempt, res)
+            if time.monotonic() + delay >= deadline:
+                if res is not None:
+                    break
+                raise DeadlineExceeded(f"Watsonx request deadline exceeded: {error}")
+            with client._lock:
+                client.retries += 1
+            if res is not None:
+                res.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if res.status in (401, 403, 429):
+            res.release()
+            raise RuntimeError(f"Watsonx quota/auth error: {res.status}")
+        if res.status != 200:
+            text = await res.text()
+            res.release()
+            raise RuntimeError(f"Watsonx error {res.status}: {text}")
+        return res
+
+    async def chat(self, messages: list, parameters: dict, deadline: Optional[float] = None) -> dict:
+        if aiohttp is None:
+            return await asyncio.to_thread(self.client.chat, messages, parameters, deadline)
+        deadline = deadline or self.client.new_deadline()
+        res = await self._post_chat("/ml/v1/text/chat", messages, parameters, deadline)
+        try:
+            return await res.json(content_type=None)
+        except Exception:
+            raise RuntimeError(f"Non-JSON Watsonx response: {await res.text()}")
+        finally:
+            res.release()
+
+    async def chat_stream(self, messages: list, parameters: dict,
+                          deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """Async version of WatsonxClient.chat_stream."""
+        deadline = deadline or self.client.new_deadline()
+        if aiohttp is None:
+            data = await asyncio.to_thread(self.client.chat, messages, parameters, deadline)
+            for choice in data.get("choices") or []:
+                yield (choice.get("message") or {}).get("content") or ""
+            for result in data.get("results") or []:
+                yield result.get("generated_text") or ""
+            return
+        res = await self._post_chat("/ml/v1/text/chat_stream", messages, parameters, deadline)
+        try:
+            async for raw in res.content:
+                if time.monotonic() > deadline:
+                    raise DeadlineExceeded("Watsonx stream deadline exceeded")
+                for piece in sse_pieces(raw.decode("utf-8", errors="replace").rstrip("\r\n")):
+                    yield piece
+        finally:
+            res.release()
+
+
+def _import_aiohttp():
+    global aiohttp, _AIOHTTP_CHECKED
+    if not _AIOHTTP_CHECKED:
+        try:
+            import aiohttp as module
+            aiohttp = module
+        except Exception:
+            pass
+        _AIOHTTP_CHECKED = True
+    return aiohttp
+
+
+_CLIENT: Optional[WatsonxClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_watsonx_client() -> WatsonxClient:
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = WatsonxClient(
+                    pool_size=int(os.getenv("WATSONX_POOL_SIZE", "10")),
+                    max_retries=int(os.getenv("WATSONX_MAX_RETRIES", "3")),
+                    backoff_base=float(os.getenv("WATSONX_BACKOFF_BASE_S", "0.5")),
+                    deadline_s=float(os.getenv("WATSONX_REQUEST_DEADLINE_S", "45")),
+                    token_manager=IAMTokenManager(
+                        refresh_margin=float(os.getenv("WATSONX_TOKEN_REFRESH_MARGIN_S", "300")),
+                    ),
+                )
+    return _CLIENT
+
+
+_ASYNC_CLIENT: Optional[AsyncWatsonxClient] = None
+
+
+def get_async_watsonx_client() -> AsyncWatsonxClient:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        client = get_watsonx_client()  # takes _CLIENT_LOCK itself
+        with _CLIENT_LOCK:
+            if _ASYNC_CLIENT is None:
+                _ASYNC_CLIENT = AsyncWatsonxClient(client, pool_size=int(os.getenv("WATSONX_ASYNC_POOL_SIZE", "32")))
+    return _ASYNC_CLIENT
+
+
+def get_token_manager() -> IAMTokenManager:
+    return get_watsonx_client().token_manager
@@ -1,11 +1,20 @@
+import base64
+import hashlib
+import itertools
+import json
 import os
+import shutil
 import sqlite3
 import time
-from datetime import datetime
+import uuid
 
-from flask import Flask, request, jsonify, render_template
+# Start of the app import, for the "import_app" start-up phase (see FYP_RAG/warmup.py)
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context, url_for
 from flask_cors import CORS
 from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 
 # -----------------------------
@@ -27,21 +36,29 @@ app.config["MAX_CONTENT_LENGTH"] = 25 * 1024 * 1024
 # -----------------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
-DB_PATH = os.path.join(BASE_DIR, "database.db")
+DB_PATH = os.getenv("DATABASE_PATH", os.path.join(BASE_DIR, "database.db"))
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # -----------------------------
 # RAG engine imports
 # -----------------------------
-from FYP_RAG.rag_query_ibm import run_rag_query
-# NOTE: ingestion is disabled on Heroku safely
+from FYP_RAG.rag_query_ibm import ingest_document_docling, log_environment, run_rag_query, stream_rag_query
+from FYP_RAG.admission import Overloaded, get_admission
+from FYP_RAG.doc_store import get_doc_store
+from FYP_RAG.ingest_jobs import IngestJobManager, QueueFull
+from FYP_RAG.log_writer import SQLiteLogWriter, connect, enable_wal
+from FYP_RAG.vector_registry import get_registry
+from FYP_RAG import metrics, warmup
+# NOTE: ingestion stays disabled on Heroku unless ENABLE_UPLOADS=1
+UPLOADS_ENABLED = os.getenv("ENABLE_UPLOADS", "0") == "1"
 
 # -----------------------------
 # Database init (CRITICAL FIX)
 # -----------------------------
 def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
+    enable_wal(DB_PATH)
+    with connect(DB_PATH) as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS query_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -63,10 +80,97 @@ def init_db():
                 timestamp TEXT
             )
         """)
+        # /history pages walk this index newest-first instead of sorting the user's rows
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_query_logs_user_ts
+            ON query_logs (user_id, timestamp, id)
+        """)
+        # Per-user change counter behind the /history ETag, kept current by triggers
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS history_versions (
+                user_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        """)
+        for event, row in (("INSERT", "NEW"), ("DELETE", "OLD"), ("UPDATE", "NEW")):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS query_logs_version_{event.lower()}
+                AFTER {event} ON query_logs
+                BEGIN
+                    INSERT INTO history_versions (user_id, version) VALUES ({row}.user_id, 1)
+                    ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+                END
+            """)
 
 # ✅ MUST run at import time for Heroku
 init_db()
 
+def ingest_upload(user_id, filepath, progress=None):
+    """
+    Ingests an upload saved under uploads/<user>/.incoming/<id>/, then moves it
+    to uploads/<user>/<filename>; the staging directory is removed either way.
+    """
+    staging = os.path.dirname(filepath)
+    try:
+        ingest_document_docling(user_id, filepath, progress)
+        user_dir = os.path.dirname(os.path.dirname(staging))
+        os.replace(filepath, os.path.join(user_dir, os.path.basename(filepath)))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+# PDF parsing and embedding run on background workers, never on the request thread
+INGEST_JOBS = IngestJobManager(
+    ingest_upload,
+    workers=int(os.getenv("INGEST_WORKERS", "1")),
+    max_queue=int(os.getenv("INGEST_QUEUE_SIZE", "16")),
+    per_user_running=int(os.getenv("INGEST_PER_USER_RUNNING", "1")),
+    per_user_queued=int(os.getenv("INGEST_PER_USER_QUEUED", "4")),
+    nice=int(os.getenv("INGEST_NICE", "10")),
+    db_path=DB_PATH,
+)
+
+
+# query_logs / perf_logs rows are committed in batches by a background thread
+LOG_WRITER = SQLiteLogWriter(
+    DB_PATH,
+    max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("LOG_BATCH_SIZE", "256")),
+    flush_interval_s=float(os.getenv("LOG_FLUSH_INTERVAL_S", "0.5")),
+)
+
+
+def log_query(user_id, query, answer, confidence):
+    LOG_WRITER.log_query(user_id, query, answer, confidence)
+
+
+def _request_user_id():
+    data = request.get_json(silent=True) if request.is_json else None
+    return (data or {}).get("user_id") or request.form.get("user_id") or request.args.get("user_id") or "guest"
+
+
+@app.before_request
+def start_timer():
+    g.start = time.perf_counter()
+
+
+@app.after_request
+def log_perf(response):
+    # Streaming responses log their own row once the stream has finished
+    if request.endpoint in (None, "static", "metrics_endpoint", "healthz", "readyz") or "start" not in g:
+        return response
+    if request.endpoint == "query_rag_stream" and response.is_streamed:
+        return response
+    duration_ms = (time.perf_counter() - g.start) * 1000
+    LOG_WRITER.log_perf(_request_user_id(), request.endpoint, g.get("perf_ref"), duration_ms,
+                        response.status_code < 400)
+    return response
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 # -----------------------------
 # Routes
 # -----------------------------
@@ -76,14 +180,57 @@ def index():
 
 
 # -----------------------------
-# Upload (DISABLED FOR HEROKU)
+# Upload (background ingestion; off unless ENABLE_UPLOADS=1)
 # -----------------------------
 @app.route("/upload_docs", methods=["POST"])
 def upload_docs():
+    if not UPLOADS_ENABLED:
+        return jsonify(
+            success=False,
+            message="Document upload is disabled on the deployed demo."
+        ), 200
+
+    file = request.files.get("file")
+    user_id = request.form.get("user_id", "guest")
+    filename = secure_filename(file.filename or "") if file else ""
+    if not filename:
+        return jsonify(success=False, message="Missing file"), 400
+    if not filename.lower().endswith(".pdf"):
+        return jsonify(success=False, message="Only PDF documents are supported."), 400
+
+    # Each upload is saved in its own staging directory, so a queued or running job for the same
+    # filename never parses a file being overwritten; ingest_upload moves it into place when done
+    user_dir = os.path.join(UPLOAD_FOLDER, secure_filename(user_id) or "guest")
+    staging = os.path.join(user_dir, ".incoming", uuid.uuid4().hex)
+    os.makedirs(staging)
+    path = os.path.join(staging, filename)
+    file.save(path)
+
+    try:
+        job = INGEST_JOBS.submit(user_id, path)
+        g.perf_ref = job["job_id"]
+    except QueueFull as e:
+        shutil.rmtree(staging, ignore_errors=True)
+        resp = jsonify(success=False, message=f"{e}. Please try again shortly.")
+        resp.headers["Retry-After"] = "10"
+        return resp, 503
+
     return jsonify(
-        success=False,
-        message="Document upload is disabled on the deployed demo."
-    ), 200
+        success=True,
+        job_id=job["job_id"],
+        status=job["status"],
+        status_url=url_for("upload_status", job_id=job["job_id"], user_id=user_id),
+    ), 202
+
+
+@app.route("/upload_docs/<job_id>", methods=["GET"])
+def upload_status(job_id):
+    # Only the uploader sees a job; an unknown id and someone else's job look the same
+    job = INGEST_JOBS.get(job_id)
+    user_id = request.args.get("user_id")
+    if not job or not user_id or job["user_id"] != user_id:
+        return jsonify(success=False, message="Unknown job"), 404
+    return jsonify(success=True, **job)
 
 
 # -----------------------------
@@ -113,21 +260,8 @@ def query_rag():
 
         duration_ms = int((time.perf_counter() - start) * 1000)
 
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.execute(
-                """
-                INSERT INTO query_logs
-                (user_id, query, answer, confidence, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    user_id,
-                    query,
-                    result.get("answer"),
-                    str(result.get("confidence")),
-                    datetime.now().isoformat(timespec="seconds"),
-                )
-            )
+        g.perf_ref = result.get("retrieval")
+        log_query(user_id, query, result.get("answer"), result.get("confidence"))
 
         return jsonify(
             success=True,
@@ -135,8 +269,14 @@ def query_rag():
             confidence=result.get("confidence"),
             sources=result.get("sources", []),
             duration_ms=duration_ms,
+            cache=result.get("cache"),
+            coalesced=result.get("coalesced", False),
+            prompt_tokens=result.get("prompt_tokens"),
         )
 
+    except Overloaded:
+        # Turned into a fast 503 + Retry-After by handle_overloaded
+        raise
     except Exception as e:
         return jsonify(
             success=False,
@@ -145,30 +285,171 @@ def query_rag():
         ), 500
 
 
+# -----------------------------
+# RAG Query (streaming, server-sent events)
+# -----------------------------
+@app.route("/query_rag/stream", methods=["GET", "POST"])
+def query_rag_stream():
+    # GET lets the browser use EventSource; POST mirrors /query_rag
+    data = request.get_json(silent=True) or request.args
+    query = (data.get("query") or "").strip()
+    user_id = data.get("user_id", "guest")
+
+    if not query:
+        return jsonify(success=False, answer="Empty query"), 400
+
+    start = time.perf_counter()
+    events = stream_rag_query(query, user_id)
+    # Run retrieval and wait for a Granite slot before any bytes are sent, so an
+    # Overloaded can still be answered with a real 503 (see handle_overloaded)
+    head, head_error = [], None
+    try:
+        head.append(next(events))
+    except StopIteration:
+        pass
+    except Overloaded:
+        raise
+    except Exception as e:
+        head_error = e
+
+    def generate():
+        first_byte_ms = None
+        meta = {}
+        final = None
+        ok = True
+        try:
+            if head_error is not None:
+                raise head_error
+            for event, payload in itertools.chain(head, events):
+                if event == "meta":
+                    meta = payload
+                elif event == "final":
+                    final = payload
+                if first_byte_ms is None:
+                    first_byte_ms = int((time.perf_counter() - start) * 1000)
+                yield sse_event(event, payload)
+        except Exception as e:
+            ok = False
+            yield sse_event("error", {"answer": "Internal error during RAG synthesis", "error": str(e)})
+
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        ttfb_ms = final.get("ttfb_ms") if final else None
+        print(f"ℹ️ /query_rag/stream ttfb={first_byte_ms}ms first_token={ttfb_ms}ms total={duration_ms}ms")
+
+        if final:
+            log_query(user_id, query, final.get("answer"), meta.get("confidence"))
+        LOG_WRITER.log_perf(user_id, "query_rag_stream", meta.get("retrieval"), duration_ms, ok and final is not None)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # -----------------------------
 # History
 # -----------------------------
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 200
+COMPACT_ANSWER_CHARS = 240
+
+
+def _encode_cursor(timestamp, item_id):
+    raw = json.dumps([timestamp, item_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    timestamp, item_id = json.loads(raw)
+    if not isinstance(timestamp, str) or not isinstance(item_id, int):
+        raise ValueError("bad cursor")
+    return timestamp, item_id
+
+
 @app.route("/history", methods=["GET"])
 def history():
+    """
+    Newest-first history, keyset-paginated: pass back `next_cursor` as
+    `cursor` for the next page. `compact=1` truncates answers (fetch the
+    full one from /history/<id>). Unchanged pages answer 304 to If-None-Match.
+    """
     user_id = request.args.get("user_id", "guest")
-
-    with sqlite3.connect(DB_PATH) as conn:
+    cursor = request.args.get("cursor") or None
+    compact = request.args.get("compact", "0") in ("1", "true")
+    try:
+        limit = min(max(int(request.args.get("limit", HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        after = _decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return jsonify(success=False, message="Invalid limit or cursor"), 400
+
+    # Read-your-writes: commit this worker's queued rows before reading
+    LOG_WRITER.flush()
+    with connect(DB_PATH) as conn:
         conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT version FROM history_versions WHERE user_id = ?", (user_id,)).fetchone()
+        version = row["version"] if row else 0
+        etag = hashlib.sha1(
+            f"{user_id}\0{version}\0{cursor}\0{limit}\0{compact}".encode("utf-8")
+        ).hexdigest()
+        if etag in request.if_none_match:
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+
+        answer_col = f"substr(answer, 1, {COMPACT_ANSWER_CHARS}) AS answer, length(answer) AS answer_len" \
+            if compact else "answer"
+        where, params = "user_id = ?", [user_id]
+        if after:
+            # Row-value comparison lets SQLite seek the index to the cursor
+            where += " AND (timestamp, id) < (?, ?)"
+            params += [after[0], after[1]]
         rows = conn.execute(
+            f"""
+            SELECT id, query, {answer_col}, confidence, timestamp
+            FROM query_logs
+            WHERE {where}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+            """,
+            (*params, limit + 1),
+        ).fetchall()
+
+    items = []
+    for r in rows[:limit]:
+        item = dict(r)
+        if compact:
+            item["truncated"] = (item.pop("answer_len") or 0) > COMPACT_ANSWER_CHARS
+        items.append(item)
+    next_cursor = _encode_cursor(items[-1]["timestamp"], items[-1]["id"]) if len(rows) > limit else None
+
+    resp = jsonify(success=True, history=items, next_cursor=next_cursor)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+@app.route("/history/<int:item_id>", methods=["GET"])
+def history_item(item_id):
+    user_id = request.args.get("user_id", "guest")
+
+    LOG_WRITER.flush()
+    with connect(DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(
             """
             SELECT id, query, answer, confidence, timestamp
             FROM query_logs
-            WHERE user_id = ?
-            ORDER BY timestamp DESC
-            LIMIT 100
+            WHERE id = ? AND user_id = ?
             """,
-            (user_id,),
-        ).fetchall()
+            (item_id, user_id),
+        ).fetchone()
 
-    return jsonify(
-        success=True,
-        history=[dict(row) for row in rows]
-    )
+    if row is None:
+        return jsonify(success=False, message="Unknown history item"), 404
+    return jsonify(success=True, item=dict(row))
 
 
 @app.route("/history/delete", methods=["POST"])
@@ -180,7 +461,8 @@ def history_delete():
     if not item_id:
         return jsonify(success=False, message="Missing id"), 400
 
-    with sqlite3.connect(DB_PATH) as conn:
+    LOG_WRITER.flush()
+    with connect(DB_PATH) as conn:
         cur = conn.execute(
             "DELETE FROM query_logs WHERE id = ? AND user_id = ?",
             (item_id, user_id),
@@ -194,7 +476,8 @@ def history_clear():
     data = request.get_json(silent=True) or {}
     user_id = data.get("user_id", "guest")
 
-    with sqlite3.connect(DB_PATH) as conn:
+    LOG_WRITER.flush()
+    with connect(DB_PATH) as conn:
         cur = conn.execute(
             "DELETE FROM query_logs WHERE user_id = ?",
             (user_id,),
@@ -203,9 +486,83 @@ def history_clear():
     return jsonify(success=True, deleted=cur.rowcount)
 
 
+# -----------------------------
+# Metrics (Prometheus text format; each gunicorn worker reports its own)
+# -----------------------------
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    jobs = INGEST_JOBS.stats()
+    logs = LOG_WRITER.stats()
+    admission = get_admission().stats()
+    registry = get_registry().stats()
+    extra = [
+        metrics.gauge("rag_ingest_jobs", "Ingestion jobs by state.",
+                      {(("state", k),): jobs[k] for k in ("queued", "running")}),
+        metrics.gauge("rag_log_writer_queued_rows", "Log rows waiting to be written.", {(): logs["queued"]}),
+        metrics.counter("rag_log_writer_rows_total", "Log rows written, dropped or failed since start.",
+                        {(("state", k),): logs[k] for k in ("written", "dropped", "failed")}),
+        metrics.gauge("rag_admission_queries", "Queries holding or waiting for a Granite slot.",
+                      {(("state", k),): admission[k] for k in ("inflight", "queued")}),
+        metrics.gauge("rag_admission_limit", "Configured Granite slot and wait-queue limits.",
+                      {(("limit", k),): admission[k] for k in ("max_inflight", "max_queue")}),
+        metrics.gauge("rag_startup_phase_seconds", "Seconds spent in each start-up phase.",
+                      {(("phase", k),): p["seconds"] for k, p in warmup.status()["phases"].items()}),
+        metrics.gauge("rag_chroma_collections_cached", "Open Chroma collection handles and the cache limit.",
+                      {(("kind", "cached"),): registry["collections_cached"],
+                       (("kind", "max"),): registry["max_collections"]}),
+        metrics.counter("rag_chroma_collection_lookups_total", "Chroma collection handle lookups by result.",
+                        {(("result", "hit"),): registry["hits"], (("result", "miss"),): registry["misses"]}),
+        metrics.counter("rag_chroma_collection_evictions_total", "Collection handles evicted from the cache.",
+                        {(): registry["evictions"]}),
+        metrics.gauge("rag_embedding_models_loaded", "Embedding models loaded in this worker.",
+                      {(("model", m),): 1 for m in registry["embedding_models"]}),
+    ]
+    doc_store = get_doc_store()
+    if doc_store is not None:
+        stored = doc_store.stats()
+        extra.append(metrics.gauge("rag_doc_store", "Shared document store: unique documents, chunks and user links.",
+                                   {(("kind", k),): stored[k] for k in ("documents", "chunks", "links", "deduplicated")}))
+    return Response(metrics.render(extra), mimetype="text/plain; version=0.0.4")
+
+
+# -----------------------------
+# Health / readiness
+# -----------------------------
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify(status="ok")
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    # Under gunicorn, ready once warm-up has run in this worker (gunicorn.conf.py post_worker_init)
+    state = warmup.status()
+    return jsonify(state), 200 if state["ready"] else 503
+
+
 # -----------------------------
 # Errors
 # -----------------------------
 @app.errorhandler(RequestEntityTooLarge)
 def handle_large_file(e):
     return jsonify(success=False, message="File too large. Max 25 MB."), 413
+
+
+@app.errorhandler(Overloaded)
+def handle_overloaded(e):
+    resp = jsonify(
+        success=False,
+        answer="The assistant is busy right now. Please try again in a few seconds.",
+        error=e.reason,
+    )
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp, 503
+
+
+# -----------------------------
+# Start-up
+# -----------------------------
+# Only cheap setup happens at import; the embedding model, vector store and shared
+# corpus load in warmup.warmup(), which gunicorn.conf.py runs before workers take traffic
+log_environment()
+warmup.record("import_app", time.perf_counter() - _IMPORT_STARTED)
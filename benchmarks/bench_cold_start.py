@@ -0,0 +1,95 @@
+"""
+Cold start of a fresh process: time to `import app`, each warm-up phase
+(FYP_RAG/warmup.py) and the first /query_rag, with and without warm-up.
+Every run is a new interpreter so nothing is cached in memory; the vector
+store and shared-corpus segment on disk are reused, as after a dyno restart.
+
+    python -m benchmarks.bench_cold_start --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import percentiles, scratch_env, write_results
+from benchmarks.watsonx_stub import StubConfig, start_stub, stub_env
+
+QUESTION = "What is the maternal mortality ratio in the African Region?"
+
+
+def child(warm: bool):
+    """Runs in the measured process; prints one JSON line."""
+    t0 = time.perf_counter()
+    import app
+    from FYP_RAG import warmup
+    import_s = time.perf_counter() - t0
+
+    phases = warmup.warmup()["phases"] if warm else {}
+    client = app.app.test_client()
+    t1 = time.perf_counter()
+    res = client.post("/query_rag", json={"query": QUESTION, "user_id": "cold-start"})
+    first_query_s = time.perf_counter() - t1
+    t2 = time.perf_counter()
+    client.post("/query_rag", json={"query": QUESTION + " (again)", "user_id": "cold-start"})
+    second_query_s = time.perf_counter() - t2
+    print(json.dumps({
+        "import_s": import_s,
+        "phases": {k: v["seconds"] for k, v in phases.items()},
+        "first_query_s": first_query_s,
+        "second_query_s": second_query_s,
+        "status": res.status_code,
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=3, help="fresh processes per mode")
+    ap.add_argument("--latency-ms", type=float, default=100.0, help="stub Granite latency")
+    ap.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+    if args.child:
+        child(args.child == "warm")
+        return
+
+    stub, base_url = start_stub(StubConfig(args.latency_ms, jitter_ms=0, seed=1))
+    root = scratch_env(SHARED_INDEX_ENABLED=1, **stub_env(base_url))
+    os.environ["DATABASE_PATH"] = os.path.join(root, "database.db")
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    results = {}
+    for mode in ("cold", "warm"):
+        runs = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            out = subprocess.run([sys.executable, "-m", "benchmarks.bench_cold_start", "--child", mode],
+                                 cwd=repo, capture_output=True, text=True, check=True)
+            wall_s = time.perf_counter() - t0
+            line = [ln for ln in out.stdout.splitlines() if ln.startswith("{")][-1]
+            runs.append(dict(json.loads(line), wall_s=wall_s))
+
+        def ms(key):
+            return percentiles([r[key] * 1000 for r in runs])
+
+        results[mode] = {
+            "import_ms": ms("import_s"),
+            "first_query_ms": ms("first_query_s"),
+            "second_query_ms": ms("second_query_s"),
+            "process_wall_ms": ms("wall_s"),
+        }
+        phase_names = sorted({p for r in runs for p in r["phases"]})
+        if phase_names:
+            results[mode]["phases_ms"] = {
+                p: percentiles([r["phases"].get(p, 0.0) * 1000 for r in runs])["mean"] for p in phase_names}
+        print(f"{mode:>5}: import {results[mode]['import_ms']['mean']}ms, "
+              f"first query {results[mode]['first_query_ms']['mean']}ms, "
+              f"second {results[mode]['second_query_ms']['mean']}ms"
+              + (f", warm-up {results[mode]['phases_ms']}" if phase_names else ""))
+    stub.shutdown()
+    write_results("cold_start", {k: v for k, v in vars(args).items() if k != "child"}, results, args.out)
+
+
+if __name__ == "__main__":
+    main()
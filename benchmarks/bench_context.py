@@ -0,0 +1,70 @@
+"""
+Prompt size and answer latency with the old context (top chunks joined and
+cut at 6000 characters) versus token-budgeted sentence packing, against the
+local Watsonx stand-in with a per-prompt-token prefill cost.
+
+    python -m benchmarks.bench_context --budgets 0,400,600,1000 --prefill-ms-per-1k 400
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import percentiles, scratch_env, write_results
+from benchmarks.corpus import build_corpus
+from benchmarks.watsonx_stub import StubConfig, start_stub, stub_env
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=2)
+    ap.add_argument("--pages", type=int, default=20)
+    ap.add_argument("--lines-per-page", type=int, default=40)
+    ap.add_argument("--duplicate-docs", type=int, default=1,
+                    help="extra copies of the first document ingested under other names (near-duplicate chunks)")
+    ap.add_argument("--budgets", default="0,600", help="RAG_CONTEXT_TOKEN_BUDGET values; 0 = old behaviour")
+    ap.add_argument("--latency-ms", type=float, default=200.0, help="stub base latency")
+    ap.add_argument("--prefill-ms-per-1k", type=float, default=400.0, help="stub latency per 1000 prompt tokens")
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    stub, base_url = start_stub(StubConfig(args.latency_ms, jitter_ms=0, seed=1,
+                                           prefill_ms_per_1k_tokens=args.prefill_ms_per_1k))
+    root = scratch_env(**stub_env(base_url))
+    corpus = build_corpus(os.path.join(root, "corpus"), args.docs, args.pages, args.lines_per_page)
+    from FYP_RAG import rag_query_ibm
+
+    files = list(corpus["files"])
+    for i in range(args.duplicate_docs):
+        copy = os.path.join(root, "corpus", f"copy_{i + 1}_{os.path.basename(files[0])}")
+        with open(files[0], "rb") as src, open(copy, "wb") as dst:
+            dst.write(src.read())
+        files.append(copy)
+    for path in files:
+        rag_query_ibm.ingest_local_document("bench-user", path)
+
+    results = {}
+    for budget in [int(b) for b in args.budgets.split(",") if b.strip()]:
+        os.environ["RAG_CONTEXT_TOKEN_BUDGET"] = str(budget)
+        tokens, latencies, hits = [], [], 0
+        for q in corpus["queries"]:
+            t0 = time.perf_counter()
+            result = rag_query_ibm.run_rag_query(q["query"], "bench-user")
+            latencies.append((time.perf_counter() - t0) * 1000)
+            tokens.append(result.get("prompt_tokens") or 0)
+            hits += q["fact"] in result["answer"]
+        label = "truncate_6000_chars" if budget <= 0 else f"budget_{budget}"
+        results[label] = {
+            "prompt_tokens": percentiles(tokens),
+            "latency_ms": percentiles(latencies),
+            "answers_with_fact": hits,
+        }
+        print(f"{label:>20}: prompt tokens mean {results[label]['prompt_tokens']['mean']}, "
+              f"latency p50 {results[label]['latency_ms']['p50']}ms p95 {results[label]['latency_ms']['p95']}ms, "
+              f"{hits}/{len(corpus['queries'])} answers quote the fact")
+    results["stub"] = dict(stub.config.counts)
+    stub.shutdown()
+    write_results("context", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
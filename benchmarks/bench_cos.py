@@ -0,0 +1,205 @@
+"""
+Object-storage I/O (FYP_RAG/ibm_cos_storage.py) against the local S3
+stand-in (benchmarks/cos_stub.py), with per-request latency and a
+per-connection bandwidth cap standing in for a remote COS region.
+
+  - transfers: upload and download MB/s of one large object for each part
+    size x concurrency, against a single-stream baseline (concurrency 1,
+    part larger than the object);
+  - streaming: time to the first part through open_object versus the whole
+    object spooled to disk, and a PDF opened through the ranged reader versus downloaded
+    first (time to the first page's text, bytes fetched), then parsed whole
+    while spooling to disk (what rag_query_ibm.ingest_stream does) versus
+    downloaded and then parsed;
+  - listing / batch: listing a prefix of many objects page by page, and
+    downloading a batch of PDFs with 1 versus --workers threads.
+
+    python -m benchmarks.bench_cos --size-mb 64 --part-sizes 5,16 --concurrency 1,4,8 --mbps 20
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import percentiles, scratch_env, write_results
+from benchmarks.corpus import write_synthetic_pdf
+from benchmarks.cos_stub import StubConfig, start_stub, stub_env
+
+
+def _configure(part_mb: float, concurrency: int):
+    from FYP_RAG import ibm_cos_storage as cos
+
+    os.environ["COS_PART_SIZE_MB"] = str(part_mb)
+    os.environ["COS_MAX_CONCURRENCY"] = str(concurrency)
+    # Pool size follows the concurrency, so build a new client for each setting
+    cos.reset_client()
+
+
+def _transfers(args, root: str, config: StubConfig) -> dict:
+    from FYP_RAG import ibm_cos_storage as cos
+
+    src = os.path.join(root, "large.bin")
+    with open(src, "wb") as f:
+        f.write(os.urandom(int(args.size_mb * 1024 * 1024)))
+    size_mb = os.path.getsize(src) / 1024 / 1024
+    settings = [(args.size_mb * 2, 1)] + [(float(p), int(c)) for p in args.part_sizes.split(",")
+                                          for c in args.concurrency.split(",")]
+    results = {}
+    for part_mb, concurrency in settings:
+        _configure(part_mb, concurrency)
+        name = "single_stream" if part_mb > args.size_mb else f"part{part_mb:g}mb_x{concurrency}"
+        t0 = time.perf_counter()
+        cos.upload_file_to_cos(src, "bench/large.bin")
+        up = time.perf_counter() - t0
+        dst = os.path.join(root, f"{name}.bin")
+        t0 = time.perf_counter()
+        cos.download_file_from_cos("bench/large.bin", dst)
+        down = time.perf_counter() - t0
+        assert os.path.getsize(dst) == os.path.getsize(src)
+        os.remove(dst)
+        results[name] = {"upload_mb_s": round(size_mb / up, 2), "download_mb_s": round(size_mb / down, 2),
+                         "upload_s": round(up, 3), "download_s": round(down, 3)}
+        print(f"{name:>18}: upload {results[name]['upload_mb_s']} MB/s, "
+              f"download {results[name]['download_mb_s']} MB/s")
+    return results
+
+
+def _streaming(args, root: str) -> dict:
+    import PyPDF2
+    from FYP_RAG import ibm_cos_storage as cos
+    from FYP_RAG.pdf_extract import parse_stream
+
+    _configure(float(args.part_sizes.split(",")[0]), int(args.concurrency.split(",")[-1]))
+    t0 = time.perf_counter()
+    with cos.open_object("bench/large.bin", chunk_size=cos.part_size()) as parts:
+        parts.read(cos.part_size())
+        first_part = time.perf_counter() - t0
+        parts.raw.spool(os.path.join(root, "dl", "large.bin"))
+    streamed = time.perf_counter() - t0
+
+    pdf = os.path.join(root, "long.pdf")
+    write_synthetic_pdf(pdf, args.pdf_pages)
+    cos.upload_file_to_cos(pdf, "bench/long.pdf")
+
+    t0 = time.perf_counter()
+    local = cos.download_file_from_cos("bench/long.pdf", os.path.join(root, "dl", "long.pdf"))
+    with open(local, "rb") as f:
+        PyPDF2.PdfReader(f).pages[0].extract_text()
+    downloaded_first_page = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    stream = cos.open_object("bench/long.pdf", chunk_size=args.range_kb * 1024)
+    PyPDF2.PdfReader(stream).pages[0].extract_text()
+    ranged_first_page = time.perf_counter() - t0
+    fetched = stream.raw.stats()
+
+    # Whole PDF parsed (parse_stream, as ingest_stream does) after a download versus while spooling
+    t0 = time.perf_counter()
+    local = cos.download_file_from_cos("bench/long.pdf", os.path.join(root, "dl", "long-2.pdf"))
+    with open(local, "rb") as f:
+        parse_stream(f, "long.pdf")
+    parsed_after_download = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with cos.open_object("bench/long.pdf", chunk_size=args.range_kb * 1024) as spooled:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            saving = pool.submit(spooled.raw.spool, os.path.join(root, "dl", "long-3.pdf"))
+            parse_stream(spooled, "long.pdf")
+            saving.result()
+    parsed_streamed = time.perf_counter() - t0
+
+    result = {
+        "stream_first_part_ms": round(first_part * 1000, 1),
+        "stream_total_ms": round(streamed * 1000, 1),
+        "pdf_bytes": os.path.getsize(pdf),
+        "pdf_first_page_after_download_ms": round(downloaded_first_page * 1000, 1),
+        "pdf_first_page_ranged_ms": round(ranged_first_page * 1000, 1),
+        "pdf_ranged_requests": fetched["requests"],
+        "pdf_ranged_bytes": fetched["bytes_fetched"],
+        "pdf_parsed_after_download_ms": round(parsed_after_download * 1000, 1),
+        "pdf_parsed_while_streaming_ms": round(parsed_streamed * 1000, 1),
+    }
+    print(f"         streaming: first part {result['stream_first_part_ms']}ms "
+          f"(whole object {result['stream_total_ms']}ms); PDF page 1 ranged "
+          f"{result['pdf_first_page_ranged_ms']}ms / {fetched['bytes_fetched']} of {result['pdf_bytes']} bytes "
+          f"vs {result['pdf_first_page_after_download_ms']}ms after download; whole PDF parsed and saved "
+          f"{result['pdf_parsed_while_streaming_ms']}ms streamed vs {result['pdf_parsed_after_download_ms']}ms")
+    return result
+
+
+def _batch(args, root: str, config: StubConfig) -> dict:
+    from FYP_RAG import ibm_cos_storage as cos
+
+    for i in range(args.objects):
+        config.put("fyp", f"batch/listing/{i:05d}.pdf", b"%PDF-1.4 stub")
+    lists = config.counts["list"]
+    samples = []
+    for _ in range(3):
+        t0 = time.perf_counter()
+        listed = cos.list_objects("batch/listing/")
+        samples.append((time.perf_counter() - t0) * 1000)
+    assert len(listed) == args.objects
+
+    pdf = os.path.join(root, "batch.pdf")
+    write_synthetic_pdf(pdf, args.pdf_pages)
+    with open(pdf, "rb") as f:
+        data = f.read()
+    for i in range(args.batch_docs):
+        config.put("fyp", f"batch/docs/doc-{i:03d}.pdf", data)
+    docs = cos.list_objects("batch/docs/")
+    downloads = {}
+    for workers in sorted({1, args.workers}):
+        dest = os.path.join(root, f"batch-{workers}")
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            got = list(pool.map(lambda obj: cos.download_file_from_cos(
+                obj["key"], cos.local_path_for(obj["key"], "batch/docs/", dest)), docs))
+        downloads[workers] = round((time.perf_counter() - t0) * 1000, 1)
+        assert len(got) == args.batch_docs
+    result = {
+        "objects_listed": args.objects,
+        "list_pages": (config.counts["list"] - lists) // 3,
+        "list_ms": percentiles(samples),
+        "batch_download_ms": downloads,
+    }
+    print(f"    listing/batch: {args.objects} keys in {result['list_pages']} pages, p50 "
+          f"{result['list_ms']['p50']}ms; {args.batch_docs} PDFs downloaded in "
+          + ", ".join(f"{ms}ms ({w} worker{'s' if w > 1 else ''})" for w, ms in downloads.items()))
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size-mb", type=float, default=32)
+    ap.add_argument("--part-sizes", default="5,16", help="multipart part sizes in MB (COS minimum is 5)")
+    ap.add_argument("--concurrency", default="1,4,8")
+    ap.add_argument("--latency-ms", type=float, default=30.0, help="stub latency per request")
+    ap.add_argument("--mbps", type=float, default=20.0, help="stub throughput per connection, MB/s")
+    ap.add_argument("--pdf-pages", type=int, default=200)
+    ap.add_argument("--range-kb", type=int, default=64, help="ranged-read size for the PDF reader")
+    ap.add_argument("--objects", type=int, default=2500, help="keys in the listing test")
+    ap.add_argument("--batch-docs", type=int, default=16)
+    ap.add_argument("--workers", type=int, default=4, help="parallel downloads in the batch test")
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    root = scratch_env()
+    config = StubConfig(latency_ms=args.latency_ms, mbps=args.mbps)
+    server, url = start_stub(config)
+    os.environ.update(stub_env(url))
+    try:
+        work = tempfile.mkdtemp(dir=root)
+        results = {
+            "transfers": _transfers(args, work, config),
+            "streaming": _streaming(args, work),
+            "listing_batch": _batch(args, work, config),
+            "stub_requests": dict(config.counts),
+        }
+    finally:
+        server.shutdown()
+    write_results("cos", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
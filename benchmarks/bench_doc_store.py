@@ -0,0 +1,101 @@
+"""
+Many users uploading the same PDFs, with the content-addressed document
+store (FYP_RAG/doc_store.py) versus a private copy per user
+(DOC_STORE_ENABLED=0). Reports ingest time per upload, chunks stored, bytes
+on disk and retrieval latency/hit@5 for the users. Each mode runs in a
+fresh process so the store setting is read from a clean environment.
+
+    python -m benchmarks.bench_doc_store --users 20 --docs 2 --pages 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import percentiles, scratch_env, write_results
+from benchmarks.corpus import build_corpus
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in files)
+    return total
+
+
+def child(args):
+    """Runs in the measured process; prints one JSON line."""
+    root = scratch_env()
+    corpus = build_corpus(os.path.join(root, "corpus"), args.docs, args.pages)
+    from FYP_RAG import rag_query_ibm
+
+    first, repeat = [], []
+    t_all = time.perf_counter()
+    for u in range(args.users):
+        for path in corpus["files"]:
+            t0 = time.perf_counter()
+            rag_query_ibm.ingest_local_document(f"user-{u}", path)
+            (first if u == 0 else repeat).append((time.perf_counter() - t0) * 1000)
+    ingest_s = time.perf_counter() - t_all
+
+    store = rag_query_ibm._doc_store()
+    local = rag_query_ibm.get_local_store()
+    if store is not None:
+        chunks = store.stats()["chunks"]
+    else:
+        chunks = sum(len(local.open(f"user-{u}") or []) for u in range(args.users))
+
+    samples, hits, asked = [], 0, 0
+    queries = corpus["queries"][:args.queries]
+    for u in range(0, args.users, max(1, args.users // 5)):
+        for q in queries:
+            t0 = time.perf_counter()
+            top, _, _ = rag_query_ibm._retrieve(q["query"], f"user-{u}", rag_query_ibm.tokenize(q["query"]))
+            samples.append((time.perf_counter() - t0) * 1000)
+            hits += (q["source"], q["page"]) in [(d.get("source"), d.get("page")) for _, d in top]
+            asked += 1
+
+    print(json.dumps({
+        "ingest_s": round(ingest_s, 3),
+        "first_upload_ms": percentiles(first),
+        "repeat_upload_ms": percentiles(repeat),
+        "chunks_stored": chunks,
+        "local_index_bytes": _dir_bytes(local.root),
+        "vectorstore_bytes": _dir_bytes(os.environ["VECTORSTORE_PATH"]),
+        "retrieval_ms": percentiles(samples),
+        "hit_at_5": round(hits / max(asked, 1), 4),
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=10)
+    ap.add_argument("--docs", type=int, default=2)
+    ap.add_argument("--pages", type=int, default=20)
+    ap.add_argument("--queries", type=int, default=20, help="queries asked per sampled user")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cmd = [sys.executable, "-m", "benchmarks.bench_doc_store", "--child", "--users", str(args.users),
+           "--docs", str(args.docs), "--pages", str(args.pages), "--queries", str(args.queries)]
+    results = {}
+    for mode, enabled in (("per_user_copies", "0"), ("doc_store", "1")):
+        env = dict(os.environ, DOC_STORE_ENABLED=enabled)
+        out = subprocess.run(cmd, cwd=repo, env=env, capture_output=True, text=True, check=True)
+        results[mode] = json.loads([ln for ln in out.stdout.splitlines() if ln.startswith("{")][-1])
+        r = results[mode]
+        print(f"{mode:>16}: ingest {r['ingest_s']}s (first upload p50 {r['first_upload_ms']['p50']}ms, "
+              f"repeats p50 {r['repeat_upload_ms'].get('p50')}ms), {r['chunks_stored']} chunks, "
+              f"{r['vectorstore_bytes']} bytes, retrieval p50 {r['retrieval_ms']['p50']}ms, hit@5 {r['hit_at_5']}")
+    write_results("doc_store", {k: v for k, v in vars(args).items() if k != "child"}, results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Embedding throughput and cache effectiveness (FYP_RAG/embeddings.py).
+
+Embeds the chunks of the synthetic corpus with the cache off at each batch
+size (embeddings/s), then replays an ingest workload through the cached
+embedding function: first upload, the same documents uploaded again by a
+second user, a fresh process re-opening the on-disk cache, and the query
+set asked `--repeat` times. Reports the hit rate of each phase.
+
+    python -m benchmarks.bench_embeddings --backend onnx --onnx-path ./all-mpnet-onnx
+    python -m benchmarks.bench_embeddings --backend stub        # no model needed
+
+The stub backend costs a fixed time per batch plus per text and returns
+deterministic vectors, so batching and caching can be measured offline.
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import scratch_env, stage_summary, write_results
+from benchmarks.corpus import build_corpus
+
+
+class StubBackend:
+    def __init__(self, dim: int = 384, per_batch_ms: float = 20.0, per_text_ms: float = 2.0):
+        self.dim = dim
+        self.per_batch_ms = per_batch_ms
+        self.per_text_ms = per_text_ms
+        self.identity = f"stub:{dim}"
+
+    def embed(self, texts, batch_size):
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            time.sleep((self.per_batch_ms + self.per_text_ms * len(batch)) / 1000)
+            for i, text in enumerate(batch):
+                seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+                vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+                out[start + i] = vec / np.linalg.norm(vec)
+        return out
+
+
+def _backend(args):
+    from FYP_RAG import embeddings
+
+    if args.backend == "stub":
+        return StubBackend()
+    if args.backend == "onnx":
+        return embeddings.OnnxBackend(args.model, file_name=args.onnx_file, model_dir=args.onnx_path,
+                                      threads=args.threads)
+    return embeddings.SentenceTransformerBackend(args.model, threads=args.threads)
+
+
+def _phase(fn, texts, batch: int) -> dict:
+    hits, misses, embedded = fn.hits, fn.misses, fn.embedded
+    t0 = time.perf_counter()
+    for start in range(0, len(texts), batch):
+        fn(texts[start:start + batch])
+    wall = time.perf_counter() - t0
+    lookups = (fn.hits - hits) + (fn.misses - misses)
+    return {
+        "texts": len(texts),
+        "hit_rate": round((fn.hits - hits) / lookups, 3) if lookups else 0.0,
+        "embedded": fn.embedded - embedded,
+        "wall_ms": round(wall * 1000, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backend", choices=["sentence-transformers", "onnx", "stub"], default="stub")
+    ap.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    ap.add_argument("--onnx-path", help="directory with tokenizer.json and the ONNX file")
+    ap.add_argument("--onnx-file", default="onnx/model.onnx", help="e.g. onnx/model_qint8_avx512.onnx")
+    ap.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = runtime default)")
+    ap.add_argument("--batch-sizes", default="1,8,32,64")
+    ap.add_argument("--docs", type=int, default=2)
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=3, help="passes over the query set")
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    root = scratch_env()
+    from FYP_RAG.embeddings import CachedEmbeddingFunction, EmbeddingCache
+    from FYP_RAG.pdf_extract import extract_chunks
+
+    corpus = build_corpus(tempfile.mkdtemp(dir=root), docs=args.docs, pages=args.pages)
+    chunks = [c["text"] for path in corpus["files"] for c in extract_chunks(path)]
+    queries = [q["query"] for q in corpus["queries"]]
+    backend = _backend(args)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    throughput = {}
+    for bs in batch_sizes:
+        fn = CachedEmbeddingFunction(backend, cache=None, batch_size=bs)
+        fn(chunks[:bs])  # warm the session / first-batch allocations
+        t0 = time.perf_counter()
+        fn(chunks)
+        throughput[bs] = round(len(chunks) / (time.perf_counter() - t0), 1)
+        print(f"batch {bs:>3}: {throughput[bs]} embeddings/s over {len(chunks)} chunks")
+
+    bs = max(batch_sizes)
+    cache_path = os.path.join(root, "embedding_cache.sqlite3")
+    fn = CachedEmbeddingFunction(backend, EmbeddingCache(backend.identity, path=cache_path), batch_size=bs)
+    phases = {
+        "first_upload": _phase(fn, chunks, bs),
+        "same_docs_other_user": _phase(fn, chunks, bs),
+    }
+    # New process: empty memory tier, vectors come back from SQLite
+    fn = CachedEmbeddingFunction(backend, EmbeddingCache(backend.identity, path=cache_path), batch_size=bs)
+    phases["reopened_cache"] = _phase(fn, chunks, bs)
+    phases["queries"] = _phase(fn, queries * args.repeat, 1)
+
+    results = {
+        "backend": backend.identity,
+        "chunks": len(chunks),
+        "embeddings_per_s": throughput,
+        "cache_phases": phases,
+        "cache": fn.stats(),
+        "stages": stage_summary(),
+    }
+    for name, p in phases.items():
+        print(f"{name:>22}: {p['texts']} texts, hit rate {p['hit_rate']:.0%}, "
+              f"embedded {p['embedded']}, {p['wall_ms']}ms")
+    write_results("embeddings", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
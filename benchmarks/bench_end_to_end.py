@@ -0,0 +1,86 @@
+"""
+End-to-end run_rag_query (or stream_rag_query) latency against the local
+Watsonx stand-in: p50/p95/p99 per query, stage breakdown, fallback counts.
+
+    python -m benchmarks.bench_end_to_end --latency-ms 400 --error-rate 0.05 --concurrency 4
+    python -m benchmarks.bench_end_to_end --stream        # time-to-first-token as well
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import percentiles, scratch_env, stage_summary, write_results
+from benchmarks.corpus import build_corpus
+from benchmarks.watsonx_stub import StubConfig, start_stub, stub_env
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=2)
+    ap.add_argument("--pages", type=int, default=20)
+    ap.add_argument("--queries", type=int, default=100, help="total queries to send")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--latency-ms", type=float, default=300.0, help="stub Granite latency")
+    ap.add_argument("--jitter-ms", type=float, default=100.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub calls answered 503")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered 429")
+    ap.add_argument("--stream", action="store_true", help="use stream_rag_query and record first-token time")
+    ap.add_argument("--answer-cache", choices=["off", "memory", "sqlite"], default="off")
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    stub, base_url = start_stub(StubConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                                           args.rate_limit_rate, seed=1))
+    root = scratch_env(ANSWER_CACHE_BACKEND=args.answer_cache, WATSONX_BACKOFF_BASE_S=0.1, **stub_env(base_url))
+    corpus = build_corpus(os.path.join(root, "corpus"), args.docs, args.pages)
+    from FYP_RAG import rag_query_ibm
+    from FYP_RAG.metrics import ANSWER_FALLBACK_TOTAL, RETRIEVAL_TOTAL
+
+    for path in corpus["files"]:
+        rag_query_ibm.ingest_local_document("bench-user", path)
+    queries = [corpus["queries"][i % len(corpus["queries"])] for i in range(args.queries)]
+
+    def one(q):
+        t0 = time.perf_counter()
+        first_token = None
+        if args.stream:
+            answer = ""
+            for event, data in rag_query_ibm.stream_rag_query(q["query"], "bench-user"):
+                if event == "token" and first_token is None:
+                    first_token = (time.perf_counter() - t0) * 1000
+                elif event == "final":
+                    answer = data["answer"]
+        else:
+            answer = rag_query_ibm.run_rag_query(q["query"], "bench-user")["answer"]
+        return (time.perf_counter() - t0) * 1000, first_token, q["fact"] in answer
+
+    t_all = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        rows = list(pool.map(one, queries))
+    elapsed = time.perf_counter() - t_all
+    stub.shutdown()
+
+    latencies = [r[0] for r in rows]
+    results = {
+        "queries": len(rows),
+        "seconds": round(elapsed, 3),
+        "throughput_qps": round(len(rows) / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+        "first_token_ms": percentiles([r[1] for r in rows if r[1] is not None]) if args.stream else None,
+        "answers_with_fact": sum(1 for r in rows if r[2]),
+        "retrieval": {m: RETRIEVAL_TOTAL.value(m) for m in ("vector", "fallback-token")},
+        "answer_fallbacks": {r: ANSWER_FALLBACK_TOTAL.value(r) for r in ("granite_error", "insufficient", "ungrounded")},
+        "stub": dict(stub.config.counts),
+        "watsonx_client": rag_query_ibm.get_watsonx_client().stats(),
+        "stages": stage_summary(),
+    }
+    lat = results["latency_ms"]
+    print(f"{len(rows)} queries @ concurrency {args.concurrency}: p50 {lat['p50']}ms p95 {lat['p95']}ms "
+          f"p99 {lat['p99']}ms, {results['throughput_qps']} q/s, "
+          f"{results['answers_with_fact']} answers quote the expected fact")
+    write_results("end_to_end", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
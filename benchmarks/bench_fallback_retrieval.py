@@ -0,0 +1,79 @@
+"""
+Fallback retrieval latency: linear token-overlap scan vs the BM25 inverted index.
+
+    python -m benchmarks.bench_fallback_retrieval --sizes 1000 10000 50000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from FYP_RAG.bm25_index import BM25Index
+from FYP_RAG.rag_query_ibm import STOPWORDS, terms, tokenize
+
+
+def synthetic_chunks(n: int, vocab_size: int = 20000, words_per_chunk: int = 60, seed: int = 7):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    # Zipf-ish weights so a few terms are common and most are rare, like real text
+    weights = [1.0 / (i + 1) for i in range(vocab_size)]
+    stop = sorted(STOPWORDS)
+    chunks = []
+    for _ in range(n):
+        words = rng.choices(vocab, weights=weights, k=words_per_chunk)
+        words += rng.choices(stop, k=words_per_chunk // 3)
+        rng.shuffle(words)
+        text = " ".join(words) + "."
+        chunks.append({"text": text, "tokens": tokenize(text)})
+    return chunks, vocab
+
+
+def linear_scan(docs, q_tokens):
+    # The pre-index fallback: score every chunk by set overlap
+    scored = []
+    for d in docs:
+        score = len(q_tokens & d["tokens"]) / max(len(q_tokens), 1)
+        if score > 0.1:
+            scored.append((score, d))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored[:5]
+
+
+def bm25_search(index, docs, q_tokens):
+    q_terms = (q_tokens - STOPWORDS) or q_tokens
+    return [(s, docs[i]) for s, i in index.search(q_terms, k=5)]
+
+
+def _time_ms(fn, queries):
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000])
+    ap.add_argument("--queries", type=int, default=50)
+    args = ap.parse_args()
+
+    rng = random.Random(11)
+    print(f"{'chunks':>8} {'build_s':>8} {'scan p50':>9} {'scan max':>9} {'bm25 p50':>9} {'bm25 max':>9}")
+    for n in args.sizes:
+        docs, vocab = synthetic_chunks(n)
+        t0 = time.perf_counter()
+        index = BM25Index()
+        for d in docs:
+            index.add(terms(d["text"]))
+        build_s = time.perf_counter() - t0
+
+        queries = [tokenize("what is the " + " ".join(rng.choices(vocab[:5000], k=4))) for _ in range(args.queries)]
+        scan_p50, scan_max = _time_ms(lambda q: linear_scan(docs, q), queries)
+        bm_p50, bm_max = _time_ms(lambda q: bm25_search(index, docs, q), queries)
+        print(f"{n:>8} {build_s:>8.2f} {scan_p50:>8.2f}ms {scan_max:>8.2f}ms {bm_p50:>8.2f}ms {bm_max:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Ingest throughput: PDF -> chunks -> local index (+ Chroma when an embedding
+model is available), then the cost of re-ingesting an unchanged file.
+
+    python -m benchmarks.bench_ingest --docs 3 --pages 40 --out results.json
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import percentiles, scratch_env, stage_summary, write_results
+from benchmarks.corpus import build_corpus
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=3)
+    ap.add_argument("--pages", type=int, default=30)
+    ap.add_argument("--extract-workers", type=int, default=1)
+    ap.add_argument("--local-index", choices=["mmap", "memory"], default="mmap")
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    root = scratch_env(INGEST_EXTRACT_WORKERS=args.extract_workers, LOCAL_INDEX_BACKEND=args.local_index)
+    corpus = build_corpus(os.path.join(root, "corpus"), args.docs, args.pages)
+    from FYP_RAG import rag_query_ibm
+
+    pages_seen = {}
+
+    def progress(stage, done, total):
+        if stage == "pages":
+            pages_seen[stage] = total
+
+    first, again = [], []
+    total_pages = 0
+    t_all = time.perf_counter()
+    for path in corpus["files"]:
+        t0 = time.perf_counter()
+        rag_query_ibm.ingest_local_document("bench-user", path, progress=progress)
+        first.append((time.perf_counter() - t0) * 1000)
+        total_pages += pages_seen.get("pages", 0)
+    elapsed = time.perf_counter() - t_all
+
+    for path in corpus["files"]:
+        t0 = time.perf_counter()
+        rag_query_ibm.ingest_local_document("bench-user", path)
+        again.append((time.perf_counter() - t0) * 1000)
+
+    store = rag_query_ibm._doc_store()
+    if store is not None:
+        chunks = store.stats()["chunks"]
+    elif args.local_index == "mmap":
+        chunks = len(rag_query_ibm.get_local_store().open("bench-user") or [])
+    else:
+        chunks = len(rag_query_ibm.LOCAL_INDEX.get("bench-user", []))
+    results = {
+        "pages": total_pages,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(total_pages / elapsed, 2),
+        "chunks_per_s": round(chunks / elapsed, 2),
+        "ingest_ms_per_doc": percentiles(first),
+        "reingest_unchanged_ms_per_doc": percentiles(again),
+        "stages": stage_summary(),
+    }
+    print(f"{total_pages} pages, {chunks} chunks in {elapsed:.2f}s "
+          f"({results['pages_per_s']} pages/s); unchanged re-ingest p50 "
+          f"{results['reingest_unchanged_ms_per_doc']['p50']}ms")
+    write_results("ingest", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Fallback index footprint per worker and cold-start time: the per-process
+dict layout (LOCAL_INDEX lists + BM25Index) vs the shared mmap segments.
+
+Each layout is loaded in a fresh spawned process, the way a gunicorn worker
+would load it. "private" is RssAnon (memory the worker owns), "shared" is
+RssFile (mapped pages the kernel shares between workers).
+
+    python -m benchmarks.bench_local_index_memory --sizes 5000 20000 50000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_fallback_retrieval import synthetic_chunks
+from FYP_RAG.bm25_index import BM25Index
+from FYP_RAG.mmap_index import LocalIndexStore
+from FYP_RAG.text_utils import STOPWORDS, terms, tokenize
+
+
+def _rss_kb() -> dict:
+    out = {"RssAnon": 0, "RssFile": 0}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key = line.split(":")[0]
+                if key in out:
+                    out[key] = int(line.split()[1])
+    except OSError:
+        pass
+    return out
+
+
+def _queries(n: int):
+    rng = random.Random(11)
+    vocab = [f"w{i}" for i in range(5000)]
+    return [tokenize("what is the " + " ".join(rng.choices(vocab, k=4))) for _ in range(n)]
+
+
+def _load_dict(texts, n_queries: int) -> dict:
+    before = _rss_kb()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    # What a worker does today: rebuild the chunk dicts and postings in its own heap
+    docs = [{"source": "bench.pdf", "page": i // 4 + 1, "chunk": i % 4 + 1, "text": t, "tokens": tokenize(t)}
+            for i, t in enumerate(texts)]
+    index = BM25Index()
+    for d in docs:
+        index.add(terms(d["text"]))
+    for q in _queries(n_queries):
+        for _, i in index.search((q - STOPWORDS) or q, k=5):
+            docs[i]["text"]
+    cold_s = time.perf_counter() - t0
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    after = _rss_kb()
+    return {"cold_s": cold_s, "heap_mb": heap / 2**20,
+            "private_mb": (after["RssAnon"] - before["RssAnon"]) / 1024,
+            "shared_mb": (after["RssFile"] - before["RssFile"]) / 1024}
+
+
+def _load_mmap(root, n_queries: int) -> dict:
+    before = _rss_kb()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    store = LocalIndexStore(root)
+    seg = store.open("bench")
+    for q in _queries(n_queries):
+        q_ids = store.query_ids((q - STOPWORDS) or q)
+        for _, i in seg.bm25_search(q_ids, k=5):
+            seg.chunk(i)
+    cold_s = time.perf_counter() - t0
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    after = _rss_kb()
+    return {"cold_s": cold_s, "heap_mb": heap / 2**20,
+            "private_mb": (after["RssAnon"] - before["RssAnon"]) / 1024,
+            "shared_mb": (after["RssFile"] - before["RssFile"]) / 1024}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 50000])
+    ap.add_argument("--queries", type=int, default=20)
+    args = ap.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'chunks':>8} {'layout':>6} {'cold_s':>7} {'heap MB':>8} {'private MB':>11} {'shared MB':>10} {'file MB':>8}")
+    with ctx.Pool(1, maxtasksperchild=1) as pool, tempfile.TemporaryDirectory() as root:
+        for n in args.sizes:
+            texts = [d["text"] for d in synthetic_chunks(n)[0]]
+            store = LocalIndexStore(os.path.join(root, str(n)))
+            store.write("bench", [{"source": "bench.pdf", "page": i // 4 + 1, "chunk": i % 4 + 1, "text": t}
+                                  for i, t in enumerate(texts)])
+            file_mb = os.path.getsize(store.path("bench")) / 2**20
+
+            rows = [("dict", pool.apply(_load_dict, (texts, args.queries))),
+                    ("mmap", pool.apply(_load_mmap, (store.root, args.queries)))]
+            for layout, r in rows:
+                print(f"{n:>8} {layout:>6} {r['cold_s']:>7.2f} {r['heap_mb']:>8.1f} {r['private_mb']:>11.1f} "
+                      f"{r['shared_mb']:>10.1f} {file_mb if layout == 'mmap' else 0:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
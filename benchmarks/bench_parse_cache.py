@@ -0,0 +1,74 @@
+"""
+Parse cache (FYP_RAG/parse_cache.py): PDF extraction + chunking on a cache
+miss versus chunking from cached page text, and re-chunking the corpus at
+several chunk sizes (CHUNK_SENTENCES) without touching the PDFs. Reports
+ms per document and the cache's size on disk next to the PDFs'.
+
+    python -m benchmarks.bench_parse_cache --docs 3 --pages 40 --sizes 2,4,6,8
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import percentiles, scratch_env, write_results
+from benchmarks.corpus import build_corpus
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in files)
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=3)
+    ap.add_argument("--pages", type=int, default=30)
+    ap.add_argument("--sizes", default="2,4,6,8", help="sentences per chunk to re-chunk at")
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    root = scratch_env()
+    corpus = build_corpus(os.path.join(root, "corpus"), args.docs, args.pages)
+    from FYP_RAG import pdf_extract
+    from FYP_RAG.ingest_manifest import file_sha256
+    from FYP_RAG.parse_cache import get_parse_cache
+
+    cache = get_parse_cache()
+    hashes = {path: file_sha256(path) for path in corpus["files"]}
+
+    def run(path):
+        t0 = time.perf_counter()
+        chunks = pdf_extract.extract_chunks(path, file_hash=hashes[path])
+        return (time.perf_counter() - t0) * 1000, len(chunks)
+
+    miss = [run(path)[0] for path in corpus["files"]]
+    hit = [run(path)[0] for path in corpus["files"]]
+
+    rechunk = {}
+    default = pdf_extract.SENTENCES_PER_CHUNK
+    for size in [int(x) for x in args.sizes.split(",")]:
+        pdf_extract.SENTENCES_PER_CHUNK = size
+        runs = [run(path) for path in corpus["files"]]
+        rechunk[size] = {"ms_per_doc": percentiles([ms for ms, _ in runs]), "chunks": sum(n for _, n in runs)}
+    pdf_extract.SENTENCES_PER_CHUNK = default
+
+    results = {
+        "parse_ms_per_doc": percentiles(miss),
+        "cached_ms_per_doc": percentiles(hit),
+        "rechunk": rechunk,
+        "cache_bytes": _dir_bytes(cache.root),
+        "pdf_bytes": sum(os.path.getsize(p) for p in corpus["files"]),
+        "cache": cache.stats(),
+    }
+    print(f"parse + chunk {results['parse_ms_per_doc']['mean']}ms/doc, from cache "
+          f"{results['cached_ms_per_doc']['mean']}ms/doc; cache {results['cache_bytes']} bytes "
+          f"for {results['pdf_bytes']} bytes of PDF")
+    for size, r in rechunk.items():
+        print(f"  {size} sentences/chunk: {r['chunks']} chunks, {r['ms_per_doc']['mean']}ms/doc")
+    write_results("parse_cache", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+PDF extraction + chunking throughput (pages/second) for 1, 2, 4 and N workers.
+
+    python -m benchmarks.bench_pdf_extract --pdf path/to/report.pdf
+    python -m benchmarks.bench_pdf_extract --pages 300      # synthetic PDF (needs reportlab)
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import write_synthetic_pdf
+
+# Every run must parse the PDF; bench_parse_cache measures the cached path
+os.environ["PARSE_CACHE_ENABLED"] = "0"
+from FYP_RAG.pdf_extract import extract_chunks  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pdf", help="PDF to extract (default: generate a synthetic one)")
+    ap.add_argument("--pages", type=int, default=200, help="pages in the synthetic PDF")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = ap.parse_args()
+
+    path = args.pdf
+    tmpdir = None
+    if not path:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, "synthetic.pdf")
+        write_synthetic_pdf(path, args.pages)
+
+    baseline = None
+    print(f"{'workers':>7} {'seconds':>8} {'pages/s':>8} {'chunks':>7} {'same ids':>8}")
+    for workers in sorted(set(args.workers)):
+        pages = []
+        t0 = time.perf_counter()
+        chunks = extract_chunks(path, workers=workers, progress=lambda stage, done, total: pages.append(total))
+        elapsed = time.perf_counter() - t0
+        ids = [(c["page"], c["chunk"], c["text"]) for c in chunks]
+        if baseline is None:
+            baseline = ids
+        total = pages[-1] if pages else 0
+        print(f"{workers:>7} {elapsed:>8.2f} {total / elapsed:>8.1f} {len(chunks):>7} {str(ids == baseline):>8}")
+
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Bulk evaluation through the LangChain answer runnable: a loop of .invoke()
+versus .batch() and .abatch() over the same questions, against the local
+Watsonx stand-in.
+
+    python -m benchmarks.bench_pipeline --questions 200 --latency-ms 800 --max-concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.common import scratch_env, stage_summary, write_results
+from benchmarks.corpus import build_corpus
+from benchmarks.watsonx_stub import StubConfig, start_stub, stub_env
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--questions", type=int, default=100)
+    ap.add_argument("--pages", type=int, default=40)
+    ap.add_argument("--latency-ms", type=float, default=500.0, help="stub Granite latency")
+    ap.add_argument("--max-concurrency", type=int, default=16)
+    ap.add_argument("--modes", default="loop,batch,abatch")
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    stub, base_url = start_stub(StubConfig(args.latency_ms, jitter_ms=args.latency_ms * 0.2, seed=1))
+    # Answer cache stays off (scratch_env) so every mode pays for every question
+    root = scratch_env(**stub_env(base_url))
+    corpus = build_corpus(os.path.join(root, "corpus"), 1, args.pages)
+    from FYP_RAG import rag_query_ibm
+    from FYP_RAG.rag_pipeline_langchain import build_pipeline
+
+    rag_query_ibm.ingest_local_document("bench-user", corpus["files"][0])
+    runnable = build_pipeline("bench-user", max_concurrency=args.max_concurrency)["answer"]
+    inputs = [{"question": corpus["queries"][i % len(corpus["queries"])]["query"]} for i in range(args.questions)]
+
+    runs = {
+        "loop": lambda: [runnable.invoke(x) for x in inputs],
+        "batch": lambda: runnable.batch(inputs),
+        "abatch": lambda: asyncio.run(runnable.abatch(inputs)),
+    }
+    results = {}
+    answers = {}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        t0 = time.perf_counter()
+        out = runs[mode]()
+        elapsed = time.perf_counter() - t0
+        answers[mode] = [r["answer"] for r in out]
+        results[mode] = {"seconds": round(elapsed, 3), "questions_per_s": round(len(out) / elapsed, 2)}
+        print(f"{mode:>7}: {elapsed:.2f}s ({results[mode]['questions_per_s']} questions/s)")
+
+    base = next(iter(answers.values()))
+    results["answers_match"] = all(a == base for a in answers.values())
+    if "loop" in results:
+        for mode in ("batch", "abatch"):
+            if mode in results:
+                results[mode]["speedup_vs_loop"] = round(results["loop"]["seconds"] / results[mode]["seconds"], 2)
+    results["stub"] = dict(stub.config.counts)
+    results["stages"] = stage_summary()
+    stub.shutdown()
+    write_results("pipeline", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
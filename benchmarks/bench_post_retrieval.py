@@ -0,0 +1,95 @@
+"""
+Post-retrieval CPU per query: grounding gate + extractive fallback, re-tokenizing
+the context and every sentence (old path) vs the sentence spans and term sets
+stored at ingest.
+
+    python -m benchmarks.bench_post_retrieval --queries 2000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from FYP_RAG.pdf_extract import chunk_page
+from FYP_RAG.rag_query_ibm import _context_terms, extractive_fallback, grounding_gate
+from FYP_RAG.text_utils import STOPWORDS, split_sentences, tokenize
+
+
+def legacy_grounding_gate(answer, context, query):
+    a_tokens = tokenize(answer) - STOPWORDS
+    allowed = tokenize(context) | tokenize(query)
+    if not a_tokens:
+        return True
+    return len(a_tokens - allowed) / max(len(a_tokens), 1) <= 0.30
+
+
+def legacy_extractive_fallback(top, q_tokens):
+    sentences = []
+    for _, d in top:
+        if d.get("text"):
+            sentences.extend(split_sentences(d["text"]))
+    if not sentences:
+        return top[0][1].get("text", "").strip()
+    scored = []
+    for s in sentences:
+        overlap = len(tokenize(s) & q_tokens)
+        if overlap > 0:
+            scored.append((overlap, s))
+    if not scored:
+        return sentences[0].strip()
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return " ".join(s for _, s in scored[:5]).strip()
+
+
+def synthetic_top(rng, k: int = 5):
+    words = ["malaria", "coverage", "vector", "control", "mortality", "report", "health", "nets", "the",
+             "spraying", "increase", "decrease", "region", "children", "vaccination", "policy", "of", "in"]
+    words += [f"w{i}" for i in range(400)]
+    top = []
+    for i in range(k):
+        page = ". ".join(" ".join(rng.choices(words, k=rng.randint(20, 40))).capitalize() for _ in range(8)) + "."
+        top.extend((0.8, c) for c in chunk_page(page, "bench.pdf", i + 1))
+    return top[:k]
+
+
+def _time_us(fn, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples), statistics.mean(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--queries", type=int, default=2000)
+    args = ap.parse_args()
+
+    rng = random.Random(5)
+    top = synthetic_top(rng)
+    context = " ".join(d["text"] for _, d in top)[:6000]
+    query = "what happened to malaria vector control coverage in the region"
+    q_tokens = tokenize(query)
+    answer = top[0][1]["text"].split(".")[0] + "."
+
+    def legacy():
+        legacy_grounding_gate(answer, context, query)
+        legacy_extractive_fallback(top, q_tokens)
+
+    def precomputed():
+        grounding_gate(answer, context, query, _context_terms(top))
+        extractive_fallback(top, q_tokens)
+
+    assert legacy_extractive_fallback(top, q_tokens) == extractive_fallback(top, q_tokens)
+    assert tokenize(context) == _context_terms(top)
+
+    print(f"context chars: {len(context)}, sentences: {sum(len(d['sentences']) for _, d in top)}")
+    print(f"{'path':>12} {'p50 us':>9} {'mean us':>9}")
+    for name, fn in (("re-tokenize", legacy), ("precomputed", precomputed)):
+        p50, mean = _time_us(fn, args.queries)
+        print(f"{name:>12} {p50:>9.1f} {mean:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Retrieval latency and accuracy over a synthetic corpus: every query targets
+one page's fact, so hit@1 / hit@5 are measured alongside p50/p95/p99.
+
+    python -m benchmarks.bench_retrieval --docs 5 --pages 40 --repeat 3
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import percentiles, scratch_env, stage_summary, write_results
+from benchmarks.corpus import build_corpus
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=3)
+    ap.add_argument("--pages", type=int, default=30)
+    ap.add_argument("--repeat", type=int, default=3, help="passes over the query set")
+    ap.add_argument("--local-index", choices=["mmap", "memory"], default="mmap")
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    root = scratch_env(LOCAL_INDEX_BACKEND=args.local_index)
+    corpus = build_corpus(os.path.join(root, "corpus"), args.docs, args.pages)
+    from FYP_RAG import rag_query_ibm
+
+    for path in corpus["files"]:
+        rag_query_ibm.ingest_local_document("bench-user", path)
+
+    samples, methods = [], {}
+    hit1 = hit5 = 0
+    for rep in range(args.repeat):
+        for q in corpus["queries"]:
+            q_tokens = rag_query_ibm.tokenize(q["query"])
+            t0 = time.perf_counter()
+            top, _, method = rag_query_ibm._retrieve(q["query"], "bench-user", q_tokens)
+            samples.append((time.perf_counter() - t0) * 1000)
+            methods[method] = methods.get(method, 0) + 1
+            if rep == 0:
+                keys = [(d.get("source"), d.get("page")) for _, d in top]
+                hit1 += keys[:1] == [(q["source"], q["page"])]
+                hit5 += (q["source"], q["page"]) in keys
+
+    n = len(corpus["queries"])
+    results = {
+        "queries": n,
+        "retrieval_ms": percentiles(samples),
+        "methods": methods,
+        "hit_at_1": round(hit1 / n, 4),
+        "hit_at_5": round(hit5 / n, 4),
+        "stages": stage_summary(),
+    }
+    lat = results["retrieval_ms"]
+    print(f"{n} queries x {args.repeat}: p50 {lat['p50']}ms p95 {lat['p95']}ms p99 {lat['p99']}ms, "
+          f"hit@1 {results['hit_at_1']}, hit@5 {results['hit_at_5']}, methods {methods}")
+    write_results("retrieval", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
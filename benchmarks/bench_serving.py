@@ -0,0 +1,138 @@
+"""
+Throughput of /query_rag under concurrent load, served by real gunicorn
+processes against the local Watsonx stand-in. Compares the old setup (sync
+workers) with the threaded gunicorn.conf.py and its Granite admission limit.
+
+    python -m benchmarks.bench_serving --latency-ms 1000 --clients 32 --requests 200
+    python -m benchmarks.bench_serving --modes gthread --max-inflight 4 --max-queue 4
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import percentiles, scratch_env, write_results
+from benchmarks.corpus import build_corpus
+from benchmarks.watsonx_stub import StubConfig, start_stub, stub_env
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc, timeout_s: float = 60.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"{url}/metrics", timeout=2).read()
+            return
+        except Exception:
+            time.sleep(0.3)
+    raise RuntimeError("gunicorn did not become ready")
+
+
+def _post(url: str, body: dict):
+    req = urllib.request.Request(f"{url}/query_rag", data=json.dumps(body).encode(),
+                                 headers={"Content-Type": "application/json"})
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as res:
+            res.read()
+            status, retry_after = res.status, None
+    except urllib.error.HTTPError as e:
+        status, retry_after = e.code, e.headers.get("Retry-After")
+    except Exception:
+        status, retry_after = 0, None
+    return status, (time.perf_counter() - t0) * 1000, retry_after
+
+
+def run_mode(mode: str, args, env: dict, queries: list) -> dict:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, "-m", "gunicorn", "-c", os.path.join(REPO_ROOT, "gunicorn.conf.py"),
+           "--bind", f"127.0.0.1:{port}", "--access-logfile", "/dev/null", "app:app"]
+    mode_env = dict(env, WEB_CONCURRENCY=str(args.workers), GUNICORN_WORKER_CLASS=mode,
+                    GUNICORN_THREADS=str(args.threads if mode == "gthread" else 1),
+                    LLM_MAX_INFLIGHT=str(args.max_inflight if mode == "gthread" else 0),
+                    LLM_MAX_QUEUE=str(args.max_queue), LLM_QUEUE_TIMEOUT_S=str(args.queue_timeout_s))
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=mode_env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(url, proc)
+        bodies = [{"query": queries[i % len(queries)]["query"], "user_id": "bench-user"}
+                  for i in range(args.requests)]
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            rows = list(pool.map(lambda b: _post(url, b), bodies))
+        elapsed = time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    ok = [ms for status, ms, _ in rows if status == 200]
+    rejected = [ms for status, ms, _ in rows if status == 503]
+    statuses = {}
+    for status, _, _ in rows:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "seconds": round(elapsed, 3),
+        "throughput_ok_per_s": round(len(ok) / elapsed, 2),
+        "statuses": statuses,
+        "ok_latency_ms": percentiles(ok),
+        "rejected_latency_ms": percentiles(rejected),
+        "retry_after_s": sorted({r for s, _, r in rows if s == 503 and r}),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modes", default="sync,gthread", help="comma-separated gunicorn worker classes")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=16, help="threads per gthread worker")
+    ap.add_argument("--max-inflight", type=int, default=8, help="LLM_MAX_INFLIGHT for gthread")
+    ap.add_argument("--max-queue", type=int, default=16)
+    ap.add_argument("--queue-timeout-s", type=float, default=10.0)
+    ap.add_argument("--clients", type=int, default=32, help="concurrent HTTP clients")
+    ap.add_argument("--requests", type=int, default=160)
+    ap.add_argument("--latency-ms", type=float, default=1000.0, help="stub Granite latency")
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    stub, base_url = start_stub(StubConfig(args.latency_ms, jitter_ms=args.latency_ms * 0.1, seed=1))
+    root = scratch_env(**stub_env(base_url))
+    # Keep the app's query/perf logs out of the repo's database.db
+    os.environ["DATABASE_PATH"] = os.path.join(root, "database.db")
+    corpus = build_corpus(os.path.join(root, "corpus"), 1, args.pages)
+    from FYP_RAG import rag_query_ibm
+
+    # Ingest once up front; the gunicorn workers read the same on-disk index
+    rag_query_ibm.ingest_local_document("bench-user", corpus["files"][0])
+    env = dict(os.environ)
+
+    results = {}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        results[mode] = res = run_mode(mode, args, env, corpus["queries"])
+        lat = res["ok_latency_ms"]
+        print(f"{mode:>8}: {res['throughput_ok_per_s']} ok/s, statuses {res['statuses']}, "
+              f"ok p50 {lat.get('p50')}ms p95 {lat.get('p95')}ms, "
+              f"503 p50 {res['rejected_latency_ms'].get('p50')}ms")
+    results["stub"] = dict(stub.config.counts)
+    stub.shutdown()
+    write_results("serving", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+WHO questions answered from the shared FAISS corpus tier (no per-user
+ingestion) versus giving every user their own copy of the same chunks in
+the local index. Reports the one-off load cost per process, the per-user
+copy cost it replaces, and retrieval latency for users with no documents.
+
+    python -m benchmarks.bench_shared_corpus --users 20 --repeat 3
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import percentiles, scratch_env, stage_summary, write_results
+
+# (question, text the packed context should contain)
+WHO_QUESTIONS = [
+    ("What was global life expectancy at birth in 2019?", "73.0 years"),
+    ("Which region has the highest maternal mortality ratio?", "African Region"),
+    ("What share of the global population used safely managed drinking-water services in 2020?", "74%"),
+    ("How did healthy life expectancy change between 2000 and 2019?", "healthy life expectancy"),
+    ("How many deaths were attributed to the COVID-19 pandemic in 2020 and 2021?", "excess"),
+    ("What is the prevalence of tobacco use among adults?", "tobacco"),
+    ("How has the under-five mortality rate changed since 2000?", "under-five mortality"),
+    ("What proportion of deaths are caused by noncommunicable diseases?", "noncommunicable"),
+]
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in files)
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=3, help="passes over the question set per user")
+    ap.add_argument("--out", help="JSON result path (default benchmarks/results/)")
+    args = ap.parse_args()
+
+    scratch_env(SHARED_INDEX_ENABLED=1)
+    from FYP_RAG import rag_query_ibm
+    from FYP_RAG.mmap_index import get_local_store
+    from FYP_RAG.shared_corpus import get_shared_corpus
+
+    t0 = time.perf_counter()
+    corpus = get_shared_corpus()
+    load_ms = (time.perf_counter() - t0) * 1000
+    if corpus is None:
+        raise SystemExit("shared corpus did not load")
+    store = get_local_store()
+    segments_dir = os.path.join(store.root, "segments")
+    shared_bytes = _dir_bytes(segments_dir)
+
+    # What the shared tier saves: each user holding their own copy of the WHO chunks
+    chunks = [c for c in corpus.segment.iter_chunks() if c["text"]]
+    copy_ms = []
+    for u in range(args.users):
+        t0 = time.perf_counter()
+        store.write(f"copy-user-{u}", chunks)
+        copy_ms.append((time.perf_counter() - t0) * 1000)
+    per_user_bytes = (_dir_bytes(segments_dir) - shared_bytes) / max(args.users, 1)
+
+    samples, methods, found = [], {}, 0
+    for rep in range(args.repeat):
+        for u in range(args.users):
+            for question, expected in WHO_QUESTIONS:
+                q_tokens = rag_query_ibm.tokenize(question)
+                t0 = time.perf_counter()
+                top, context, method = rag_query_ibm._retrieve(question, f"new-user-{u}", q_tokens)
+                samples.append((time.perf_counter() - t0) * 1000)
+                methods[method] = methods.get(method, 0) + 1
+                if rep == 0 and u == 0:
+                    found += expected.lower() in context.text.lower()
+
+    results = {
+        "shared": dict(corpus.stats(), load_ms=round(load_ms, 1), segment_bytes=shared_bytes),
+        "per_user_copy": {"write_ms": percentiles(copy_ms), "bytes_per_user": int(per_user_bytes)},
+        "retrieval_ms": percentiles(samples),
+        "methods": methods,
+        "questions_with_expected_context": found,
+        "stages": stage_summary(),
+    }
+    lat = results["retrieval_ms"]
+    print(f"shared corpus: {len(corpus)} chunks loaded in {load_ms:.0f}ms, {shared_bytes} bytes once per host")
+    print(f"per-user copies avoided: {results['per_user_copy']['write_ms']['mean']}ms and "
+          f"{int(per_user_bytes)} bytes per user (embedding not included)")
+    print(f"{len(samples)} queries from users with no documents: p50 {lat['p50']}ms p95 {lat['p95']}ms, "
+          f"{found}/{len(WHO_QUESTIONS)} contexts contain the expected fact, methods {methods}")
+    write_results("shared_corpus", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
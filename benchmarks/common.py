@@ -0,0 +1,135 @@
+"""
+Shared helpers for the benchmark scripts: scratch environment, percentile
+summaries and JSON result files.
+
+    python -m benchmarks.common compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def scratch_env(root: Optional[str] = None, **overrides) -> str:
+    """
+    Points vector store, manifests and local index at a scratch directory and
+    turns the answer cache off. Must run before FYP_RAG.rag_query_ibm is
+    imported, since its registries read the environment once.
+    """
+    root = root or tempfile.mkdtemp(prefix="fyp-bench-")
+    env = {
+        "VECTORSTORE_PATH": os.path.join(root, "vectorstore"),
+        "ANSWER_CACHE_BACKEND": "off",
+        "ANONYMIZED_TELEMETRY": "False",
+        # Synthetic-corpus runs measure the user tier alone; bench_shared_corpus turns it on
+        "SHARED_INDEX_ENABLED": "0",
+    }
+    env.update({k: str(v) for k, v in overrides.items()})
+    os.environ.update(env)
+    return root
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"count": 0}
+    ordered = sorted(samples_ms)
+
+    def pct(p):
+        # Nearest-rank, so p99 of a small run is an observed sample
+        return ordered[min(len(ordered), max(1, math.ceil(p / 100.0 * len(ordered)))) - 1]
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 3),
+        "p50": round(pct(50), 3),
+        "p95": round(pct(95), 3),
+        "p99": round(pct(99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def stage_summary() -> Dict[str, Dict[str, float]]:
+    """Count and mean milliseconds per pipeline stage from FYP_RAG.metrics."""
+    from FYP_RAG.metrics import STAGE_SECONDS
+
+    out = {}
+    for (name,), (count, total) in sorted(STAGE_SECONDS.snapshot().items()):
+        out[name] = {"count": count, "mean_ms": round(total / count * 1000, 3) if count else 0.0}
+    return out
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(RESULTS_DIR)).decode().strip()
+    except Exception:
+        return None
+
+
+def write_results(name: str, params: dict, results: dict, out: Optional[str] = None) -> str:
+    """Writes one run as JSON (to `out`, or benchmarks/results/<name>-<time>.json) and returns the path."""
+    record = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    print(f"Results written to {out}")
+    return out
+
+
+def _flatten(prefix: str, value, out: dict):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+
+def compare(path_a: str, path_b: str):
+    with open(path_a, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(path_b, encoding="utf-8") as f:
+        b = json.load(f)
+    flat_a, flat_b = {}, {}
+    _flatten("", a.get("results", {}), flat_a)
+    _flatten("", b.get("results", {}), flat_b)
+    print(f"{a.get('benchmark')} {a.get('git_commit')} -> {b.get('benchmark')} {b.get('git_commit')}")
+    print(f"{'metric':<48} {'before':>12} {'after':>12} {'change':>9}")
+    for key in sorted(set(flat_a) | set(flat_b)):
+        va, vb = flat_a.get(key), flat_b.get(key)
+        change = f"{(vb - va) / va * 100:+.1f}%" if va not in (None, 0) and vb is not None else ""
+        print(f"{key:<48} {'' if va is None else va:>12} {'' if vb is None else vb:>12} {change:>9}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    cmp = sub.add_parser("compare", help="diff the numeric results of two runs")
+    cmp.add_argument("before")
+    cmp.add_argument("after")
+    args = ap.parse_args()
+    if args.cmd == "compare":
+        compare(args.before, args.after)
+
+
+if __name__ == "__main__":
+    main()
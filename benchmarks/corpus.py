@@ -0,0 +1,98 @@
+"""
+Synthetic WHO-style PDF corpora for benchmarks. Every page carries one
+unique, checkable fact, so retrieval benchmarks know which (file, page)
+a query should hit.
+
+    python -m benchmarks.corpus --out /tmp/corpus --docs 5 --pages 40
+"""
+import argparse
+import json
+import os
+import random
+from typing import List
+
+FILLER = ["malaria", "coverage", "vector", "control", "mortality", "report", "health", "nets",
+          "spraying", "increase", "decrease", "region", "children", "vaccination", "policy",
+          "surveillance", "treatment", "incidence", "programme", "funding", "districts", "cases"]
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "bu", "so", "vi", "da", "ne", "qu", "zor", "pa", "li", "gha"]
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """One PDF page per entry in `pages`, one text line per string."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    c = canvas.Canvas(path, pagesize=letter)
+    for lines in pages:
+        t = c.beginText(72, 720)
+        for line in lines:
+            t.textLine(line)
+        c.drawText(t)
+        c.showPage()
+    c.save()
+
+
+def _region_names(rng: random.Random, n: int) -> List[str]:
+    names = set()
+    while len(names) < n:
+        names.add("".join(rng.choices(SYLLABLES, k=3)).capitalize())
+    return sorted(names)
+
+
+def filler_lines(rng: random.Random, n: int) -> List[str]:
+    return [" ".join(rng.choices(FILLER, k=12)).capitalize() + "." for _ in range(n)]
+
+
+def build_corpus(out_dir: str, docs: int = 3, pages: int = 20, lines_per_page: int = 40, seed: int = 3) -> dict:
+    """
+    Writes `docs` PDFs of `pages` pages into out_dir and returns
+    {"files": [paths], "queries": [{"query", "source", "page", "fact"}]}.
+    """
+    rng = random.Random(seed)
+    regions = iter(_region_names(rng, docs * pages))
+    files, queries = [], []
+    for d in range(docs):
+        filename = f"who_report_{d + 1:03d}.pdf"
+        doc_pages = []
+        for p in range(1, pages + 1):
+            region, year, pct = next(regions), rng.randint(2015, 2024), rng.randint(2, 40)
+            trend = rng.choice(["rose", "fell"])
+            fact = f"In {region} province, malaria cases {trend} by {pct}% in {year}."
+            lines = filler_lines(rng, lines_per_page - 1)
+            lines.insert(rng.randrange(len(lines) + 1), fact)
+            doc_pages.append(lines)
+            queries.append({
+                "query": f"How did malaria cases change in {region} province in {year}?",
+                "source": filename,
+                "page": p,
+                "fact": fact,
+            })
+        path = os.path.join(out_dir, filename)
+        write_pdf(path, doc_pages)
+        files.append(path)
+    return {"files": files, "queries": queries}
+
+
+def write_synthetic_pdf(path: str, pages: int, seed: int = 3):
+    """A PDF of filler text only (extraction throughput, no facts)."""
+    rng = random.Random(seed)
+    write_pdf(path, [filler_lines(rng, 40) for _ in range(pages)])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--docs", type=int, default=3)
+    ap.add_argument("--pages", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+
+    corpus = build_corpus(args.out, args.docs, args.pages, seed=args.seed)
+    with open(os.path.join(args.out, "queries.json"), "w", encoding="utf-8") as f:
+        json.dump(corpus["queries"], f, indent=2)
+    print(f"Wrote {len(corpus['files'])} PDFs and {len(corpus['queries'])} queries to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Local S3-compatible stand-in for IBM Cloud Object Storage, for offline
+benchmarks of FYP_RAG/ibm_cos_storage.py. Objects live in memory. Speaks the
+subset the module uses: HEAD/GET (with Range and If-Match), PUT, ListObjectsV2 and
+multipart uploads. Signatures are not checked. Each request waits
+`--latency-ms` and each connection is throttled to `--mbps`, like one TCP
+stream to a remote region, so part size and concurrency show up in timings.
+
+    python -m benchmarks.cos_stub --port 8090 --latency-ms 30 --mbps 40
+
+then point the app at it:
+
+    COS_ENDPOINT=http://127.0.0.1:8090 COS_ACCESS_KEY_ID=stub COS_SECRET_ACCESS_KEY=stub
+    COS_BUCKET=fyp COS_ADDRESSING_STYLE=path
+"""
+import argparse
+import hashlib
+import itertools
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+_PART = re.compile(r"<PartNumber>(\d+)</PartNumber>")
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 20.0, mbps: float = 0.0, list_page_size: int = 1000):
+        self.latency_ms = latency_ms
+        # Per-connection throughput cap in MB/s (0 = unthrottled)
+        self.mbps = mbps
+        self.list_page_size = list_page_size
+        self.lock = threading.Lock()
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self.uploads: Dict[str, dict] = {}
+        self.upload_ids = itertools.count(1)
+        self.counts = {"head": 0, "get": 0, "ranged_get": 0, "put": 0, "list": 0,
+                       "multipart_parts": 0, "multipart_completed": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def count(self, key: str, n: int = 1):
+        with self.lock:
+            self.counts[key] += n
+
+    def put(self, bucket: str, key: str, data: bytes):
+        with self.lock:
+            self.objects[(bucket, key)] = data
+
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+def _make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _target(self) -> Tuple[str, str, dict]:
+            parts = urlsplit(self.path)
+            bucket, _, key = parts.path.lstrip("/").partition("/")
+            query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+            return unquote(bucket), unquote(key), query
+
+        def _body(self) -> bytes:
+            data = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            config.count("bytes_in", len(data))
+            if config.mbps:
+                time.sleep(len(data) / (config.mbps * 1024 * 1024))
+            return data
+
+        def _send(self, status: int, body: bytes = b"", headers: Tuple[Tuple[str, str], ...] = (),
+                  content_type: str = "application/xml", head: bool = False, length: Optional[int] = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body) if length is None else length))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            if head:
+                return
+            step = 64 * 1024
+            for start in range(0, len(body), step):
+                piece = body[start:start + step]
+                self.wfile.write(piece)
+                if config.mbps:
+                    time.sleep(len(piece) / (config.mbps * 1024 * 1024))
+            config.count("bytes_out", len(body))
+
+        def _error(self, status: int, code: str):
+            body = f"<?xml version='1.0' encoding='UTF-8'?><Error><Code>{code}</Code></Error>".encode()
+            self._send(status, body)
+
+        def _object(self, bucket: str, key: str) -> Optional[bytes]:
+            with config.lock:
+                return config.objects.get((bucket, key))
+
+        def _wait(self):
+            time.sleep(config.latency_ms / 1000.0)
+
+        def do_HEAD(self):
+            self._wait()
+            bucket, key, _ = self._target()
+            config.count("head")
+            data = self._object(bucket, key)
+            if data is None:
+                return self._send(404, head=True, length=0)
+            self._send(200, headers=(("ETag", _etag(data)), ("Accept-Ranges", "bytes"),
+                                     ("Last-Modified", formatdate(usegmt=True))),
+                       content_type="application/octet-stream", head=True, length=len(data))
+
+        def do_GET(self):
+            self._wait()
+            bucket, key, query = self._target()
+            if not key:
+                return self._list(bucket, query)
+            data = self._object(bucket, key)
+            if data is None:
+                return self._error(404, "NoSuchKey")
+            if_match = self.headers.get("If-Match")
+            if if_match and if_match not in ("*", _etag(data)):
+                return self._error(412, "PreconditionFailed")
+            match = _RANGE.fullmatch(self.headers.get("Range", ""))
+            if not match:
+                config.count("get")
+                return self._send(200, data, (("ETag", _etag(data)),), "application/octet-stream")
+            config.count("ranged_get")
+            first, last = match.groups()
+            if first == "":
+                start, end = max(0, len(data) - int(last)), len(data) - 1
+            else:
+                start, end = int(first), min(int(last) if last else len(data) - 1, len(data) - 1)
+            if start >= len(data):
+                return self._error(416, "InvalidRange")
+            self._send(206, data[start:end + 1], (("ETag", _etag(data)),
+                                                  ("Content-Range", f"bytes {start}-{end}/{len(data)}")),
+                       "application/octet-stream")
+
+        def _list(self, bucket: str, query: dict):
+            config.count("list")
+            prefix = query.get("prefix", "")
+            page = min(int(query.get("max-keys") or 1000), config.list_page_size)
+            after = query.get("continuation-token") or query.get("start-after") or ""
+            with config.lock:
+                keys = sorted(k for b, k in config.objects if b == bucket and k.startswith(prefix) and k > after)
+                items = [(k, config.objects[(bucket, k)]) for k in keys[:page]]
+            truncated = len(keys) > page
+            rows = "".join(
+                f"<Contents><Key>{escape(k)}</Key><Size>{len(v)}</Size><ETag>{escape(_etag(v))}</ETag>"
+                f"<LastModified>2024-01-01T00:00:00.000Z</LastModified><StorageClass>STANDARD</StorageClass>"
+                f"</Contents>"
+                for k, v in items
+            )
+            token = f"<NextContinuationToken>{escape(items[-1][0])}</NextContinuationToken>" if truncated else ""
+            body = (
+                "<?xml version='1.0' encoding='UTF-8'?>"
+                "<ListBucketResult xmlns='http://s3.amazonaws.com/doc/2006-03-01/'>"
+                f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(items)}</KeyCount>"
+                f"<MaxKeys>{page}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>{token}{rows}"
+                "</ListBucketResult>"
+            ).encode("utf-8")
+            self._send(200, body)
+
+        def do_PUT(self):
+            self._wait()
+            bucket, key, query = self._target()
+            data = self._body()
+            if not key:
+                return self._send(200)  # create bucket
+            if "uploadId" in query:
+                with config.lock:
+                    upload = config.uploads.get(query["uploadId"])
+                    if upload is not None:
+                        upload["parts"][int(query["partNumber"])] = data
+                if upload is None:
+                    return self._error(404, "NoSuchUpload")
+                config.count("multipart_parts")
+                return self._send(200, headers=(("ETag", _etag(data)),))
+            config.count("put")
+            config.put(bucket, key, data)
+            self._send(200, headers=(("ETag", _etag(data)),))
+
+        def do_POST(self):
+            self._wait()
+            bucket, key, query = self._target()
+            raw = self._body()
+            if "uploads" in query:
+                upload_id = f"stub-{next(config.upload_ids)}"
+                with config.lock:
+                    config.uploads[upload_id] = {"bucket": bucket, "key": key, "parts": {}}
+                body = (
+                    "<?xml version='1.0' encoding='UTF-8'?><InitiateMultipartUploadResult>"
+                    f"<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId>"
+                    "</InitiateMultipartUploadResult>"
+                ).encode("utf-8")
+                return self._send(200, body)
+            if "uploadId" in query:
+                with config.lock:
+                    upload = config.uploads.pop(query["uploadId"], None)
+                if upload is None:
+                    return self._error(404, "NoSuchUpload")
+                numbers = [int(n) for n in _PART.findall(raw.decode("utf-8"))]
+                data = b"".join(upload["parts"][n] for n in numbers)
+                config.put(bucket, key, data)
+                config.count("multipart_completed")
+                body = (
+                    "<?xml version='1.0' encoding='UTF-8'?><CompleteMultipartUploadResult>"
+                    f"<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key><ETag>{escape(_etag(data))}</ETag>"
+                    "</CompleteMultipartUploadResult>"
+                ).encode("utf-8")
+                return self._send(200, body)
+            self._error(400, "InvalidRequest")
+
+        def do_DELETE(self):
+            self._wait()
+            bucket, key, query = self._target()
+            with config.lock:
+                if "uploadId" in query:
+                    config.uploads.pop(query["uploadId"], None)
+                else:
+                    config.objects.pop((bucket, key), None)
+            self._send(204, length=0, head=True)
+
+    return Handler
+
+
+def start_stub(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+    """Starts the stub on a daemon thread. Returns (server, base_url); call server.shutdown() to stop."""
+    config = config or StubConfig()
+    server = ThreadingHTTPServer((host, port), _make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name="cos-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def stub_env(base_url: str, bucket: str = "fyp") -> dict:
+    """Environment that points ibm_cos_storage at the stub."""
+    return {
+        "COS_ENDPOINT": base_url,
+        "COS_ACCESS_KEY_ID": "stub",
+        "COS_SECRET_ACCESS_KEY": "stub",
+        "COS_BUCKET": bucket,
+        "COS_ADDRESSING_STYLE": "path",
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="added to every request")
+    ap.add_argument("--mbps", type=float, default=0.0, help="per-connection throughput cap, MB/s (0 = none)")
+    args = ap.parse_args()
+
+    server, url = start_stub(StubConfig(args.latency_ms, args.mbps), args.host, args.port)
+    print(f"COS stub listening on {url}")
+    for k, v in stub_env(url).items():
+        print(f"  {k}={v}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
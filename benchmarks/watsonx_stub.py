@@ -0,0 +1,218 @@
+"""
+Local stand-in for IBM IAM and the Watsonx chat endpoints, for offline
+benchmarks. Answers quote the context sentence sharing the most words with
+the question, so they pass the grounding gate the way a well-behaved model
+would, and only contain the right fact if the context did.
+
+    python -m benchmarks.watsonx_stub --port 8089 --latency-ms 400 --error-rate 0.05
+
+then point the app at it:
+
+    WATSONX_URL=http://127.0.0.1:8089 WATSONX_IAM_URL=http://127.0.0.1:8089/identity/token
+    WATSONX_API_KEY=stub IBM_PROJECT_ID=stub
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 100.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        iam_latency_ms: float = 50.0,
+        token_ttl_s: int = 3600,
+        stream_pieces: int = 12,
+        seed: Optional[int] = None,
+        prefill_ms_per_1k_tokens: float = 0.0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.iam_latency_ms = iam_latency_ms
+        self.token_ttl_s = token_ttl_s
+        self.stream_pieces = max(1, stream_pieces)
+        # Extra latency per 1000 prompt tokens, so prompt size shows up in timings
+        self.prefill_ms_per_1k_tokens = prefill_ms_per_1k_tokens
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"iam": 0, "chat": 0, "chat_stream": 0, "errors": 0, "rate_limited": 0, "prompt_tokens": 0}
+
+    def latency_s(self) -> float:
+        with self.lock:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def failure(self) -> Optional[int]:
+        """503 or 429 according to the configured rates, else None."""
+        with self.lock:
+            r = self.rng.random()
+            if r < self.error_rate:
+                self.counts["errors"] += 1
+                return 503
+            if r < self.error_rate + self.rate_limit_rate:
+                self.counts["rate_limited"] += 1
+                return 429
+        return None
+
+    def count(self, key: str, n: int = 1):
+        with self.lock:
+            self.counts[key] += n
+
+    def prefill_s(self, prompt_tokens: int) -> float:
+        return self.prefill_ms_per_1k_tokens * prompt_tokens / 1000.0 / 1000.0
+
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9']+")
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+
+def _prompt_tokens(payload: dict) -> int:
+    """Same rough estimate as FYP_RAG.context_builder.estimate_tokens."""
+    text = " ".join(m.get("content") or "" for m in payload.get("messages") or [])
+    return int(len(_PIECE.findall(text)) * 1.3 + 0.999)
+
+
+def _answer_for(payload: dict) -> str:
+    content = ""
+    for message in payload.get("messages") or []:
+        if message.get("role") == "user":
+            content = message.get("content") or ""
+    context, _, question = content.split("Context:\n", 1)[-1].partition("\n\nQuestion:")
+    q_words = {w for w in _WORD.findall(question.lower()) if len(w) > 3}
+    best, best_overlap = None, -1
+    for sentence in _SENTENCE_BREAK.split(context.strip()):
+        overlap = len(q_words & set(_WORD.findall(sentence.lower())))
+        if sentence.strip() and overlap > best_overlap:
+            best, best_overlap = sentence.strip(), overlap
+    return best[:400] if best else "Insufficient information in provided context."
+
+
+def _make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def _send_json(self, status: int, data: dict, headers: Tuple[Tuple[str, str], ...] = ()):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            raw = self._body()
+            path = self.path.split("?", 1)[0]
+            if path == "/identity/token":
+                config.count("iam")
+                time.sleep(config.iam_latency_ms / 1000.0)
+                return self._send_json(200, {"access_token": f"stub-{time.time():.0f}",
+                                             "expires_in": config.token_ttl_s})
+
+            if path not in ("/ml/v1/text/chat", "/ml/v1/text/chat_stream"):
+                return self._send_json(404, {"error": "not found"})
+            if not self.headers.get("Authorization", "").startswith("Bearer "):
+                return self._send_json(401, {"error": "missing token"})
+
+            status = config.failure()
+            if status == 429:
+                return self._send_json(429, {"error": "rate limited"}, (("Retry-After", "0.2"),))
+            if status:
+                time.sleep(config.latency_s() / 4)
+                return self._send_json(status, {"error": "service unavailable"})
+
+            payload = json.loads(raw or b"{}")
+            answer = _answer_for(payload)
+            n_prompt = _prompt_tokens(payload)
+            config.count("prompt_tokens", n_prompt)
+            latency = config.latency_s() + config.prefill_s(n_prompt)
+            if path == "/ml/v1/text/chat":
+                config.count("chat")
+                time.sleep(latency)
+                return self._send_json(200, {"choices": [{"message": {"role": "assistant", "content": answer}}]})
+
+            config.count("chat_stream")
+            # Roughly a third of the latency before the first token, the rest spread over the pieces
+            words = answer.split(" ")
+            step = max(1, len(words) // config.stream_pieces)
+            pieces = [" ".join(words[i:i + step]) + (" " if i + step < len(words) else "")
+                      for i in range(0, len(words), step)]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            time.sleep(latency / 3)
+            for piece in pieces:
+                event = {"choices": [{"delta": {"content": piece}}]}
+                self.wfile.write(f"id: 1\nevent: message\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(latency * 2 / 3 / len(pieces))
+            self.close_connection = True
+
+    return Handler
+
+
+def start_stub(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+    """Starts the stub on a daemon thread. Returns (server, base_url); call server.shutdown() to stop."""
+    config = config or StubConfig()
+    server = ThreadingHTTPServer((host, port), _make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name="watsonx-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def stub_env(base_url: str) -> dict:
+    """Environment that points rag_query_ibm's Watsonx client at the stub."""
+    return {
+        "WATSONX_URL": base_url,
+        "WATSONX_IAM_URL": f"{base_url}/identity/token",
+        "WATSONX_API_KEY": "stub",
+        "IBM_PROJECT_ID": "stub",
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency-ms", type=float, default=300.0)
+    ap.add_argument("--jitter-ms", type=float, default=100.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of chat calls answered 503")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered 429")
+    ap.add_argument("--prefill-ms-per-1k", type=float, default=0.0, help="extra latency per 1000 prompt tokens")
+    args = ap.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                        prefill_ms_per_1k_tokens=args.prefill_ms_per_1k)
+    server, url = start_stub(config, args.host, args.port)
+    print(f"Watsonx stub listening on {url}")
+    for k, v in stub_env(url).items():
+        print(f"  {k}={v}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Gunicorn settings for the RAG app (picked up by the Procfile).
+#
+# /query_rag spends almost all of its time waiting on IAM/Granite, so each
+# worker runs a pool of threads instead of one request at a time. Granite
+# calls are additionally capped per worker by LLM_MAX_INFLIGHT (see
+# FYP_RAG/admission.py); keep it at or below GUNICORN_THREADS so some threads
+# stay free for history, uploads and fast 503s.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# GUNICORN_WORKER_CLASS=sync restores the old one-request-per-worker behaviour
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+# Above WATSONX_REQUEST_DEADLINE_S (45 s) plus retrieval, so a slow Granite
+# answer is never killed mid-request
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "75"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+
+# Preloading imports the app and runs the shared warm-up phases (modules,
+# embedding weights, the memory-mapped shared corpus) once in the master;
+# forked workers inherit them copy-on-write instead of each loading their own.
+# Each worker then opens its own Chroma client and Watsonx session before it
+# accepts requests. GUNICORN_PRELOAD=0 warms up every worker from scratch.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        from FYP_RAG import warmup
+        warmup.warmup(per_process=False)
+
+
+def post_worker_init(worker):
+    from FYP_RAG import warmup
+    warmup.warmup()
@@ -76,105 +76,115 @@ document.addEventListener("DOMContentLoaded", () => {
   // -----------------------------
   // HISTORY VIEW (BACKEND FETCH)
   // -----------------------------
-  async function loadHistory() {
+  const HISTORY_PAGE_SIZE = 20;
+
+  function showHistoryEmpty(container, text) {
+    const empty = document.createElement("div");
+    empty.className = "history-empty";
+    empty.textContent = text;
+    container.appendChild(empty);
+  }
+
+  function historyCard(item, container) {
+    const card = document.createElement("div");
+    card.className = "history-card";
+    card.dataset.id = item.id;
+    const ts = item.timestamp ? new Date(item.timestamp).toLocaleString() : "";
+    card.innerHTML = `
+      <div class="history-row"><span class="label">Q:</span><span class="value">${escapeHtml(item.query)}</span></div>
+      <div class="history-row answer-collapsed" data-collapsed="true"><span class="label">A:</span><span class="value">${escapeHtml(item.answer)}${item.truncated ? "…" : ""}</span></div>
+      <div class="history-meta">
+        <span>${ts}</span>
+        <div class="history-actions-row">
+          <button class="btn-link view-full">View full answer →</button>
+          <button class="btn-link delete-btn">Delete</button>
+        </div>
+      </div>
+      <div class="confirm-box">
+        <div class="confirm-text">Delete this entry?</div>
+        <button class="btn-link btn-muted cancel-delete">Cancel</button>
+        <button class="btn-link btn-danger confirm-delete">Delete</button>
+      </div>
+    `;
+
+    // Compact pages carry a truncated answer; the full one is fetched on first expand
+    let truncated = !!item.truncated;
+    const viewBtn = card.querySelector('.view-full');
+    viewBtn.addEventListener('click', async () => {
+      const ans = card.querySelector('.history-row[data-collapsed]');
+      const collapsed = ans.dataset.collapsed === 'true';
+      if (collapsed) {
+        if (truncated) {
+          try {
+            const res = await fetch(`/history/${item.id}?user_id=${encodeURIComponent(currentUserId)}`);
+            const json = await res.json();
+            if (json.success) {
+              ans.querySelector('.value').textContent = json.item.answer;
+              truncated = false;
+            }
+          } catch (err) { console.error(err); }
+        }
+        ans.classList.remove('answer-collapsed');
+        ans.dataset.collapsed = 'false';
+        viewBtn.textContent = 'Collapse answer ↑';
+      } else {
+        ans.classList.add('answer-collapsed');
+        ans.dataset.collapsed = 'true';
+        viewBtn.textContent = 'View full answer →';
+      }
+    });
+
+    const box = card.querySelector('.confirm-box');
+    card.querySelector('.delete-btn').addEventListener('click', () => box.classList.add('active'));
+    card.querySelector('.cancel-delete').addEventListener('click', () => box.classList.remove('active'));
+    card.querySelector('.confirm-delete').addEventListener('click', async () => {
+      try {
+        const res = await fetch('/history/delete', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ id: item.id, user_id: currentUserId })
+        });
+        const json = await res.json();
+        if (json.success) {
+          card.remove();
+          if (!container.querySelector('.history-card')) {
+            container.innerHTML = "";
+            showHistoryEmpty(container, 'No history yet.');
+          }
+        }
+      } catch (err) { console.error(err); }
+    });
+    return card;
+  }
+
+  async function loadHistory(cursor) {
     const container = document.querySelector("#screen-history .history-list");
     if (!container) return;
-    container.innerHTML = "";
+    if (!cursor) container.innerHTML = "";
+    container.querySelector('.history-more')?.remove();
 
     try {
-      const res = await fetch(`/history?user_id=${encodeURIComponent(currentUserId)}`);
+      // The browser revalidates with If-None-Match, so an unchanged page comes back as 304
+      let url = `/history?user_id=${encodeURIComponent(currentUserId)}&compact=1&limit=${HISTORY_PAGE_SIZE}`;
+      if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+      const res = await fetch(url, { cache: "no-cache" });
       const data = await res.json();
-      if (!data.success || !Array.isArray(data.history) || !data.history.length) {
-        const empty = document.createElement("div");
-        empty.className = "history-empty";
-        empty.textContent = "No history yet.";
-        container.appendChild(empty);
+      if (!data.success || !Array.isArray(data.history) || (!cursor && !data.history.length)) {
+        showHistoryEmpty(container, "No history yet.");
         return;
       }
 
-      data.history.forEach(item => {
-        const card = document.createElement("div");
-        card.className = "history-card";
-        card.dataset.id = item.id;
-        const ts = item.timestamp ? new Date(item.timestamp).toLocaleString() : "";
-        card.innerHTML = `
-          <div class="history-row"><span class="label">Q:</span><span class="value">${escapeHtml(item.query)}</span></div>
-          <div class="history-row answer-collapsed" data-collapsed="true"><span class="label">A:</span><span class="value">${escapeHtml(item.answer)}</span></div>
-          <div class="history-meta">
-            <span>${ts}</span>
-            <div class="history-actions-row">
-              <button class="btn-link view-full">View full answer →</button>
-              <button class="btn-link delete-btn">Delete</button>
-            </div>
-          </div>
-          <div class="confirm-box">
-            <div class="confirm-text">Delete this entry?</div>
-            <button class="btn-link btn-muted cancel-delete">Cancel</button>
-            <button class="btn-link btn-danger confirm-delete">Delete</button>
-          </div>
-        `;
-        container.appendChild(card);
-      });
-
-      // Wire up actions
-      container.querySelectorAll('.view-full').forEach(btn => {
-        btn.addEventListener('click', () => {
-          const card = btn.closest('.history-card');
-          const ans = card.querySelector('.answer-collapsed');
-          const collapsed = ans.dataset.collapsed === 'true';
-          if (collapsed) {
-            ans.classList.remove('answer-collapsed');
-            ans.dataset.collapsed = 'false';
-            btn.textContent = 'Collapse answer ↑';
-          } else {
-            ans.classList.add('answer-collapsed');
-            ans.dataset.collapsed = 'true';
-            btn.textContent = 'View full answer →';
-          }
-        });
-      });
+      data.history.forEach(item => container.appendChild(historyCard(item, container)));
 
-      container.querySelectorAll('.delete-btn').forEach(btn => {
-        btn.addEventListener('click', () => {
-          const card = btn.closest('.history-card');
-          const box = card.querySelector('.confirm-box');
-          box.classList.add('active');
-        });
-      });
-      container.querySelectorAll('.cancel-delete').forEach(btn => {
-        btn.addEventListener('click', () => {
-          const card = btn.closest('.history-card');
-          card.querySelector('.confirm-box').classList.remove('active');
-        });
-      });
-      container.querySelectorAll('.confirm-delete').forEach(btn => {
-        btn.addEventListener('click', async () => {
-          const card = btn.closest('.history-card');
-          const id = card.dataset.id;
-          try {
-            const res = await fetch('/history/delete', {
-              method: 'POST',
-              headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify({ id, user_id: currentUserId })
-            });
-            const json = await res.json();
-            if (json.success) {
-              card.remove();
-              if (!container.children.length) {
-                const empty = document.createElement('div');
-                empty.className = 'history-empty';
-                empty.textContent = 'No history yet.';
-                container.appendChild(empty);
-              }
-            }
-          } catch (err) { console.error(err); }
-        });
-      });
+      if (data.next_cursor) {
+        const more = document.createElement("button");
+        more.className = "btn-link history-more";
+        more.textContent = "Load more";
+        more.addEventListener('click', () => loadHistory(data.next_cursor));
+        container.appendChild(more);
+      }
     } catch (err) {
-      const empty = document.createElement("div");
-      empty.className = "history-empty";
-      empty.textContent = "Failed to load history.";
-      container.appendChild(empty);
+      showHistoryEmpty(container, "Failed to load history.");
       console.error(err);
     }
   }
@@ -266,6 +276,23 @@ document.addEventListener("DOMContentLoaded", () => {
           const upJson = await up.json();
           if (!upJson.success) throw new Error(upJson.message);
 
+          // Ingestion runs in the background; poll the job until it finishes (at most 15 minutes)
+          if (upJson.status_url) {
+            const deadline = Date.now() + 15 * 60 * 1000;
+            while (true) {
+              if (Date.now() > deadline) {
+                throw new Error("The document is still being processed. Please check back later.");
+              }
+              await new Promise(r => setTimeout(r, 1500));
+              const st = await (await fetch(upJson.status_url)).json();
+              if (!st.success || st.status === "failed") throw new Error(st.error || st.message);
+              if (st.status === "done") break;
+              if (uploading && st.pages_total) {
+                uploading.innerHTML = `<span class="spinner inline"></span> Processing document... page ${st.pages_done}/${st.pages_total}`;
+              }
+            }
+          }
+
           // Update the same uploading placeholder to success
           if (uploading) {
             uploading.classList.remove("uploading");
@@ -287,6 +314,11 @@ document.addEventListener("DOMContentLoaded", () => {
           });
 
           const result = await res.json();
+          if (res.status === 503) {
+            // Server is at its Granite concurrency limit; show its "busy" message
+            updateLastBotMessage(chatId, escapeHtml(String(result.answer || "The assistant is busy. Please try again shortly.")));
+            return;
+          }
           if (!result.success) throw new Error(result.answer);
 
           const answerText = typeof result.answer === 'string' ? result.answer : String(result.answer || '');
@@ -0,0 +1,66 @@
+"""
+Shared set-up for the test suite. The vector store, manifests, parse cache
+and app database live in one scratch directory per run; this has to happen
+before FYP_RAG is imported, since its registries read the environment once.
+Embeddings come from a small hashing backend, so Chroma works without
+downloading a model.
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix="fyp-tests-")
+os.environ.update({
+    "VECTORSTORE_PATH": os.path.join(SCRATCH, "vectorstore"),
+    "DATABASE_PATH": os.path.join(SCRATCH, "database.db"),
+    "ANSWER_CACHE_BACKEND": "off",
+    "EMBED_CACHE_BACKEND": "off",
+    "SHARED_INDEX_ENABLED": "0",
+    "ANONYMIZED_TELEMETRY": "False",
+})
+
+
+class HashingBackend:
+    """Bag of hashed words, L2-normalised: texts sharing words land close together."""
+
+    identity = "test:hashing"
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+
+    def embed(self, texts, batch_size):
+        from FYP_RAG.text_utils import terms
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in terms(text):
+                out[row, int(hashlib.md5(term.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1.0, norms)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def hashing_embeddings():
+    from FYP_RAG import embeddings
+
+    original = embeddings.build_embedding_function
+    embeddings.build_embedding_function = lambda model_name: embeddings.CachedEmbeddingFunction(HashingBackend())
+    yield
+    embeddings.build_embedding_function = original
+
+
+@pytest.fixture
+def write_pdf(tmp_path):
+    """write_pdf(name, pages) -> path; `pages` is a list of lists of text lines."""
+    pytest.importorskip("reportlab")
+    from benchmarks.corpus import write_pdf as _write_pdf
+
+    def write(name, pages):
+        path = os.path.join(tmp_path, name)
+        _write_pdf(path, pages)
+        return path
+
+    return write
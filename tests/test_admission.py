@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from FYP_RAG.admission import AdmissionController, Overloaded
+
+
+def test_full_queue_is_rejected_immediately():
+    ctl = AdmissionController(max_inflight=1, max_queue=0, max_wait_s=5)
+    ctl.acquire()
+    with pytest.raises(Overloaded) as exc:
+        ctl.acquire()
+    assert exc.value.reason == "queue_full"
+    assert 1 <= exc.value.retry_after <= 60
+    assert ctl.stats()["rejected"] == 1
+
+
+def test_waiter_times_out():
+    ctl = AdmissionController(max_inflight=1, max_queue=1, max_wait_s=0.05)
+    ctl.acquire()
+    with pytest.raises(Overloaded) as exc:
+        ctl.acquire()
+    assert exc.value.reason == "timeout"
+    assert ctl.stats()["queued"] == 0
+
+
+def test_waiter_gets_the_released_slot():
+    ctl = AdmissionController(max_inflight=1, max_queue=1, max_wait_s=5)
+    ctl.acquire()
+    admitted = threading.Event()
+
+    def wait_for_slot():
+        with ctl.slot():
+            admitted.set()
+
+    t = threading.Thread(target=wait_for_slot)
+    t.start()
+    assert not admitted.wait(0.05)
+    ctl.release(held_s=0.1)
+    t.join(5)
+    assert admitted.is_set()
+    assert ctl.stats()["inflight"] == 0
+
+
+def test_disabled_limit_admits_everyone():
+    ctl = AdmissionController(max_inflight=0)
+    for _ in range(100):
+        ctl.acquire()
+    assert ctl.stats()["inflight"] == 0
+
+
+def test_overloaded_query_is_a_503_with_retry_after(monkeypatch):
+    import app
+
+    def saturated(query, user_id):
+        raise Overloaded("Too many queries in progress", "queue_full", 7)
+
+    monkeypatch.setattr(app, "run_rag_query", saturated)
+    resp = app.app.test_client().post("/query_rag", json={"query": "How did cases change?", "user_id": "u"})
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "7"
+    assert resp.get_json()["error"] == "queue_full"
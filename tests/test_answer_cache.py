@@ -0,0 +1,64 @@
+import os
+import sqlite3
+
+import pytest
+
+from FYP_RAG.answer_cache import AnswerCache, MemoryAnswerBackend, SqliteAnswerBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        backend = MemoryAnswerBackend()
+    else:
+        backend = SqliteAnswerBackend(os.path.join(tmp_path, "answers.sqlite3"))
+    return AnswerCache(backend, ttl_s=600)
+
+
+def test_answer_computed_across_an_ingest_is_not_served(cache):
+    # The key is taken before computing; the ingest lands while the answer is being computed
+    key = cache.key("alice", "How did cases change?")
+    cache.invalidate_user("alice")
+    cache.put(key, "alice", {"answer": "pre-ingest"}, compute_ms=100.0)
+
+    fresh = cache.key("alice", "how did cases change")
+    assert fresh != key
+    assert cache.get(fresh) is None
+
+    cache.put(fresh, "alice", {"answer": "post-ingest"}, compute_ms=100.0)
+    assert cache.get(cache.key("alice", "How did cases change?"))["answer"] == "post-ingest"
+
+
+def test_invalidation_is_per_user(cache):
+    key = cache.key("bob", "q")
+    cache.put(key, "bob", {"answer": "a"}, compute_ms=1.0)
+    cache.invalidate_user("alice")
+    assert cache.get(cache.key("bob", "q"))["cache"]["hit"] is True
+
+
+def test_memory_generations_stay_bounded_and_never_repeat():
+    backend = MemoryAnswerBackend(max_generations=3)
+    cache = AnswerCache(backend)
+    before = cache.key("alice", "q")
+    cache.invalidate_user("alice")
+    for i in range(10):
+        cache.invalidate_user(f"user{i}")
+
+    assert len(backend._generations) == 3
+    # alice's own generation was dropped; the floor she falls back to is past it
+    assert cache.key("alice", "q") != before
+
+
+def test_sqlite_totals_match_the_table_across_instances(tmp_path):
+    path = os.path.join(tmp_path, "answers.sqlite3")
+    a = SqliteAnswerBackend(path, max_entries=10)
+    b = SqliteAnswerBackend(path, max_entries=10)
+    for i in range(30):
+        (a if i % 2 else b).put(f"k{i}", "u", "x" * (i + 1), 1.0)
+    a.put("k29", "u", "y", 1.0)
+    b.delete("k28")
+
+    count, total = sqlite3.connect(path).execute("SELECT COUNT(*), SUM(size) FROM answers").fetchone()
+    assert a.size()["entries"] == b.size()["entries"] == count
+    assert a.size()["bytes"] == total
+    assert a.size()["evictions"] == b.size()["evictions"] > 0
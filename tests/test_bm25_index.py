@@ -0,0 +1,47 @@
+import pytest
+
+from FYP_RAG.bm25_index import BM25Index
+from FYP_RAG.text_utils import terms
+
+DOCS = [
+    "malaria cases rose in kapara province",
+    "malaria malaria malaria cases rose",
+    "vaccination coverage fell in neneka",
+    "malaria report for the region",
+]
+
+
+@pytest.fixture
+def index():
+    idx = BM25Index()
+    for text in DOCS:
+        idx.add(terms(text))
+    return idx
+
+
+def test_doc_ids_follow_insertion_order(index):
+    assert len(index) == len(DOCS)
+    assert index.add(terms("one more")) == len(DOCS)
+
+
+def test_rare_terms_outweigh_common_ones(index):
+    # "kapara" occurs once in the corpus, "malaria" in three of four documents
+    (best_score, best), *rest = index.search(terms("malaria kapara"), k=4)
+    assert best == 0
+    assert all(score < best_score for score, _ in rest)
+
+
+def test_term_frequency_raises_the_score(index):
+    ranked = [doc_id for _, doc_id in index.search(terms("malaria"), k=4)]
+    assert ranked[0] == 1
+    assert 2 not in ranked
+
+
+def test_only_matching_documents_are_returned(index):
+    assert [doc_id for _, doc_id in index.search(terms("neneka"))] == [2]
+    assert index.search(terms("unknown words")) == []
+    assert len(index.search(terms("malaria"), k=2)) == 2
+
+
+def test_empty_index():
+    assert BM25Index().search(["malaria"]) == []
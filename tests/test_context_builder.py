@@ -0,0 +1,53 @@
+from FYP_RAG.context_builder import estimate_tokens, pack_context
+from FYP_RAG.text_utils import tokenize
+
+FACT = "In Kapara province, malaria cases rose by 12% in 2021."
+FILLER = "The programme report lists funding, districts and surveillance staff for the region."
+
+
+def _chunk(text, page=1, chunk=1):
+    return {"source": "who.pdf", "page": page, "chunk": chunk, "text": text}
+
+
+def test_packed_context_stays_within_budget():
+    top = [(0.9 - i / 100, _chunk(" ".join([FILLER.replace("region", f"region {i}")] * 3), chunk=i))
+           for i in range(20)]
+    pack = pack_context(top, tokenize("funding for the region"), budget_tokens=120)
+    assert 0 < pack.tokens <= 120
+    assert estimate_tokens(pack.text) <= 120
+
+
+def test_query_sentences_are_kept_first():
+    # The fact sits in the lowest-ranked chunk, after filler that alone would fill the budget
+    top = [(0.9, _chunk(f"{FILLER} {FILLER.replace('staff', 'nurses')}", chunk=1)),
+           (0.5, _chunk(f"Bed nets were distributed. {FACT}", chunk=2))]
+    budget = estimate_tokens(FACT) + estimate_tokens(FILLER)
+    pack = pack_context(top, tokenize("How did malaria cases change in Kapara province?"), budget_tokens=budget)
+
+    assert FACT in pack.text
+    assert pack.tokens <= budget
+    assert pack.dropped_chunks == 0
+
+
+def test_near_duplicate_chunks_and_repeated_sentences_are_dropped():
+    top = [(0.9, _chunk(f"{FACT} {FILLER}", chunk=1)),
+           (0.8, _chunk(f"{FACT}  {FILLER}", page=2)),
+           (0.7, _chunk(f"Other news. {FACT.upper()}", page=3))]
+    pack = pack_context(top, tokenize("malaria cases kapara"), budget_tokens=600)
+
+    assert pack.dropped_chunks == 1
+    assert pack.dropped_sentences == 1
+    assert pack.text.count("Kapara") == 1
+
+
+def test_sentences_are_emitted_in_document_order():
+    top = [(0.9, _chunk("Kapara is a province. Cases rose there.", chunk=1)),
+           (0.8, _chunk("Malaria cases rose by 12% in Kapara.", chunk=2))]
+    pack = pack_context(top, tokenize("malaria cases kapara"), budget_tokens=600)
+    assert pack.text.index("Kapara is a province") < pack.text.index("Malaria cases rose")
+
+
+def test_an_oversized_sentence_is_cut_to_the_budget():
+    table = " ".join(f"kapara{i} malaria" for i in range(200))
+    pack = pack_context([(0.9, _chunk(table))], tokenize("malaria kapara"), budget_tokens=50)
+    assert pack.text and pack.tokens <= 50
@@ -0,0 +1,88 @@
+import hashlib
+import io
+import os
+import random
+
+import pytest
+
+pytest.importorskip("ibm_boto3")
+
+from benchmarks.cos_stub import StubConfig, start_stub, stub_env
+from FYP_RAG import ibm_cos_storage as cos
+
+KB = 1024
+DATA = random.Random(7).randbytes(300 * KB + 123)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server, url = start_stub(StubConfig(latency_ms=0))
+    for name, value in stub_env(url).items():
+        monkeypatch.setenv(name, value)
+    cos.reset_client()
+    server.config.put("fyp", "reports/who.pdf", DATA)
+    yield server.config
+    server.shutdown()
+    cos.reset_client()
+
+
+def test_seek_and_read_match_the_object(stub):
+    reader = cos.CosObjectReader("reports/who.pdf", chunk_size=64 * KB, prefetch=1)
+    assert reader.size == len(DATA)
+
+    rng = random.Random(1)
+    for _ in range(50):
+        start = rng.randrange(len(DATA))
+        n = rng.randrange(1, 150 * KB)
+        reader.seek(start)
+        buf = bytearray(n)
+        got = reader.readinto(buf)
+        assert bytes(buf[:got]) == DATA[start:start + n]
+        assert reader.tell() == start + got
+
+    assert reader.seek(-10, io.SEEK_END) == len(DATA) - 10
+    assert reader.seek(4, io.SEEK_CUR) == len(DATA) - 6
+    reader.seek(len(DATA) + 5)
+    assert reader.readinto(bytearray(10)) == 0
+    with pytest.raises(ValueError):
+        reader.seek(-1)
+
+
+def test_buffered_reader_reads_the_tail_with_few_requests(stub):
+    f = cos.open_object("reports/who.pdf", chunk_size=64 * KB, prefetch=0)
+    f.seek(-1024, io.SEEK_END)
+    # PdfReader starts at the trailer: only the last part is fetched
+    assert f.read() == DATA[-1024:]
+    assert f.raw.stats()["requests"] == 1
+    f.seek(0)
+    assert f.read(100) == DATA[:100]
+    assert stub.counts["get"] == 0 and stub.counts["ranged_get"] == 2
+
+
+def test_spool_writes_the_whole_object(stub, tmp_path):
+    reader = cos.CosObjectReader("reports/who.pdf", chunk_size=64 * KB)
+    path = os.path.join(tmp_path, "who.pdf")
+    assert reader.spool(path, concurrency=3) == hashlib.sha256(DATA).hexdigest()
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+
+
+def test_overwrite_mid_read_raises_object_changed(stub, tmp_path):
+    reader = cos.CosObjectReader("reports/who.pdf", chunk_size=64 * KB, prefetch=0)
+    reader.readinto(bytearray(10))
+    stub.put("fyp", "reports/who.pdf", DATA[::-1])
+
+    reader.seek(200 * KB)
+    with pytest.raises(cos.ObjectChanged):
+        reader.readinto(bytearray(10))
+    with pytest.raises(cos.ObjectChanged):
+        reader.spool(os.path.join(tmp_path, "who.pdf"))
+    assert not os.path.exists(os.path.join(tmp_path, "who.pdf"))
+
+
+def test_cancel_stops_a_spool(stub, tmp_path):
+    reader = cos.CosObjectReader("reports/who.pdf", chunk_size=64 * KB)
+    reader.cancel()
+    with pytest.raises(RuntimeError, match="cancelled"):
+        reader.spool(os.path.join(tmp_path, "who.pdf"))
+    assert os.listdir(tmp_path) == []
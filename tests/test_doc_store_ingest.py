@@ -0,0 +1,69 @@
+import os
+import shutil
+
+import pytest
+
+from FYP_RAG import pdf_extract, rag_query_ibm as rag
+
+
+def _page(fact):
+    return [fact, "Coverage of bed nets and indoor spraying is reported for every district."]
+
+
+@pytest.fixture
+def parsed_pages(monkeypatch):
+    """Page numbers handed to the PDF parser, one list per parse."""
+    calls = []
+    extract = pdf_extract._extract
+
+    def recording(filepath, filename, pages, workers, progress):
+        calls.append(list(pages))
+        return extract(filepath, filename, pages, workers, progress)
+
+    monkeypatch.setattr(pdf_extract, "_extract", recording)
+    return calls
+
+
+def _sources(user_id, query):
+    (top, _, method), = rag.retrieve_many([query], user_id)
+    return {d["source"] for _, d in top}, method
+
+
+def test_changed_upload_reparses_only_changed_pages(write_pdf, parsed_pages):
+    pages = [_page("Malaria cases in Zorbu fell by 4%."), _page("Malaria cases in Quli rose by 9%."),
+             _page("Malaria cases in Tenra fell by 2%.")]
+    rag.ingest_local_document("reparse", write_pdf("v1/annual.pdf", pages))
+    pages[1] = _page("Malaria cases in Quli rose by 19%.")
+    rag.ingest_local_document("reparse", write_pdf("v2/annual.pdf", pages))
+
+    assert parsed_pages == [[1, 2, 3], [2]]
+    store = rag.get_doc_store()
+    doc_hash = store.linked("reparse", "annual.pdf")
+    quli = [c["text"] for c in store.segment(doc_hash).iter_chunks() if "Quli" in c["text"]]
+    assert quli and all("19%" in t for t in quli)
+    assert store.document(doc_hash)["vector_synced"]
+
+
+def test_identical_upload_is_linked_without_parsing(write_pdf, parsed_pages, capsys, tmp_path):
+    path = write_pdf("shared.pdf", [_page("Malaria cases in Vibu rose by 30%.")])
+    copy = shutil.copy(path, os.path.join(tmp_path, "renamed.pdf"))
+    rag.ingest_local_document("sharer-a", path)
+    rag.ingest_local_document("sharer-b", copy)
+
+    assert len(parsed_pages) == 1
+    assert "linked without re-ingesting" in capsys.readouterr().out
+    assert rag.get_doc_store().owners(rag.get_doc_store().linked("sharer-b", "renamed.pdf")) == 2
+    assert _sources("sharer-b", "How did malaria cases change in Vibu?")[0] == {"renamed.pdf"}
+
+
+def test_users_only_retrieve_their_own_documents(write_pdf):
+    rag.ingest_local_document("isolated-a", write_pdf("a/private_a.pdf", [_page("Malaria cases in Kagha rose by 21%.")]))
+    rag.ingest_local_document("isolated-b", write_pdf("b/private_b.pdf", [_page("Malaria cases in Lomi fell by 6%.")]))
+
+    for user_id, own, other in (("isolated-a", "private_a.pdf", "Lomi"), ("isolated-b", "private_b.pdf", "Kagha")):
+        sources, method = _sources(user_id, f"How did malaria cases change in {other}?")
+        assert sources <= {own}, method
+
+    # A user without documents sees nobody's
+    sources, _ = _sources("isolated-c", "How did malaria cases change in Kagha?")
+    assert not sources & {"private_a.pdf", "private_b.pdf"}
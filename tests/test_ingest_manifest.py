@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from FYP_RAG.ingest_manifest import IngestManifest
+
+PAGE = ["Malaria cases in Kapara province rose by 12% in 2021.", "Coverage of bed nets improved."]
+
+
+def test_writes_from_another_instance_are_seen(tmp_path):
+    path = os.path.join(tmp_path, "manifest.json")
+    # Two gunicorn workers holding the same manifest
+    a, b = IngestManifest(path), IngestManifest(path)
+    a.set("one.pdf", {"file_hash": "h1"})
+    assert b.get("one.pdf") == {"file_hash": "h1"}
+
+    b.set("two.pdf", {"file_hash": "h2"})
+    assert len(a) == 2
+    a.remove("one.pdf")
+    assert b.get("one.pdf") is None
+    assert IngestManifest(path).get("two.pdf") == {"file_hash": "h2"}
+
+
+def test_returned_records_are_copies(tmp_path):
+    manifest = IngestManifest(os.path.join(tmp_path, "manifest.json"))
+    manifest.set("one.pdf", {"pages": {"1": {"hash": "p1"}}})
+    manifest.get("one.pdf")["pages"]["1"]["hash"] = "changed"
+    assert manifest.get("one.pdf")["pages"]["1"]["hash"] == "p1"
+
+
+@pytest.fixture
+def per_user_ingest(monkeypatch):
+    """Per-user ingestion (no document store), with every extract_chunks call recorded."""
+    from FYP_RAG import pdf_extract, rag_query_ibm
+
+    monkeypatch.setenv("LOCAL_INDEX_BACKEND", "memory")
+    calls = []
+    extract = pdf_extract.extract_chunks
+
+    def recording(filepath, *args, **kwargs):
+        calls.append(kwargs.get("pages"))
+        return extract(filepath, *args, **kwargs)
+
+    monkeypatch.setattr(pdf_extract, "extract_chunks", recording)
+    return rag_query_ibm, calls
+
+
+def test_unchanged_file_is_skipped(per_user_ingest, write_pdf, capsys):
+    rag, calls = per_user_ingest
+    path = write_pdf("report.pdf", [PAGE, ["Second page."]])
+
+    rag.ingest_local_document("manifest-skip", path)
+    assert rag.get_manifest("manifest-skip").get("report.pdf")["vector_synced"] is True
+    rag.ingest_local_document("manifest-skip", path)
+
+    assert len(calls) == 1
+    assert "report.pdf unchanged, skipping ingestion" in capsys.readouterr().out
+
+
+def test_only_changed_pages_are_parsed(per_user_ingest, write_pdf):
+    rag, calls = per_user_ingest
+    rag.ingest_local_document("manifest-pages", write_pdf("v1/report.pdf", [PAGE, ["Old second page."], PAGE]))
+    rag.ingest_local_document("manifest-pages", write_pdf("v2/report.pdf", [PAGE, ["New second page."], PAGE]))
+
+    assert calls == [[1, 2, 3], [2]]
+    texts = [c["text"] for c in rag.LOCAL_INDEX["manifest-pages"] if c["page"] == 2]
+    assert texts == ["New second page."]
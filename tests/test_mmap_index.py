@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from FYP_RAG.bm25_index import BM25Index
+from FYP_RAG.mmap_index import LocalIndexStore
+from FYP_RAG.text_utils import terms, tokenize
+
+CHUNKS = [
+    {"source": "b.pdf", "page": 2, "chunk": 1, "text": "Malaria cases in Kapara rose by 12%. Nets helped."},
+    {"source": "a.pdf", "page": 1, "chunk": 1, "text": "Vaccination coverage fell in Neneka province."},
+    {"source": "a.pdf", "page": 1, "chunk": 2, "text": "Malaria malaria: incidence in Neneka, ünïcode ✓."},
+    {"source": "b.pdf", "page": 1, "chunk": 1, "text": ""},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalIndexStore(os.path.join(tmp_path, "local_index"))
+
+
+def test_chunks_round_trip(store):
+    store.write("alice", CHUNKS)
+    seg = store.open("alice")
+
+    assert len(seg) == len(CHUNKS)
+    for original, mapped in zip(CHUNKS, seg.iter_chunks()):
+        assert {k: mapped[k] for k in original} == original
+        spans = mapped["sentences"]
+        assert [mapped["text"][s:e] for s, e in spans] == [original["text"][s:e] for s, e in spans]
+    assert sorted(seg.sources) == ["a.pdf", "b.pdf"]
+
+
+def test_find_by_chunk_id(store):
+    store.write("alice", CHUNKS)
+    seg = store.open("alice")
+    assert seg.find("a.pdf", 1, 2)["text"] == CHUNKS[2]["text"]
+    assert seg.find("b.pdf", 2, 1)["text"] == CHUNKS[0]["text"]
+    assert seg.find("a.pdf", 9, 1) is None
+
+
+def test_bm25_matches_the_in_memory_index(store):
+    store.write("alice", CHUNKS)
+    seg = store.open("alice")
+    index = BM25Index()
+    for c in CHUNKS:
+        index.add(terms(c["text"]))
+
+    for query in ("malaria neneka", "kapara nets", "coverage", "nothing here"):
+        expected = index.search(terms(query), k=4)
+        got = seg.bm25_search(store.query_ids(terms(query)), k=4)
+        assert [d for _, d in got] == [d for _, d in expected]
+        assert [s for s, _ in got] == pytest.approx([s for s, _ in expected])
+
+
+def test_a_rewrite_is_picked_up_by_other_readers(store, tmp_path):
+    store.write("alice", CHUNKS)
+    first = store.open("alice")
+    # Another worker's store over the same directory replaces the segment
+    LocalIndexStore(store.root).write("alice", CHUNKS[:1])
+
+    again = store.open("alice")
+    assert again is not first and len(again) == 1
+    # The old mapping stays readable for whoever still holds it
+    assert first.chunk(1)["text"] == CHUNKS[1]["text"]
+
+
+def test_overlap_search_scores_by_query_token_share(store):
+    store.write("alice", CHUNKS)
+    seg = store.open("alice")
+    q = tokenize("malaria cases in kapara")
+    hits = store.overlap_search(seg, q, q - {"in"}, k=2)
+    assert hits[0][1]["source"] == "b.pdf"
+    assert hits[0][0] == pytest.approx(1.0)
+
+
+def test_missing_segment(store):
+    assert store.open("nobody") is None
+    store.remove("nobody")
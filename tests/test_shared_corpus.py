@@ -0,0 +1,72 @@
+import os
+import pickle
+import sys
+import types
+
+import pytest
+
+from FYP_RAG.shared_corpus import _load_chunks
+
+PREBUILT = os.path.join(os.path.dirname(__file__), "..", "FYP_RAG", "faiss_index_who_report", "index.pkl")
+
+
+class _Payload:
+    """Pickles as a call to os.system; loading it must not run the command."""
+
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return os.system, (f"touch {self.marker}",)
+
+
+def test_docstore_naming_other_callables_is_rejected(tmp_path):
+    marker = os.path.join(tmp_path, "ran")
+    path = os.path.join(tmp_path, "index.pkl")
+    with open(path, "wb") as f:
+        pickle.dump((_Payload(marker), {0: "a"}), f)
+
+    with pytest.raises(pickle.UnpicklingError, match="not allowed"):
+        _load_chunks(path, 1)
+    assert not os.path.exists(marker)
+
+
+def test_langchain_docstore_is_read_without_langchain(tmp_path, monkeypatch):
+    # Stand-ins pickled under LangChain's module and class names
+    docstore_mod = types.ModuleType("langchain_community.docstore.in_memory")
+    document_mod = types.ModuleType("langchain_core.documents.base")
+
+    class InMemoryDocstore:
+        def __init__(self, docs):
+            self._dict = docs
+
+    class Document:
+        def __init__(self, page_content, metadata):
+            self.page_content = page_content
+            self.metadata = metadata
+
+    for mod, cls in ((docstore_mod, InMemoryDocstore), (document_mod, Document)):
+        cls.__module__, cls.__qualname__ = mod.__name__, cls.__name__
+        setattr(mod, cls.__name__, cls)
+        monkeypatch.setitem(sys.modules, mod.__name__, mod)
+
+    docs = {
+        "a": Document("Malaria  cases\nrose.", {"source": "C:\\reports\\who.pdf", "page": 0}),
+        "b": Document("Second chunk.", {"source": "C:\\reports\\who.pdf", "page": 0}),
+    }
+    path = os.path.join(tmp_path, "index.pkl")
+    with open(path, "wb") as f:
+        pickle.dump((InMemoryDocstore(docs), {0: "a", 1: "b", 2: "missing"}), f)
+
+    chunks = _load_chunks(path, 3)
+    assert [(c["source"], c["page"], c["chunk"]) for c in chunks] == [("who.pdf", 1, 1), ("who.pdf", 1, 2),
+                                                                      ("shared", 1, 1)]
+    assert chunks[0]["text"] == "Malaria cases rose."
+    assert chunks[2]["text"] == ""
+
+
+@pytest.mark.skipif(not os.path.exists(PREBUILT), reason="prebuilt WHO index not checked out")
+def test_prebuilt_index_loads():
+    chunks = _load_chunks(PREBUILT, 5)
+    assert len(chunks) == 5
+    assert any(c["text"] for c in chunks)
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from FYP_RAG.singleflight import SingleFlight
+
+
+def _followers(flight, key, n, fn):
+    """Starts n callers of flight.do(key, fn); returns (threads, outcomes)."""
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(("ok", flight.do(key, fn)))
+        except Exception as e:
+            outcomes.append(("error", e))
+
+    threads = [threading.Thread(target=call) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads, outcomes
+
+
+def test_waiters_share_the_leaders_result():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    threads, outcomes = _followers(flight, "k", 4, work)
+    while flight.coalesced < 3:
+        time.sleep(0.005)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert sorted(shared for _, (_, shared) in outcomes) == [False, True, True, True]
+    assert {result for _, (result, _) in outcomes} == {"answer"}
+
+
+def test_waiters_get_the_leaders_exception():
+    flight, release = SingleFlight(), threading.Event()
+    error = ValueError("granite failed")
+
+    def work():
+        release.wait(5)
+        raise error
+
+    threads, outcomes = _followers(flight, "k", 4, work)
+    while flight.coalesced < 3:
+        time.sleep(0.005)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert [kind for kind, _ in outcomes] == ["error"] * 4
+    assert all(e is error for _, e in outcomes)
+    assert flight.in_flight() == 0
+
+
+def test_a_failed_call_is_not_remembered():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: 42) == (42, False)
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight, release = SingleFlight(), threading.Event()
+    threads, _ = _followers(flight, "slow", 1, lambda: release.wait(5))
+    while flight.in_flight() == 0:
+        time.sleep(0.005)
+    assert flight.do("fast", lambda: "done") == ("done", False)
+    release.set()
+    threads[0].join(5)
@@ -1,16 +1,16 @@
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
 import os
+import sys
 
-BASE = r"C:\FYP\uploads\e2e-user"
-os.makedirs(BASE, exist_ok=True)
-PATH = os.path.join(BASE, "vector_control_test.pdf")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-c = canvas.Canvas(PATH, pagesize=letter)
-t = c.beginText(72, 720)
-t.textLine("WHO report discusses vector control strategies.")
-t.textLine("Vector control includes insecticide-treated nets and indoor residual spraying.")
-c.drawText(t)
-c.showPage()
-c.save()
+from benchmarks.corpus import write_pdf
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE = os.path.join(BASE_DIR, "uploads", "e2e-user")
+PATH = sys.argv[1] if len(sys.argv) > 1 else os.path.join(BASE, "vector_control_test.pdf")
+
+write_pdf(PATH, [[
+    "WHO report discusses vector control strategies.",
+    "Vector control includes insecticide-treated nets and indoor residual spraying.",
+]])
 print("Wrote:", PATH)
@@ -0,0 +1,67 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Batch-ingests every PDF under a COS prefix for one user. Each object is streamed with
+# ranged reads (pages are parsed while the rest arrives) and saved under uploads/<user_id>/;
+# COS_DOWNLOAD_WORKERS objects are in flight at once. Objects already ingested at the same
+# size and ETag are skipped without being read:
+#   python tools/ingest_from_cos.py <user_id> <prefix>
+from FYP_RAG.ibm_cos_storage import ObjectChanged, cos_enabled, list_objects, local_path_for, open_object
+from FYP_RAG.ingest_manifest import IngestManifest
+from FYP_RAG.rag_query_ibm import document_ingested, ingest_stream
+
+if len(sys.argv) != 3:
+    raise SystemExit("usage: python tools/ingest_from_cos.py <user_id> <prefix>")
+if not cos_enabled():
+    raise SystemExit("Set COS_ENDPOINT, COS_ACCESS_KEY_ID, COS_SECRET_ACCESS_KEY and COS_BUCKET")
+
+user_id, prefix = sys.argv[1], sys.argv[2]
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+dest = os.path.join(BASE_DIR, "uploads", user_id)
+# key -> {"etag", "size", "file_hash"} of the version last ingested from COS
+seen = IngestManifest(os.path.join(dest, ".cos_objects.json"))
+
+
+def unchanged(obj: dict, path: str) -> bool:
+    rec = seen.get(obj["key"])
+    return (rec is not None and rec["etag"] == obj["etag"] and rec["size"] == obj["size"]
+            and os.path.exists(path) and os.path.getsize(path) == obj["size"]
+            and document_ingested(user_id, os.path.basename(path), rec["file_hash"]))
+
+
+def ingest(obj: dict, path: str):
+    # An object overwritten while it is read is started again once, from its new version
+    for attempt in range(2):
+        try:
+            with open_object(obj["key"]) as stream:
+                file_hash = ingest_stream(user_id, stream, path)
+                etag = stream.raw.etag
+            break
+        except ObjectChanged:
+            if attempt:
+                raise
+            print(f"ℹ️ {obj['key']} changed while it was read, starting again.")
+    seen.set(obj["key"], {"etag": etag, "size": os.path.getsize(path), "file_hash": file_hash})
+
+
+jobs = [(obj, local_path_for(obj["key"], prefix, dest)) for obj in list_objects(prefix)]
+jobs = [(obj, path) for obj, path in jobs if path is not None]
+todo = [(obj, path) for obj, path in jobs if not unchanged(obj, path)]
+if len(todo) < len(jobs):
+    print(f"ℹ️ {len(jobs) - len(todo)} object(s) unchanged since the last run, skipped.")
+done = 0
+with ThreadPoolExecutor(max_workers=max(1, int(os.getenv("COS_DOWNLOAD_WORKERS", "4")))) as pool:
+    futures = {pool.submit(ingest, obj, path): obj for obj, path in todo}
+    for fut in as_completed(futures):
+        obj = futures[fut]
+        try:
+            fut.result()
+        except Exception as e:
+            print(f"⚠️ Failed to ingest {obj['key']}:", e)
+            continue
+        done += 1
+        print(f"  {done}/{len(todo)} ingested: {obj['key']} ({obj['size']} bytes)")
+print("Ingested", done, "document(s) from", prefix)
@@ -0,0 +1,11 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Re-chunks the document store with the current settings (e.g. CHUNK_SENTENCES=6) from the parse cache:
+#   CHUNK_SENTENCES=6 python tools/reindex_from_cache.py
+from FYP_RAG.rag_query_ibm import reindex_documents
+
+result = reindex_documents(progress=lambda stage, done, total: print(f"  {done}/{total} {stage}"))
+print("Re-indexed:", result)
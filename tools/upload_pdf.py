@@ -3,7 +3,8 @@ import os
 
 URL = "http://127.0.0.1:5001/upload_docs"
 USER_ID = "e2e-user"
-PDF_PATH = r"C:\FYP\uploads\e2e-user\vector_control_test.pdf"
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF_PATH = os.path.join(BASE_DIR, "uploads", USER_ID, "vector_control_test.pdf")
 
 if not os.path.exists(PDF_PATH):
     raise SystemExit(f"Missing file: {PDF_PATH}")